@@ -1,18 +1,59 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
+import json
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from functools import lru_cache
+
+from fastapi import Body, FastAPI, HTTPException, Query, Request, Response, UploadFile, File
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-import pandas as pd
-import io
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
 from typing import List, Optional, Dict, Any
-import json
 
+from src.admission import AdmissionRejected, get_admission_controller
 from src.ai_utils import get_data_insights, generate_text_embedding
+from src.config import get_setting
 from src.db_utils import (
+    batch_vector_search,
     get_dataset,
-    get_dataset_names,
+    create_vector_index,
+    get_dataset_info,
+    get_dataset_sample,
+    get_dataset_sketch,
+    get_dataset_stats,
+    list_datasets as list_catalog_datasets,
+    refresh_vector_index_status,
+    tune_num_candidates,
     store_dataset,
     vector_search,
     get_database
 )
+from src.http_cache import (
+    choose_encoding,
+    get_response_cache,
+    http_date,
+    is_not_modified,
+    make_etag,
+)
+from src.index_manager import drop_unused_indexes, refresh_index_stats
+from src.ingest import SUPPORTED_EXTENSIONS, read_uploaded_file
+from src.metrics import (
+    CONTENT_TYPE_LATEST,
+    HTTP_REQUEST_DURATION,
+    HTTP_REQUESTS_IN_FLIGHT,
+    render_metrics,
+)
+from src.pagination import mongo_pager
+from src.profiling import PROFILE_QUERY_PARAM, profile, profiling_enabled
+from src.prompt_builder import DEFAULT_TOKEN_BUDGET, PROFILE_MAX_ROWS
+from src.query_engine import (
+    ARROW_STREAM_MEDIA_TYPE,
+    QueryError,
+    arrow_ipc_stream,
+    execute as execute_query,
+)
+from src.search_utils import validate_filters
 
 app = FastAPI(
     title="Plot Pyre API",
@@ -29,132 +70,564 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Route label of requests no route matched; raw paths would be unbounded label values
+UNMATCHED_ROUTE = "<unmatched>"
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Times every request, labelled by route template rather than raw path"""
+    started = time.perf_counter()
+    status = 500
+    with HTTP_REQUESTS_IN_FLIGHT.track_inprogress():
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            route = request.scope.get("route")
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - started,
+                method=request.method,
+                route=getattr(route, "path", UNMATCHED_ROUTE),
+                status=status,
+            )
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    """Profiles a request when PLOT_PYRE_PROFILE is set, or is "allow" and ?profile=1 is passed"""
+    if not profiling_enabled(request.query_params.get(PROFILE_QUERY_PARAM)):
+        return await call_next(request)
+    with profile(f"api {request.method} {request.url.path}") as current:
+        response = await call_next(request)
+        route = request.scope.get("route")
+        if route is not None:
+            current.label = f"api {request.method} {route.path}"
+    response.headers["Server-Timing"] = current.server_timing()
+    return response
+
+@lru_cache(maxsize=1)
+def known_api_keys():
+    """API keys from the comma-separated API_KEYS setting"""
+    return frozenset(
+        key.strip() for key in str(get_setting("API_KEYS", "")).split(",") if key.strip()
+    )
+
+def rate_limit_identity(request: Request):
+    """Rate-limit bucket of a request: its X-API-Key if that is a known key, else its address"""
+    api_key = request.headers.get("x-api-key")
+    if api_key and api_key in known_api_keys():
+        return f"key:{api_key}"
+    # An unknown key would let a caller mint a fresh bucket per request
+    return request.client.host if request.client else "anonymous"
+
+@asynccontextmanager
+async def admitted(request: Request, lane: str):
+    """Holds an admission slot for an expensive endpoint, or sheds the request with 429"""
+    client = rate_limit_identity(request)
+    try:
+        async with get_admission_controller().admit(lane, client):
+            yield
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many requests ({e.reason}); retry in {e.retry_after}s",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+@app.get("/admission")
+async def admission_status():
+    """Active slots and queue depth of each admission lane"""
+    return get_admission_controller().status()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
 @app.get("/")
 async def root():
     return {"message": "Plot Pyre API - AI-Powered Data Visualization Backend"}
 
+async def cached_json_response(request: Request, build, etag=None, last_modified=None):
+    """JSON response with validators, conditional GET, compression and caching
+
+    ``build`` is a blocking function returning the JSON-able payload. When an
+    ``etag`` is given it must capture everything the payload depends on: the
+    serialized body is cached under it and a matching If-None-Match is answered
+    with 304 without calling ``build``. Without one, the ETag is a hash of the
+    body, which still saves clients the transfer.
+    """
+    headers = {"Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if last_modified:
+        headers["Last-Modified"] = last_modified
+    conditional = request.method in ("GET", "HEAD")
+    if etag is not None:
+        headers["ETag"] = etag
+        if conditional and is_not_modified(request.headers, etag, last_modified):
+            return Response(status_code=304, headers=headers)
+
+    cache = get_response_cache()
+    key = (request.url.path, etag) if etag is not None else None
+    entry = cache.get(key) if key is not None else None
+    if entry is None:
+        payload = await run_in_threadpool(build)
+        body = json.dumps(
+            jsonable_encoder(payload), allow_nan=False, separators=(",", ":")
+        ).encode()
+        entry = cache.put(key, body) if key is not None else {None: body}
+    if etag is None:
+        headers["ETag"] = make_etag(entry[None].hex())
+        if conditional and is_not_modified(request.headers, headers["ETag"], last_modified):
+            return Response(status_code=304, headers=headers)
+
+    encoding = choose_encoding(request.headers.get("accept-encoding"))
+    # Compressing is CPU work; large bodies are compressed off the event loop
+    body, encoding = await run_in_threadpool(cache.variant, key, entry, encoding)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type="application/json", headers=headers)
+
 @app.get("/datasets")
-async def list_datasets():
-    """Get list of all available datasets"""
+async def list_datasets(
+    request: Request, search: Optional[str] = None, limit: int = 50, after: Optional[str] = None
+):
+    """Get a page of available datasets with their catalog metadata"""
+    if not 1 <= limit <= 1000:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 1000")
+
+    def build():
+        page = list_catalog_datasets(search=search, limit=limit, after=after)
+        return {
+            "datasets": [entry["_id"] for entry in page["datasets"]],
+            "entries": page["datasets"],
+            "next": page["next"],
+            "total": page["total"],
+        }
+
     try:
-        dataset_names = get_dataset_names()
-        return {"datasets": dataset_names}
+        # Entries change without a version bump (index status), so the ETag hashes the body
+        return await cached_json_response(request, build)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching datasets: {str(e)}")
 
+def _dataset_payload(dataset_name):
+    df = get_dataset(dataset_name)
+    # Decoded embeddings are NumPy rows; send them as plain lists
+    if "embedding" in df.columns:
+        df["embedding"] = [vector.tolist() for vector in df["embedding"]]
+    # Convert DataFrame to JSON-compatible format
+    return {
+        "name": dataset_name,
+        "data": df.to_dict(orient="records"),
+        "columns": df.columns.tolist(),
+        "row_count": len(df),
+        "memory_usage": int(df.memory_usage(deep=True).sum())
+    }
+
 @app.get("/datasets/{dataset_name}")
-async def get_dataset_by_name(dataset_name: str):
+async def get_dataset_by_name(request: Request, dataset_name: str):
     """Get a specific dataset by name"""
     try:
-        df = get_dataset(dataset_name)
-        # Convert DataFrame to JSON-compatible format
-        dataset_dict = {
+        info = await run_in_threadpool(get_dataset_info, dataset_name)
+        if info is None:
+            # Not in the catalog: no version to validate against
+            return await cached_json_response(request, lambda: _dataset_payload(dataset_name))
+        return await cached_json_response(
+            request,
+            lambda: _dataset_payload(dataset_name),
+            etag=make_etag("dataset", dataset_name, info.get("version")),
+            last_modified=http_date(info.get("updated_at")),
+        )
+    except Exception as e:
+        raise HTTPException(status_code=404, detail=f"Dataset not found: {str(e)}")
+
+@app.get("/datasets/{dataset_name}/rows")
+async def get_dataset_rows(dataset_name: str, page: int = 1, page_size: int = 100):
+    """One page of a dataset, read from MongoDB with keyset pagination"""
+    if not 1 <= page_size <= 10000:
+        raise HTTPException(status_code=400, detail="page_size must be between 1 and 10000")
+    info = await run_in_threadpool(get_dataset_info, dataset_name)
+    if info is None:
+        raise HTTPException(status_code=404, detail=f"Dataset not found: {dataset_name}")
+    try:
+        pager = mongo_pager(dataset_name, info.get("version"), page_size)
+        rows = await run_in_threadpool(pager.get_page, page)
+        return {
             "name": dataset_name,
-            "data": df.to_dict(orient="records"),
-            "columns": df.columns.tolist(),
-            "row_count": len(df),
-            "memory_usage": df.memory_usage(deep=True).sum()
+            "page": min(max(page, 1), pager.page_count),
+            "page_count": pager.page_count,
+            "total_rows": pager.total_rows,
+            "data": rows.to_dict(orient="records"),
         }
-        return dataset_dict
     except Exception as e:
-        raise HTTPException(status_code=404, detail=f"Dataset not found: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error reading rows: {str(e)}")
+
+@app.get("/datasets/{dataset_name}/stats")
+async def get_dataset_statistics(dataset_name: str):
+    """Per-column statistics served from the dataset's streaming sketches"""
+    try:
+        stats = await run_in_threadpool(get_dataset_stats, dataset_name)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading statistics: {str(e)}")
+    if stats.empty:
+        raise HTTPException(status_code=404, detail=f"No statistics for dataset: {dataset_name}")
+    # NaN (e.g. quantiles of text columns) is not valid JSON
+    stats = stats.astype(object).where(stats.notna(), None)
+    return {"name": dataset_name, "columns": stats.reset_index().to_dict(orient="records")}
+
+@app.get("/datasets/{dataset_name}/indexes")
+async def get_dataset_indexes(dataset_name: str):
+    """Index build status, sizes and access counts for a dataset"""
+    try:
+        indexes = await run_in_threadpool(refresh_index_stats, dataset_name)
+        return {"name": dataset_name, "indexes": indexes}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading indexes: {str(e)}")
+
+@app.post("/datasets/{dataset_name}/indexes/prune")
+async def prune_dataset_indexes(dataset_name: str):
+    """Drop managed indexes that have not been used since they were built"""
+    try:
+        dropped = await run_in_threadpool(drop_unused_indexes, dataset_name)
+        return {"name": dataset_name, "dropped": dropped}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error pruning indexes: {str(e)}")
+
+@app.get("/datasets/{dataset_name}/vector-index")
+async def get_vector_index(dataset_name: str):
+    """Atlas vector index build status and numCandidates tuning for a dataset"""
+    try:
+        return await run_in_threadpool(refresh_vector_index_status, dataset_name)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading vector index: {str(e)}")
+
+class VectorIndexRequest(BaseModel):
+    filter_fields: Optional[List[str]] = None
+    quantization: str = "none"
+
+
+@app.post("/datasets/{dataset_name}/vector-index")
+async def rebuild_vector_index(dataset_name: str, request: VectorIndexRequest):
+    """(Re)create a dataset's vector index with new filter fields or quantization"""
+    if request.quantization not in ("none", "scalar", "binary"):
+        raise HTTPException(status_code=400, detail="quantization must be 'none', 'scalar' or 'binary'")
+    info = await run_in_threadpool(get_dataset_info, dataset_name)
+    embedding = ((info or {}).get("embedding")) or {}
+    if not embedding:
+        raise HTTPException(status_code=404, detail="Dataset has no embeddings")
+    try:
+        await run_in_threadpool(
+            create_vector_index,
+            get_database()[dataset_name],
+            embedding.get("field", "embedding"),
+            embedding["dimension"],
+            filter_fields=request.filter_fields,
+            quantization=request.quantization,
+        )
+        return await run_in_threadpool(refresh_vector_index_status, dataset_name)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error creating vector index: {str(e)}")
+
+@app.post("/datasets/{dataset_name}/vector-index/tune")
+async def tune_vector_search(dataset_name: str, target_recall: float = 0.95):
+    """Re-tune numCandidates against exact search for a ready index"""
+    try:
+        tuning = await run_in_threadpool(
+            tune_num_candidates, dataset_name, target_recall=target_recall
+        )
+        return {"name": dataset_name, "search_tuning": tuning}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error tuning vector search: {str(e)}")
 
 @app.post("/datasets/upload")
 async def upload_dataset(
+    request: Request,
     file: UploadFile = File(...),
     dataset_name: str = None
 ):
     """Upload and store a dataset"""
-    try:
-        # Read file content
-        content = await file.read()
-        
-        # Determine file extension
-        filename = file.filename
-        extension = filename.split('.')[-1] if '.' in filename else ''
-        
-        # Set dataset name if not provided
-        if not dataset_name:
-            dataset_name = filename.split('.')[0] if '.' in filename else filename
-        
-        # Process based on file type
-        if extension.lower() == 'csv':
-            df = pd.read_csv(io.StringIO(content.decode('utf-8')))
-        elif extension.lower() in ['xlsx', 'xls']:
-            df = pd.read_excel(io.BytesIO(content))
-        else:
-            raise HTTPException(status_code=400, detail="Unsupported file format")
-        
-        # Store dataset
-        num_records = store_dataset(dataset_name, df)
-        
-        return {
-            "message": f"Dataset '{dataset_name}' uploaded successfully",
-            "records": num_records,
-            "columns": df.columns.tolist()
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error uploading dataset: {str(e)}")
+    async with admitted(request, "upload"):
+        try:
+            # Read file content
+            content = await file.read()
+
+            # Determine file extension
+            filename = file.filename
+            extension = filename.split('.')[-1] if '.' in filename else ''
+
+            # Set dataset name if not provided
+            if not dataset_name:
+                dataset_name = filename.split('.')[0] if '.' in filename else filename
+
+            # Process based on file type
+            if extension.lower() not in SUPPORTED_EXTENSIONS:
+                raise HTTPException(status_code=400, detail="Unsupported file format")
+            # Parse off the event loop; the parser itself fans out across all cores
+            df = await run_in_threadpool(read_uploaded_file, content, extension)
+
+            # Store dataset
+            num_records = await run_in_threadpool(store_dataset, dataset_name, df)
+
+            return {
+                "message": f"Dataset '{dataset_name}' uploaded successfully",
+                "records": num_records,
+                "columns": df.columns.tolist()
+            }
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error uploading dataset: {str(e)}")
 
 @app.post("/ai/insights")
-async def generate_insights(dataset_name: str, request: Dict[str, Any] = None):
-    """Generate AI insights for a dataset"""
-    try:
-        # Get dataset
-        df = get_dataset(dataset_name)
-        
-        # Extract parameters from request
-        specific_columns = request.get("specific_columns") if request else None
-        question = request.get("question") if request else None
-        
-        # Generate insights
-        insights = get_data_insights(
-            df,
-            specific_columns=specific_columns,
-            question=question
-        )
-        
-        return {"insights": insights}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error generating insights: {str(e)}")
+async def generate_insights(
+    http_request: Request,
+    dataset_name: str,
+    request: Dict[str, Any] = None,
+    token_budget: int = Query(DEFAULT_TOKEN_BUDGET, ge=1),
+):
+    """Generate AI insights for a dataset
+
+    ``token_budget`` caps the size of the dataset profile sent to the model.
+    """
+    async with admitted(http_request, "insights"):
+        try:
+            # MongoDB's $sample picks the rows server-side and statistics come
+            # from the stored column sketch, so only PROFILE_MAX_ROWS rows travel
+            df = await run_in_threadpool(get_dataset_sample, dataset_name, PROFILE_MAX_ROWS)
+            sketch = await run_in_threadpool(get_dataset_sketch, dataset_name)
+
+            # Extract parameters from request
+            specific_columns = request.get("specific_columns") if request else None
+            question = request.get("question") if request else None
+
+            # Generate insights
+            insights = await run_in_threadpool(
+                get_data_insights,
+                df,
+                specific_columns=specific_columns,
+                question=question,
+                token_budget=token_budget,
+                sketch=sketch,
+            )
+
+            return {"insights": insights}
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error generating insights: {str(e)}")
 
 @app.post("/ai/embedding")
-async def create_embedding(text: str):
+async def create_embedding(request: Request, text: str, provider: Optional[str] = None):
     """Generate text embedding"""
-    try:
-        embedding = generate_text_embedding(text)
-        return {"embedding": embedding, "text": text}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error generating embedding: {str(e)}")
+    async with admitted(request, "embedding"):
+        try:
+            embedding = await run_in_threadpool(
+                generate_text_embedding, text, provider=provider
+            )
+            return {"embedding": embedding, "text": text, "dimension": len(embedding)}
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error generating embedding: {str(e)}")
+
+async def _vector_search_response(request: Request, dataset_name: str, params: Dict[str, Any]):
+    # Reject bad filters before a cached response can answer for them
+    validate_filters(params["filters"])
+
+    def build():
+        search_results_df = vector_search(dataset_name, index_field="embedding", **params)
+
+        # Convert to JSON
+        if not search_results_df.empty:
+            results = search_results_df.to_dict(orient="records")
+        else:
+            results = []
+
+        return {
+            "results": results,
+            "query": params["query_text"],
+            "stats": search_results_df.attrs.get("search_stats", {}),
+        }
+
+    info = await run_in_threadpool(get_dataset_info, dataset_name)
+    if info is None or not params["use_cache"] or params["measure_recall"]:
+        return await cached_json_response(request, build)
+    # Results only change when the dataset is stored again
+    return await cached_json_response(
+        request,
+        build,
+        etag=make_etag("search", dataset_name, info.get("version"), params),
+        last_modified=http_date(info.get("updated_at")),
+    )
 
 @app.post("/search/vector")
 async def vector_search_endpoint(
+    request: Request,
     dataset_name: str,
     query: str,
     num_results: int = 5,
-    text_field_to_return: Optional[str] = None
+    text_field_to_return: Optional[str] = None,
+    keyword: Optional[str] = None,
+    keyword_field: Optional[str] = None,
+    num_candidates: Optional[int] = None,
+    measure_recall: bool = False,
+    use_cache: bool = True,
+    filters: Optional[Dict[str, Any]] = Body(None),
 ):
-    """Perform vector search on a dataset"""
+    """Perform vector search on a dataset
+
+    The optional JSON body is a MongoDB filter document applied before ranking,
+    e.g. {"region": "EU", "price": {"$lt": 100}}.
+    """
     try:
-        # Perform vector search
-        search_results_df = vector_search(
+        return await _vector_search_response(
+            request,
             dataset_name,
-            query,
-            index_field="embedding",
-            num_results=num_results,
-            text_field_to_return=text_field_to_return,
+            {
+                "query_text": query,
+                "num_results": num_results,
+                "text_field_to_return": text_field_to_return,
+                "filters": filters,
+                "keyword": keyword,
+                "keyword_field": keyword_field,
+                "num_candidates": num_candidates,
+                "measure_recall": measure_recall,
+                "use_cache": use_cache,
+            },
         )
-        
-        # Convert to JSON
-        if not search_results_df.empty:
-            results = search_results_df.to_dict(orient="records")
-        else:
-            results = []
-        
-        return {"results": results, "query": query}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error during vector search: {str(e)}")
 
+@app.get("/search/vector")
+async def vector_search_get_endpoint(
+    request: Request,
+    dataset_name: str,
+    query: str,
+    num_results: int = 5,
+    text_field_to_return: Optional[str] = None,
+    keyword: Optional[str] = None,
+    keyword_field: Optional[str] = None,
+    num_candidates: Optional[int] = None,
+    filters: Optional[str] = None,
+):
+    """Vector search as a cacheable GET for polling clients
+
+    Takes the same parameters as POST /search/vector, with ``filters`` as a
+    JSON string; send the returned ETag as If-None-Match to get 304 until the
+    dataset is stored again.
+    """
+    try:
+        filter_document = json.loads(filters) if filters else None
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid filters JSON: {e}")
+    try:
+        return await _vector_search_response(
+            request,
+            dataset_name,
+            {
+                "query_text": query,
+                "num_results": num_results,
+                "text_field_to_return": text_field_to_return,
+                "filters": filter_document,
+                "keyword": keyword,
+                "keyword_field": keyword_field,
+                "num_candidates": num_candidates,
+                "measure_recall": False,
+                "use_cache": True,
+            },
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error during vector search: {str(e)}")
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str]
+    num_results: int = 5
+    text_field_to_return: Optional[str] = None
+    filters: Optional[Dict[str, Any]] = None
+    num_candidates: Optional[int] = None
+    engine: str = "auto"
+
+
+@app.post("/search/vector/batch")
+async def batch_vector_search_endpoint(dataset_name: str, request: BatchSearchRequest):
+    """Perform many vector searches on a dataset in one call"""
+    if request.engine not in ("auto", "atlas", "local"):
+        raise HTTPException(status_code=400, detail="engine must be 'auto', 'atlas' or 'local'")
+    try:
+        # Embedding and scoring are blocking; keep them off the event loop
+        search_results = await run_in_threadpool(
+            batch_vector_search,
+            dataset_name,
+            request.queries,
+            index_field="embedding",
+            num_results=request.num_results,
+            text_field_to_return=request.text_field_to_return,
+            filters=request.filters,
+            num_candidates=request.num_candidates,
+            engine=request.engine,
+        )
+
+        grouped = [
+            {
+                "query": query,
+                "results": results_df.to_dict(orient="records") if not results_df.empty else [],
+                "engine": results_df.attrs["search_stats"]["engine"],
+            }
+            for query, results_df in zip(request.queries, search_results)
+        ]
+        stats = search_results[0].attrs["search_stats"] if search_results else {}
+        return {
+            "results": grouped,
+            "stats": {
+                "batch_size": len(request.queries),
+                "latency_ms": stats.get("batch_latency_ms"),
+            },
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error during batch vector search: {str(e)}")
+
+class QueryRequest(BaseModel):
+    sql: str
+
+
+@app.post("/query")
+async def query_datasets(http_request: Request, request: QueryRequest):
+    """Run a read-only SQL query over stored datasets; streams an Arrow IPC stream.
+
+    Datasets are referenced by name as tables and read from Parquet snapshots
+    of their current MongoDB version.
+    """
+    # The admission slot is held until the last batch has been sent
+    stack = AsyncExitStack()
+    await stack.enter_async_context(admitted(http_request, "query"))
+    try:
+        connection, reader = await run_in_threadpool(
+            execute_query, request.sql, prefer_local=False
+        )
+    except QueryError as e:
+        await stack.aclose()
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        await stack.aclose()
+        raise HTTPException(status_code=500, detail=f"Error running query: {str(e)}")
+
+    stream = arrow_ipc_stream(connection, reader)
+
+    async def body():
+        try:
+            async for chunk in iterate_in_threadpool(stream):
+                yield chunk
+        finally:
+            # Closes the DuckDB connection if the client went away mid-stream
+            await run_in_threadpool(stream.close)
+            await stack.aclose()
+
+    return StreamingResponse(body(), media_type=ARROW_STREAM_MEDIA_TYPE)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
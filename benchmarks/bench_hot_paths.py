@@ -0,0 +1,214 @@
+"""
+Hot-path benchmarks for Plot Pyre
+Times store_dataset, get_dataset, chart preparation and vector_search on
+synthetic data against a local MongoDB stand-in, embedding with the offline
+hashing provider.
+
+    python benchmarks/bench_hot_paths.py --sizes 10000,1000000,10000000 --json results.json
+    python benchmarks/bench_hot_paths.py --compare before.json after.json
+
+Each (case, size) runs in a fresh process so peak RSS is attributable to it.
+Uses mongomock (in the dev dependency group) by default; pass --mongo-uri to
+benchmark a real server. mongomock has no Atlas Search, so vector_search then
+measures the exact local fallback and is reported as "vector_search_local".
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from multiprocessing import get_context
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+CASES = [
+    "store_dataset",
+    "get_dataset",
+    "get_sample_data_for_viz",
+    "prepare_visualization_data",
+    "vector_search",
+]
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def _timed(function, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def run_case(case, rows, options):
+    """Child-process entry point: sets up one case and returns its measurements"""
+    os.environ["MONGODB_URI"] = options["mongo_uri"]
+    # Deterministic local embeddings: no network calls inside timed regions
+    os.environ["EMBEDDING_PROVIDER"] = "hashing"
+    os.environ["EMBEDDING_DIMENSION"] = str(options["embedding_dim"])
+    from synthetic import make_dataset
+
+    from src import db_utils
+    from src.viz_utils import aggregate_for_viz, sample_for_viz
+
+    repeats = options["repeats"]
+    name = f"bench_{case}_{rows}"
+    processed_rows = rows
+    label = case
+
+    if case == "vector_search":
+        # Embeddings are dense; cap the embedded dataset to keep memory sane
+        processed_rows = min(rows, options["max_embedded_rows"])
+        df = make_dataset(processed_rows)
+        db_utils.store_dataset(name, df, text_column_for_embedding="text_0")
+        queries = df["text_0"].sample(n=repeats, replace=True, random_state=1).tolist()
+        timings, engines = [], set()
+        for query in queries:
+            started = time.perf_counter()
+            # Queries repeat; the result cache would turn them into lookups
+            results = db_utils.vector_search(
+                name, query, num_results=10, text_field_to_return="text_0", use_cache=False
+            )
+            timings.append((time.perf_counter() - started) * 1000)
+            engines.add(results.attrs.get("search_stats", {}).get("engine"))
+        # Atlas and the local fallback are different code paths; never mix their numbers
+        if engines == {"local"}:
+            label = "vector_search_local"
+    else:
+        df = make_dataset(rows, text_columns=0)
+        if case == "store_dataset":
+            timings = _timed(lambda: db_utils.store_dataset(name, df), repeats)
+        elif case == "get_dataset":
+            db_utils.store_dataset(name, df)
+            timings = _timed(lambda: db_utils.get_dataset(name), repeats)
+        elif case == "get_sample_data_for_viz":
+            timings = _timed(lambda: sample_for_viz(df), repeats)
+        elif case == "prepare_visualization_data":
+            selected = df["category_0"].value_counts().head(10).index.tolist()
+            timings = _timed(
+                lambda: aggregate_for_viz(df, "category_0", "value_0", selected), repeats
+            )
+        else:
+            raise ValueError(f"Unknown case '{case}'")
+
+    db_utils.get_database()[name].drop()
+    median_ms = statistics.median(timings)
+    return {
+        "case": label,
+        "rows": rows,
+        "processed_rows": processed_rows,
+        "repeats": len(timings),
+        "latency_ms": {
+            "p50": round(median_ms, 3),
+            "p90": round(_percentile(timings, 0.90), 3),
+            "p99": round(_percentile(timings, 0.99), 3),
+            "min": round(min(timings), 3),
+            "max": round(max(timings), 3),
+        },
+        # Queries per second for search, rows per second for everything else
+        "throughput_per_s": round(
+            (1 if case == "vector_search" else processed_rows) / (median_ms / 1000), 2
+        )
+        if median_ms
+        else None,
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(before_path, after_path):
+    """Prints per-case latency and RSS changes between two result files"""
+    before = json.loads(Path(before_path).read_text())
+    after = json.loads(Path(after_path).read_text())
+    baseline = {(r["case"], r["rows"]): r for r in before["results"]}
+    print(f"{'case':28} {'rows':>10} {'p50 before':>12} {'p50 after':>12} {'change':>8} {'rss after':>10}")
+    for result in after["results"]:
+        old = baseline.get((result["case"], result["rows"]))
+        if not old:
+            continue
+        old_p50, new_p50 = old["latency_ms"]["p50"], result["latency_ms"]["p50"]
+        change = (new_p50 - old_p50) / old_p50 * 100 if old_p50 else 0.0
+        print(
+            f"{result['case']:28} {result['rows']:>10} {old_p50:>12.2f} {new_p50:>12.2f} "
+            f"{change:>+7.1f}% {result['peak_rss_mb']:>9.1f}M"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10000,1000000,10000000")
+    parser.add_argument("--cases", default=",".join(CASES))
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--mongo-uri", default="mongomock://localhost")
+    parser.add_argument("--embedding-dim", type=int, default=768)
+    parser.add_argument("--max-embedded-rows", type=int, default=100000)
+    parser.add_argument("--json", help="write machine-readable results to this path")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+
+    options = {
+        "mongo_uri": args.mongo_uri,
+        "repeats": args.repeats,
+        "embedding_dim": args.embedding_dim,
+        "max_embedded_rows": args.max_embedded_rows,
+    }
+    results = []
+    context = get_context("spawn")
+    for rows in [int(size) for size in args.sizes.split(",")]:
+        for case in args.cases.split(","):
+            with context.Pool(1, maxtasksperchild=1) as pool:
+                result = pool.apply(run_case, (case, rows, options))
+            print(
+                f"{result['case']:28} {rows:>10}  p50 {result['latency_ms']['p50']:>10.2f} ms  "
+                f"p99 {result['latency_ms']['p99']:>10.2f} ms  "
+                f"rss {result['peak_rss_mb']:>8.1f} MB"
+            )
+            results.append(result)
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "options": options,
+        },
+        "results": results,
+    }
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+Startup-time benchmark for Plot Pyre
+Measures cold import time of the API and data-layer modules in fresh
+interpreters and fails when a module exceeds its budget.
+
+    python benchmarks/bench_startup.py [--runs 5] [--json results.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Median cold-import budgets in milliseconds
+STARTUP_BUDGETS_MS = {
+    "src.config": 50,
+    "src.ai_utils": 150,
+    "src.db_utils": 1200,
+    "api.main": 2500,
+}
+
+# Modules that must not be imported as a side effect of importing the key module
+FORBIDDEN_IMPORTS = {
+    "src.ai_utils": ["streamlit", "google.genai", "pymongo"],
+    "src.db_utils": ["streamlit", "google.genai", "pymongo"],
+    "api.main": ["streamlit", "google.genai", "matplotlib"],
+}
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed_ms = (time.perf_counter() - started) * 1000
+print(json.dumps({{"elapsed_ms": elapsed_ms, "forbidden": [m for m in {forbidden!r} if m in sys.modules]}}))
+"""
+
+
+def measure_import(module, runs):
+    """Imports the module in `runs` fresh interpreters and returns timings"""
+    timings = []
+    forbidden = []
+    env = dict(os.environ)
+    # Settings are read lazily, so imports must succeed without any credentials
+    env.pop("MONGODB_URI", None)
+    env.pop("GOOGLE_CLOUD_API_KEY", None)
+    for _ in range(runs):
+        completed = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                _PROBE.format(module=module, forbidden=FORBIDDEN_IMPORTS.get(module, [])),
+            ],
+            cwd=ROOT,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{completed.stderr}")
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        timings.append(result["elapsed_ms"])
+        forbidden = result["forbidden"]
+    return {
+        "module": module,
+        "median_ms": round(statistics.median(timings), 1),
+        "max_ms": round(max(timings), 1),
+        "budget_ms": STARTUP_BUDGETS_MS[module],
+        "forbidden_imports": forbidden,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per module")
+    parser.add_argument("--json", help="write machine-readable results to this path")
+    args = parser.parse_args()
+
+    results = []
+    failed = False
+    for module in STARTUP_BUDGETS_MS:
+        result = measure_import(module, args.runs)
+        over_budget = result["median_ms"] > result["budget_ms"]
+        failed = failed or over_budget or bool(result["forbidden_imports"])
+        status = "FAIL" if over_budget or result["forbidden_imports"] else "ok"
+        print(
+            f"{status:4}  {module:14} median {result['median_ms']:8.1f} ms "
+            f"(budget {result['budget_ms']} ms)"
+            + (f"  eager imports: {result['forbidden_imports']}" if result["forbidden_imports"] else "")
+        )
+        results.append(result)
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({"startup": results}, indent=2))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,43 @@
+"""
+Synthetic datasets for benchmarks
+"""
+import numpy as np
+import pandas as pd
+
+_WORDS = np.array(
+    (
+        "python data chart mongo vector search insight cluster trend revenue "
+        "region price customer order product market growth signal model sample "
+        "latency storage index query stream record metric value series report"
+    ).split()
+)
+
+
+def make_dataset(
+    rows,
+    numeric_columns=4,
+    category_columns=2,
+    text_columns=1,
+    categories=50,
+    words_per_text=12,
+    seed=0,
+):
+    """Builds a reproducible DataFrame with numeric, categorical and text columns"""
+    rng = np.random.default_rng(seed)
+    data = {}
+    for i in range(category_columns):
+        # Zipf-like skew so value_counts/top-k have realistic heavy hitters
+        weights = 1.0 / np.arange(1, categories + 1)
+        codes = rng.choice(categories, size=rows, p=weights / weights.sum())
+        data[f"category_{i}"] = pd.Categorical.from_codes(
+            codes, [f"c{i}_{j}" for j in range(categories)]
+        ).astype(object)
+    for i in range(numeric_columns):
+        data[f"value_{i}"] = rng.normal(100.0 * (i + 1), 15.0, size=rows)
+    for i in range(text_columns):
+        words = _WORDS[rng.integers(0, len(_WORDS), size=(rows, words_per_text))]
+        data[f"text_{i}"] = pd.Series(words[:, 0]).str.cat(
+            [pd.Series(words[:, j]) for j in range(1, words_per_text)], sep=" "
+        )
+    return pd.DataFrame(data)
+
@@ -1,4 +1,8 @@
-import matplotlib.pyplot as plt
+import hashlib
+import json
+import os
+import time
+
 import pandas as pd
 import streamlit as st
 
@@ -6,11 +10,31 @@ from src.ai_utils import get_data_insights
 
 # Import our custom modules
 from src.db_utils import (
-    get_dataset,
-    get_dataset_names,
-    store_dataset,
+    get_dataset_info,
+    get_dataset_sample,
+    get_dataset_sketch,
+    list_datasets,
+    refresh_vector_index_status,
     vector_search,  # Added import
 )
+from src.embeddings import PROVIDERS as EMBEDDING_PROVIDERS
+from src.index_manager import record_column_usage
+from src.ingest import read_uploaded_file
+from src.lazy_dataset import open_dataset
+from src.offline_utils import DATASETS_DIR, OfflineStorage
+from src.pagination import DEFAULT_PAGE_SIZE, FramePager, mongo_pager, parquet_pager
+from src.profiling import PROFILE_QUERY_PARAM, profile, profiling_enabled, stage
+from src.query_engine import PREVIEW_ROWS, QueryError, query_engine_available, run_query
+from src.text_assembly import template_columns
+from src.sketches import DatasetSketch
+from src import sync
+from src.viz_utils import (
+    VIZ_SAMPLE_SIZE,
+    aggregate_for_viz,
+    aggregate_lazy_for_viz,
+    sample_for_viz,
+    top_x_values,
+)
 
 # Page configuration
 PAGE_CONFIG = {
@@ -20,8 +44,28 @@ PAGE_CONFIG = {
 }
 st.set_page_config(**PAGE_CONFIG)
 
+# MongoDB datasets larger than this are paged and sampled instead of fully loaded
+FULL_LOAD_MAX_ROWS = 1_000_000
+LARGE_DATASET_SAMPLE_ROWS = 200_000
+# Seconds between Atlas index status checks while an index is not queryable
+VECTOR_INDEX_REFRESH_SECONDS = 10
+
+# Local writes queued while MongoDB was unreachable are replayed in the background
+sync.start_background_sync()
+
 # Initialize session state variables
-for key in ["df", "filename", "option", "opt", "columnList", "insights", "data_loaded"]:
+for key in [
+    "df",
+    "filename",
+    "option",
+    "opt",
+    "columnList",
+    "insights",
+    "data_loaded",
+    "mongo_dataset",
+    "local_path",
+    "content_key",
+]:
     if key not in st.session_state:
         st.session_state[key] = None
 
@@ -30,12 +74,60 @@ if st.session_state.data_loaded is None:
     st.session_state.data_loaded = False
 
 
-def paginated_dataframe(df, page_size=100):
-    total_rows = len(df)
-    page_num = st.number_input("Page", 1, (total_rows // page_size) + 1)
-    start_idx = (page_num - 1) * page_size
-    end_idx = start_idx + page_size
-    st.dataframe(df.iloc[start_idx:end_idx])
+@st.cache_data(show_spinner="Parsing uploaded file...", max_entries=8)
+def load_uploaded_dataframe(content_hash, extension, _content):
+    """Parses an upload once per unique file content (keyed by its hash)"""
+    return read_uploaded_file(_content, extension)
+
+
+@st.cache_data(max_entries=8)
+def load_dataset_sketch(dataset_name, version):
+    """Persisted column sketches of a MongoDB dataset, fetched once per version"""
+    return get_dataset_sketch(dataset_name)
+
+
+@st.cache_data(show_spinner="Summarizing columns...", max_entries=8)
+def sketch_uploaded_dataframe(content_hash, _df):
+    """Column sketches of an upload, built once per unique file content"""
+    return DatasetSketch().update(_df)
+
+
+@st.cache_data(show_spinner="Aggregating the full dataset...", max_entries=32)
+def aggregate_full_dataset(dataset_name, version, x_column, y_column, selected_values, numeric):
+    """Chart data over every row of a dataset too large to load, once per version"""
+    return aggregate_lazy_for_viz(
+        open_dataset(dataset_name), x_column, y_column, list(selected_values), numeric
+    )
+
+
+def current_sketch():
+    """Column sketches for the loaded data (full dataset, even when df is a sample)"""
+    if st.session_state.mongo_dataset:
+        version = (get_dataset_info(st.session_state.mongo_dataset) or {}).get("version")
+        return load_dataset_sketch(st.session_state.mongo_dataset, version)
+    if st.session_state.get("upload_content_hash"):
+        return sketch_uploaded_dataframe(
+            st.session_state.upload_content_hash, st.session_state.df
+        )
+    return None
+
+
+def current_pager(page_size=DEFAULT_PAGE_SIZE):
+    """Pager for the loaded data: local copies by Parquet row group, MongoDB
+    datasets on the server"""
+    local_path = st.session_state.get("local_path")
+    if local_path and os.path.exists(local_path):
+        return parquet_pager(local_path, os.stat(local_path).st_mtime_ns, page_size)
+    if st.session_state.mongo_dataset:
+        version = (get_dataset_info(st.session_state.mongo_dataset) or {}).get("version")
+        return mongo_pager(st.session_state.mongo_dataset, version, page_size)
+    return FramePager(st.session_state.df, page_size)
+
+
+def paginated_dataframe(pager):
+    page_num = st.number_input("Page", 1, pager.page_count)
+    # Only this page is read; the next one is prefetched in the background
+    st.dataframe(pager.get_page(page_num))
 
 
 def sidebar():
@@ -52,12 +144,18 @@ def sidebar():
 
         # Handle different data sources
         if data_source == "Upload File":
-            handle_uploaded_file()  # Changed from handle_file_upload()
+            with stage("handle_uploaded_file"):
+                handle_uploaded_file()  # Changed from handle_file_upload()
         elif data_source == "MongoDB Storage":
-            handle_mongodb_storage()
+            with stage("handle_mongodb_storage"):
+                handle_mongodb_storage()
+
+        for name, error in sync.failed_datasets().items():
+            st.warning(f"Syncing '{name}' to MongoDB was given up: {error}")
 
         # Show column and chart options if data is loaded
-        show_data_options()
+        with stage("show_data_options"):
+            show_data_options()
 
 
 def show_data_options():
@@ -89,15 +187,29 @@ def handle_uploaded_file():
 
         if extension in allowedExtension:
             try:
-                df = (
-                    pd.read_csv(uploaded_file)
-                    if extension == "csv"
-                    else pd.read_excel(uploaded_file)
+                # Only (re)parse when a different file is uploaded; every other rerun
+                # reuses the frame already in session state
+                upload_key = (
+                    getattr(uploaded_file, "file_id", None),
+                    uploaded_file.name,
+                    uploaded_file.size,
                 )
-                st.session_state.df = df
-                st.session_state.filename = filename
-                st.session_state.columnList = df.columns.values.tolist()
-                st.session_state.data_loaded = True
+                if st.session_state.get("loaded_upload_key") != upload_key:
+                    content = uploaded_file.getvalue()
+                    content_hash = hashlib.sha256(content).hexdigest()
+                    # Parsed across all cores (Arrow CSV reader / per-sheet workers)
+                    df = load_uploaded_dataframe(content_hash, extension, content)
+                    st.session_state.df = df
+                    st.session_state.filename = filename
+                    st.session_state.columnList = df.columns.values.tolist()
+                    st.session_state.data_loaded = True
+                    st.session_state.loaded_upload_key = upload_key
+                    st.session_state.upload_content_hash = content_hash
+                    st.session_state.mongo_dataset = None
+                    st.session_state.local_path = None
+                    st.session_state.content_key = f"upload:{content_hash}"
+                    st.session_state.df_is_sample = False
+                df = st.session_state.df
                 st.sidebar.success(f"File '{filename}' loaded successfully!")
 
                 # Ask user which column to use for text embedding, or to combine columns
@@ -114,8 +226,9 @@ def handle_uploaded_file():
                     key="embedding_source_select",
                 )
 
-                combined_text_column_name = "combined_text_for_embedding"
                 text_column_for_embedding = None  # Initialize
+                text_columns_for_embedding = None
+                text_template_for_embedding = None
 
                 if selected_embedding_source == "Combine multiple columns":
                     columns_to_combine = st.sidebar.multiselect(
@@ -123,22 +236,33 @@ def handle_uploaded_file():
                         st.session_state.columnList,
                         key="columns_to_combine_multiselect",
                     )
-                    if columns_to_combine:
-                        df[combined_text_column_name] = (
-                            df[columns_to_combine].astype(str).agg(" ".join, axis=1)
+                    text_template_for_embedding = (
+                        st.sidebar.text_input(
+                            "Text template (optional)",
+                            placeholder="{title}: {body}",
+                            help="Reference columns in braces. Leave empty to join the selected columns with spaces.",
+                            key="embedding_template_input",
+                        )
+                        or None
+                    )
+                    if text_template_for_embedding:
+                        columns_to_combine = template_columns(
+                            template=text_template_for_embedding
                         )
-                        text_column_for_embedding = combined_text_column_name
+                    if columns_to_combine:
+                        # The combined text is assembled batch by batch while saving,
+                        # so no extra column is added to the DataFrame
+                        text_columns_for_embedding = columns_to_combine
                         st.session_state.last_embedded_text_column = (
-                            combined_text_column_name  # Store for later default
+                            columns_to_combine[0]  # Store for later default
                         )
                         st.sidebar.info(
-                            f"Using combined column '{combined_text_column_name}' for embeddings."
+                            f"Combining {', '.join(columns_to_combine)} for embeddings."
                         )
                     else:
                         st.sidebar.warning(
                             "Please select columns to combine or choose a single column."
                         )
-                        text_column_for_embedding = None
                 elif selected_embedding_source != "None (Skip Embedding)":
                     text_column_for_embedding = selected_embedding_source
                     st.session_state.last_embedded_text_column = (
@@ -148,38 +272,65 @@ def handle_uploaded_file():
                         f"Using column '{text_column_for_embedding}' for embeddings."
                     )
                 else:
-                    text_column_for_embedding = None
                     st.sidebar.info("Skipping text embedding.")
 
+                embeds_text = bool(
+                    text_column_for_embedding or text_columns_for_embedding
+                )
+                embedding_provider = None
+                if embeds_text:
+                    embedding_provider = st.sidebar.selectbox(
+                        "Embedding provider",
+                        list(EMBEDDING_PROVIDERS),
+                        help="'hashing' embeds locally on the CPU without network access.",
+                        key="embedding_provider_select",
+                    )
+
                 # Option to save to MongoDB
                 if st.sidebar.button("Save to MongoDB", key="save_to_mongodb_btn"):
-                    num_records = store_dataset(
+                    # Saved locally first; only changed row blocks are sent to MongoDB
+                    result = sync.save_dataset(
                         filename,
                         df,
                         text_column_for_embedding=text_column_for_embedding,
+                        text_columns=text_columns_for_embedding,
+                        text_template=text_template_for_embedding,
+                        embedding_provider=embedding_provider,
+                    )
+                    if filename in result["errors"]:
+                        st.sidebar.error(
+                            f"Saving to MongoDB failed: {result['errors'][filename]}. "
+                            "The dataset is saved locally; the save is retried a few "
+                            "times before it is given up."
+                        )
+                        return
+                    if filename not in result["synced"]:
+                        st.sidebar.warning(
+                            "MongoDB is unreachable. The dataset is saved locally and "
+                            "will be synced when the connection returns."
+                        )
+                        return
+                    embedding_error = (get_dataset_info(filename) or {}).get(
+                        "embedding_error"
                     )
                     embedding_msg = (
-                        "Embeddings generated."
-                        if text_column_for_embedding
+                        "Embedding failed, so some rows were stored without embeddings; "
+                        f"saving the dataset again embeds them: {embedding_error}"
+                        if embedding_error
+                        else "Embeddings generated."
+                        if embeds_text
                         else "No embeddings generated."
                     )
                     st.sidebar.success(
-                        f"Dataset saved to MongoDB with {num_records} records. {embedding_msg}"
+                        f"Dataset saved to MongoDB ({result['synced'][filename]} of "
+                        f"{len(df)} records transferred). {embedding_msg}"
                     )
-                    if text_column_for_embedding:
-                        st.sidebar.markdown(
-                            "**Important:** For vector search to work, ensure you have a **vector search index** named `vector_index` on the `embedding` field in your MongoDB Atlas collection. Refer to the `create_vector_index` logs or Atlas documentation for setup details."
+                    if embeds_text and not embedding_error:
+                        st.sidebar.info(
+                            "The Atlas vector search index is being built. Until it is "
+                            "queryable, searches use an exact local scan; see its status "
+                            "in the Vector Search tab."
                         )
-
-                    # If combined column was created and we don't want to persist it in the displayed df
-                    if (
-                        text_column_for_embedding == combined_text_column_name
-                        and combined_text_column_name in df.columns
-                    ):
-                        df.drop(columns=[combined_text_column_name], inplace=True)
-                        st.session_state.columnList = (
-                            df.columns.values.tolist()
-                        )  # Update column list if temp col dropped
             except Exception as e:
                 st.sidebar.error(f"Error processing file: {e}")
         else:
@@ -188,38 +339,122 @@ def handle_uploaded_file():
 
 def handle_mongodb_storage():
     """Handle MongoDB storage data source"""
-    # Get list of datasets from MongoDB
+    # Get list of datasets from the MongoDB catalog
     try:
-        dataset_names = get_dataset_names()
+        search = st.sidebar.text_input(
+            "Find dataset (name prefix)", key="mongo_dataset_search"
+        )
+        page = list_datasets(search=search or None, limit=200)
+        entries = {entry["_id"]: entry for entry in page["datasets"]}
 
-        if not dataset_names:
+        if not entries:
             st.sidebar.info(
                 "No datasets found in MongoDB. Please upload or download a dataset first."
+                if not search
+                else f"No datasets match '{search}'."
             )
             return
 
+        def describe_dataset(name):
+            entry = entries[name]
+            details = [f"{entry.get('row_count', 0):,} rows"]
+            if entry.get("byte_size"):
+                details.append(f"{entry['byte_size'] / 1024**2:.1f} MB")
+            if entry.get("embedding"):
+                details.append("embedded")
+            return f"{name} ({', '.join(details)})"
+
         selected_dataset = st.sidebar.selectbox(
-            "Select a dataset", dataset_names, key="mongo_dataset_selectbox"
+            "Select a dataset",
+            list(entries),
+            format_func=describe_dataset,
+            key="mongo_dataset_selectbox",
         )
+        if page["total"] > len(entries):
+            st.sidebar.caption(
+                f"Showing {len(entries)} of {page['total']} datasets; type to narrow the list."
+            )
 
         if st.sidebar.button("Load Dataset", key="load_dataset_btn"):
             with st.spinner("Loading dataset from MongoDB..."):
                 try:
-                    df = get_dataset(selected_dataset)
+                    # Very large datasets are not pulled into memory: the explorer
+                    # pages them from MongoDB, charts and insights use a sample
+                    is_sample = (
+                        entries[selected_dataset].get("row_count", 0) > FULL_LOAD_MAX_ROWS
+                    )
+                    source = "remote"
+                    if is_sample:
+                        df = get_dataset_sample(selected_dataset, LARGE_DATASET_SAMPLE_ROWS)
+                    else:
+                        # The local copy is used while it matches the catalog's content hash
+                        df, source = sync.load_dataset(selected_dataset)
 
                     # Store in session state
                     st.session_state.df = df
+                    st.session_state.df_is_sample = is_sample
                     st.session_state.filename = selected_dataset
+                    st.session_state.loaded_upload_key = None
+                    st.session_state.upload_content_hash = None
+                    st.session_state.mongo_dataset = selected_dataset
+                    # Loading keeps a current local copy; the explorer pages that file
+                    local_path = None if is_sample else sync.local_copy_path(selected_dataset)
+                    st.session_state.local_path = str(local_path) if local_path else None
+                    content_hash = (get_dataset_info(selected_dataset) or {}).get(
+                        "content_hash"
+                    )
+                    st.session_state.content_key = (
+                        f"mongo:{selected_dataset}:{content_hash}"
+                        if content_hash and not is_sample
+                        else None
+                    )
                     st.session_state.columnList = df.columns.values.tolist()
                     st.session_state.data_loaded = True
 
                     st.sidebar.success(
                         f"Dataset '{selected_dataset}' loaded successfully!"
+                        + (" (from the local copy)" if source != "remote" else "")
                     )
                 except Exception as e:
                     st.sidebar.error(f"Error loading dataset: {e}")
     except Exception as e:
         st.sidebar.error(f"Error connecting to MongoDB: {e}")
+        handle_offline_datasets()
+
+
+def handle_offline_datasets():
+    """Offers the local copies of datasets while MongoDB is unreachable"""
+    local_datasets = [
+        metadata["dataset_name"]
+        for metadata in OfflineStorage.list_local_datasets()
+        if metadata.get("dataset_name")
+    ]
+    if not local_datasets:
+        return
+    selected_dataset = st.sidebar.selectbox(
+        "Local copies", local_datasets, key="offline_dataset_selectbox"
+    )
+    pending = sync.pending_datasets()
+    if pending:
+        st.sidebar.caption(f"Waiting to sync: {', '.join(pending)}")
+    if st.sidebar.button("Load Local Copy", key="load_offline_dataset_btn"):
+        df = OfflineStorage.load_local_dataset(selected_dataset)
+        if df is None:
+            return
+        st.session_state.df = df
+        st.session_state.df_is_sample = False
+        st.session_state.filename = selected_dataset
+        st.session_state.loaded_upload_key = None
+        st.session_state.upload_content_hash = None
+        st.session_state.mongo_dataset = None
+        st.session_state.local_path = str(DATASETS_DIR / f"{selected_dataset}.parquet")
+        st.session_state.content_key = (
+            f"local:{st.session_state.local_path}:"
+            f"{os.stat(st.session_state.local_path).st_mtime_ns}"
+        )
+        st.session_state.columnList = df.columns.values.tolist()
+        st.session_state.data_loaded = True
+        st.sidebar.success(f"Dataset '{selected_dataset}' loaded from the local copy.")
 
 
 def getIndexes(columnName, value):
@@ -256,6 +491,11 @@ def generate_ai_insights():
                         st.session_state.df,
                         specific_columns=selected_columns if selected_columns else None,
                         question=question if question else None,
+                        # Statistics of the full dataset when df is only a sample
+                        sketch=current_sketch()
+                        if st.session_state.get("df_is_sample")
+                        else None,
+                        content_key=st.session_state.content_key,
                     )
                     st.session_state.insights = insights
                 except Exception as e:
@@ -266,40 +506,75 @@ def generate_ai_insights():
             st.markdown(st.session_state.insights)
 
 
-def get_sample_data_for_viz(df, max_unique_values=100, sample_size=10000):
+def get_sample_data_for_viz(df, max_unique_values=100, sample_size=VIZ_SAMPLE_SIZE):
     """Get a sample of data for visualization to handle large datasets efficiently"""
     # If dataset is large, sample it first
-    if len(df) > sample_size:
-        df_sample = df.sample(n=sample_size, random_state=42)
+    df_sample = sample_for_viz(df, sample_size)
+    if len(df_sample) < len(df):
         st.info(
             f"Dataset is large ({len(df):,} rows). Using a sample of {sample_size:,} rows for visualization."
         )
-    else:
-        df_sample = df
-
     return df_sample
 
 
 def prepare_visualization_data(df, x_column, y_column, selected_values):
     """Efficiently prepare data for visualization"""
     try:
-        # Filter data based on selected values
-        filtered_df = df[df[x_column].isin(selected_values)]
-
-        # Group by x_column and aggregate y_column
-        if pd.api.types.is_numeric_dtype(filtered_df[y_column]):
-            # For numeric data, calculate mean
-            viz_data = filtered_df.groupby(x_column)[y_column].mean().reset_index()
-            return viz_data[x_column].tolist(), viz_data[y_column].tolist()
-        else:
-            # For non-numeric data, count occurrences
-            viz_data = filtered_df.groupby(x_column)[y_column].count().reset_index()
-            return viz_data[x_column].tolist(), viz_data[y_column].tolist()
+        if st.session_state.get("df_is_sample") and st.session_state.mongo_dataset:
+            # Streamed over the full dataset, so the chart is exact, not sampled
+            version = (get_dataset_info(st.session_state.mongo_dataset) or {}).get("version")
+            return aggregate_full_dataset(
+                st.session_state.mongo_dataset,
+                version,
+                x_column,
+                y_column,
+                tuple(selected_values),
+                pd.api.types.is_numeric_dtype(df[y_column]),
+            )
+        return aggregate_for_viz(df, x_column, y_column, selected_values)
     except Exception as e:
         st.error(f"Error preparing visualization data: {e}")
         return [], []
 
 
+def query_tab():
+    """SQL over stored datasets, each referenced by name as a table"""
+    st.header("Query Datasets with SQL")
+    if not query_engine_available():
+        st.info("The SQL engine needs DuckDB: `pip install duckdb`")
+        return
+
+    default_table = st.session_state.mongo_dataset or st.session_state.filename or "dataset"
+    sql = st.text_area(
+        "SQL (SELECT only; joins and window functions are supported)",
+        value=f'SELECT * FROM "{default_table}" LIMIT 100',
+        height=150,
+        key="query_sql_input",
+    )
+    st.caption(
+        "Tables are stored datasets: local copies when current, otherwise snapshots "
+        f"exported from MongoDB. Up to {PREVIEW_ROWS:,} rows are shown."
+    )
+    if st.button("Run Query", key="run_query_btn"):
+        with st.spinner("Running query..."):
+            try:
+                started = time.perf_counter()
+                table, truncated = run_query(sql)
+                elapsed = time.perf_counter() - started
+            except QueryError as e:
+                st.error(f"Query failed: {e}")
+                return
+            except Exception as e:
+                st.error(f"Error running query: {e}")
+                return
+        st.dataframe(table.to_pandas(), hide_index=True)
+        st.caption(
+            f"{table.num_rows:,} rows"
+            + (" (truncated)" if truncated else "")
+            + f" · {elapsed * 1000:.0f} ms"
+        )
+
+
 def mainContent():
     st.title("AI-Powered Data Visualization")
     st.markdown(
@@ -312,18 +587,23 @@ def mainContent():
         return
 
     # Display tabs for different sections
-    tab1, tab2, tab3, tab4 = st.tabs(
-        ["Data Explorer", "Visualization", "AI Insights", "Vector Search"]
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(
+        ["Data Explorer", "Visualization", "AI Insights", "Vector Search", "Query"]
     )  # Added Vector Search Tab
 
-    with tab1:
+    # Rendered first: the Visualization tab returns early when it has nothing to show
+    with tab5, stage("Query"):
+        query_tab()
+
+    with tab1, stage("Data Explorer"):
         st.header("Data Explorer")
 
         # Show dataset info
         st.subheader("Dataset Information")
+        pager = current_pager()
         col1, col2, col3 = st.columns(3)
         with col1:
-            st.metric("Rows", f"{len(st.session_state.df):,}")
+            st.metric("Rows", f"{pager.total_rows:,}")
         with col2:
             st.metric("Columns", len(st.session_state.df.columns))
         with col3:
@@ -332,13 +612,49 @@ def mainContent():
                 f"{st.session_state.df.memory_usage(deep=True).sum() / 1024**2:.1f} MB",
             )
 
-        paginated_dataframe(st.session_state.df)
+        if st.session_state.get("df_is_sample"):
+            st.caption(
+                f"Only a {len(st.session_state.df):,}-row sample is in memory. Chart values "
+                "and insight statistics are computed over the full dataset; the table "
+                "below pages through it in MongoDB."
+            )
+        paginated_dataframe(pager)
+
+        if st.session_state.mongo_dataset:
+            indexes = (get_dataset_info(st.session_state.mongo_dataset) or {}).get(
+                "indexes"
+            )
+            if indexes and st.checkbox("Show MongoDB Indexes", key="show_indexes_checkbox"):
+                st.dataframe(
+                    pd.DataFrame(
+                        [
+                            {
+                                "index": name,
+                                "columns": ", ".join(info.get("columns", [])),
+                                "status": info.get("status"),
+                                "size_kb": (info.get("size_bytes") or 0) / 1024,
+                                "accesses": info.get("accesses"),
+                                "managed": info.get("managed", False),
+                            }
+                            for name, info in indexes.items()
+                        ]
+                    ),
+                    hide_index=True,
+                )
 
         # Display basic statistics
         if st.checkbox("Show Statistics", key="show_stats_checkbox"):
-            st.write(st.session_state.df.describe())
+            # Served from streaming sketches: no full scan, exact count/mean/min/max,
+            # approximate quantiles and distinct counts
+            with stage("describe"):
+                sketch = current_sketch()
+                st.write(
+                    sketch.summary()
+                    if sketch is not None
+                    else st.session_state.df.describe()
+                )
 
-    with tab2:
+    with tab2, stage("Visualization"):
         st.header("Visualize Your Data")
 
         if len(st.session_state.df) == 0:
@@ -349,7 +665,8 @@ def mainContent():
         st.subheader("Configure Visualization")
 
         # Get sample data for large datasets
-        viz_df = get_sample_data_for_viz(st.session_state.df)
+        with stage("get_sample_data_for_viz"):
+            viz_df = get_sample_data_for_viz(st.session_state.df)
 
         # Select X and Y columns
         col1, col2 = st.columns(2)
@@ -369,13 +686,25 @@ def mainContent():
                 key="y_column_select",
             )
 
+        # Chart axes of MongoDB datasets feed the index advisor (once per change)
+        usage_key = (st.session_state.mongo_dataset, x_column)
+        if (
+            st.session_state.mongo_dataset
+            and st.session_state.get("recorded_x_axis") != usage_key
+        ):
+            record_column_usage(st.session_state.mongo_dataset, [x_column], "x_axis")
+            st.session_state.recorded_x_axis = usage_key
+
         # Get unique values for X column (with limit for performance)
         try:
-            unique_values = viz_df[x_column].value_counts().head(50).index.tolist()
+            with stage("value_counts"):
+                unique_values, distinct_count = top_x_values(
+                    viz_df, x_column, current_sketch()
+                )
 
-            if len(viz_df[x_column].unique()) > 50:
+            if distinct_count > len(unique_values):
                 st.info(
-                    f"Showing top 50 most frequent values from {len(viz_df[x_column].unique())} unique values in '{x_column}'"
+                    f"Showing top {len(unique_values)} most frequent values from ~{distinct_count:,} unique values in '{x_column}'"
                 )
 
             selectedData = st.multiselect(
@@ -392,7 +721,9 @@ def mainContent():
                 return
 
             # Prepare data for visualization
-            with st.spinner("Preparing visualization data..."):
+            with st.spinner("Preparing visualization data..."), stage(
+                "prepare_visualization_data"
+            ):
                 labels, values = prepare_visualization_data(
                     viz_df, x_column, y_column, selectedData
                 )
@@ -423,25 +754,29 @@ def mainContent():
                 if len(values) > 0 and all(
                     isinstance(val, (int, float)) and val >= 0 for val in values
                 ):
-                    fig, ax = plt.subplots(figsize=(10, 8))
-                    wedges, texts, autotexts = ax.pie(
-                        values, labels=labels, autopct="%1.1f%%", startangle=90
-                    )
-                    ax.set_title(f"{y_column} by {x_column}")
-
-                    # Improve readability for many labels
-                    if len(labels) > 8:
-                        ax.legend(
-                            wedges,
-                            labels,
-                            title=x_column,
-                            loc="center left",
-                            bbox_to_anchor=(1, 0, 0.5, 1),
-                        )
-                        plt.setp(texts, visible=False)
+                    with stage("matplotlib"):
+                        # Imported on demand: matplotlib is only needed for pie charts
+                        import matplotlib.pyplot as plt
 
-                    st.pyplot(fig)
-                    plt.close()
+                        fig, ax = plt.subplots(figsize=(10, 8))
+                        wedges, texts, autotexts = ax.pie(
+                            values, labels=labels, autopct="%1.1f%%", startangle=90
+                        )
+                        ax.set_title(f"{y_column} by {x_column}")
+
+                        # Improve readability for many labels
+                        if len(labels) > 8:
+                            ax.legend(
+                                wedges,
+                                labels,
+                                title=x_column,
+                                loc="center left",
+                                bbox_to_anchor=(1, 0, 0.5, 1),
+                            )
+                            plt.setp(texts, visible=False)
+
+                        st.pyplot(fig)
+                        plt.close()
                 else:
                     st.info("Pie chart requires positive numeric values")
 
@@ -451,10 +786,10 @@ def mainContent():
                 "Try selecting different columns or reducing the number of selected values."
             )
 
-    with tab3:
+    with tab3, stage("AI Insights"):
         generate_ai_insights()
 
-    with tab4:  # New Tab for Vector Search
+    with tab4, stage("Vector Search"):  # New Tab for Vector Search
         st.header("Semantic Search with AI Embeddings")
 
         if (
@@ -467,6 +802,38 @@ def mainContent():
             )
             return
 
+        index_info = get_dataset_info(st.session_state.filename) or {}
+        checked = st.session_state.setdefault("vector_index_checked_at", {})
+        if not (index_info.get("vector_index") or {}).get("queryable", True) and (
+            time.monotonic() - checked.get(st.session_state.filename, float("-inf"))
+            >= VECTOR_INDEX_REFRESH_SECONDS
+        ):
+            # Only poll Atlas while the index is still building, and not on every rerun
+            checked[st.session_state.filename] = time.monotonic()
+            index_info = refresh_vector_index_status(st.session_state.filename)
+        vector_index = index_info.get("vector_index") or {}
+        tuning = index_info.get("search_tuning") or {}
+        if vector_index.get("queryable"):
+            st.caption(
+                "Atlas vector index ready"
+                + (
+                    f" · quantization {vector_index['quantization']}"
+                    if vector_index.get("quantization", "none") != "none"
+                    else ""
+                )
+                + (
+                    f" · numCandidates tuned to {tuning['num_candidates_multiplier']}× "
+                    f"results (recall {tuning['recall']:.2f})"
+                    if tuning
+                    else ""
+                )
+            )
+        elif vector_index:
+            st.caption(
+                f"Atlas vector index: {vector_index.get('status', 'unknown')}. "
+                "Searches use an exact local scan until it is queryable."
+            )
+
         # Input for search query
         search_query = st.text_input(
             "Enter your search query:", key="vector_search_query"
@@ -529,11 +896,39 @@ def mainContent():
             key="vector_search_num_results",
         )
 
+        with st.expander("Filters and keyword prefilter"):
+            search_filters_text = st.text_area(
+                "Metadata filter (MongoDB filter JSON, optional)",
+                placeholder='{"region": "EU", "price": {"$lt": 100}}',
+                key="vector_search_filters",
+            )
+            search_keyword = st.text_input(
+                "Keyword prefilter (optional, matched against the displayed text field)",
+                key="vector_search_keyword",
+            )
+            num_candidates = st.slider(
+                "Candidates to consider",
+                min_value=num_results,
+                max_value=1000,
+                value=min(
+                    num_results * tuning.get("num_candidates_multiplier", 10), 1000
+                ),
+                key="vector_search_num_candidates",
+            )
+
         if st.button("Search", key="vector_search_button"):
             if not search_query:
                 st.warning("Please enter a search query.")
                 return
 
+            try:
+                search_filters = (
+                    json.loads(search_filters_text) if search_filters_text else None
+                )
+            except json.JSONDecodeError as e:
+                st.error(f"Invalid filter JSON: {e}")
+                return
+
             with st.spinner("Performing vector search..."):
                 try:
                     # Assuming 'embedding' is the field where vectors are stored
@@ -544,23 +939,73 @@ def mainContent():
                         index_field="embedding",
                         num_results=num_results,
                         text_field_to_return=text_field_to_return,
+                        filters=search_filters,
+                        keyword=search_keyword or None,
+                        num_candidates=num_candidates,
                     )
 
                     if not search_results_df.empty:
                         st.subheader("Search Results")
                         st.dataframe(search_results_df)
+                        stats = search_results_df.attrs.get("search_stats", {})
+                        if stats:
+                            st.caption(
+                                f"Engine: {stats['engine']} · "
+                                f"{stats['latency_ms']:.0f} ms · "
+                                f"{stats['num_candidates']} candidates"
+                                + (
+                                    f" · cached ({stats['cache']})"
+                                    if stats.get("cache") in ("hit", "similar")
+                                    else ""
+                                )
+                            )
                     else:
                         st.info(
                             "No results found, or an error occurred during the search. "
-                            "Ensure the dataset was stored with embeddings and the vector index is configured in MongoDB Atlas."
+                            "Ensure the dataset was stored with embeddings."
                         )
                 except Exception as e:
                     st.error(f"Error during vector search: {e}")
                     st.error(
-                        "Please ensure your MongoDB Atlas instance is configured for vector search and the index 'vector_index' exists."
+                        "Please ensure the dataset was stored in MongoDB with embeddings."
                     )
 
 
+def show_profile_panel(rerun_profile):
+    """Developer panel with the stage breakdown of the rerun that just finished"""
+    history = st.session_state.setdefault("profile_history", [])
+    history.append(round(rerun_profile.duration * 1000, 1))
+    del history[:-20]
+
+    with st.sidebar.expander("Developer: rerun profile", expanded=False):
+        st.metric("Rerun time", f"{rerun_profile.duration * 1000:.0f} ms")
+        st.caption(
+            f"{rerun_profile.sample_count} stack samples · "
+            f"last {len(history)} reruns (ms): {', '.join(map(str, history))}"
+        )
+        st.dataframe(pd.DataFrame(rerun_profile.breakdown()), hide_index=True)
+        st.download_button(
+            "Download stage flamegraph (folded)",
+            rerun_profile.folded_stages(),
+            file_name="rerun.stages.folded",
+            key="profile_stages_download",
+        )
+        st.download_button(
+            "Download sampled flamegraph (folded)",
+            rerun_profile.folded_samples(),
+            file_name="rerun.samples.folded",
+            key="profile_samples_download",
+        )
+
+
 if __name__ == "__main__":
-    sidebar()
-    mainContent()
+    if profiling_enabled(st.query_params.get(PROFILE_QUERY_PARAM)):
+        with profile("streamlit rerun") as rerun_profile:
+            with stage("sidebar"):
+                sidebar()
+            with stage("mainContent"):
+                mainContent()
+        show_profile_panel(rerun_profile)
+    else:
+        sidebar()
+        mainContent()
@@ -0,0 +1,244 @@
+"""
+Admission control for expensive API endpoints
+Each heavy endpoint has its own concurrency limit with a bounded, priority-
+ordered wait queue, and all of them share a "heavy" pool sized below the
+worker thread pool, so reads always find a free thread. Callers are also
+rate limited per API key with token buckets. Requests that cannot be admitted
+in time are shed with a Retry-After hint instead of piling up in memory.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+from src.config import get_setting
+from src.metrics import (
+    ADMISSION_IN_FLIGHT,
+    ADMISSION_QUEUE_DEPTH,
+    ADMISSION_REJECTIONS,
+    ADMISSION_WAIT,
+)
+
+# Threads of the API's worker pool (anyio's default) the heavy lanes may hold
+# at once; the rest stay free for cheap reads
+WORKER_THREADS = 40
+HEAVY_POOL_CONCURRENCY = 12
+HEAVY_POOL_QUEUE = 64
+DEFAULT_RATE_PER_MINUTE = 120
+DEFAULT_BURST = 30
+# Buckets kept for distinct API keys / client addresses
+MAX_TRACKED_CLIENTS = 10000
+
+# Per-endpoint policy: concurrency, queue size, seconds a request may wait,
+# priority in the shared heavy pool (higher first) and tokens taken from the
+# caller's bucket. Cheap, short calls outrank long ones; uploads hold memory
+# the longest.
+LANES = {
+    "embedding": {"concurrency": 8, "queue_size": 32, "max_wait": 10.0, "priority": 2, "cost": 1},
+    "insights": {"concurrency": 4, "queue_size": 16, "max_wait": 30.0, "priority": 1, "cost": 5},
+    "query": {"concurrency": 4, "queue_size": 16, "max_wait": 30.0, "priority": 1, "cost": 5},
+    "upload": {"concurrency": 2, "queue_size": 8, "max_wait": 30.0, "priority": 0, "cost": 10},
+}
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed; retry_after is in whole seconds"""
+
+    def __init__(self, limiter, reason, retry_after):
+        super().__init__(f"{limiter}: {reason}, retry after {retry_after}s")
+        self.limiter = limiter
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Limiter:
+    """Async semaphore with a bounded wait queue served highest priority first"""
+
+    def __init__(self, name, concurrency, queue_size, max_wait=30.0):
+        self.name = name
+        self.concurrency = int(concurrency)
+        self.queue_size = int(queue_size)
+        self.max_wait = float(max_wait)
+        self.active = 0
+        self._waiters = []
+        self._order = itertools.count()
+        # Smoothed seconds a slot is held, for Retry-After estimates
+        self._hold_seconds = 1.0
+
+    @property
+    def queue_depth(self):
+        return sum(1 for *_, waiter in self._waiters if not waiter.done())
+
+    def retry_after(self):
+        backlog = self.queue_depth + 1
+        return max(1, math.ceil(self._hold_seconds * backlog / self.concurrency))
+
+    def _reject(self, reason):
+        ADMISSION_REJECTIONS.inc(limiter=self.name, reason=reason)
+        raise AdmissionRejected(self.name, reason, self.retry_after())
+
+    async def acquire(self, priority=0, timeout=None):
+        if self.active < self.concurrency and not self.queue_depth:
+            self._admitted(0.0)
+            return
+        if self.queue_depth >= self.queue_size:
+            self._reject("queue_full")
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (-priority, next(self._order), waiter))
+        ADMISSION_QUEUE_DEPTH.set(self.queue_depth, limiter=self.name)
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(
+                asyncio.shield(waiter), self.max_wait if timeout is None else timeout
+            )
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the wait expired; give it back
+                self.release(0.0)
+            waiter.cancel()
+            ADMISSION_QUEUE_DEPTH.set(self.queue_depth, limiter=self.name)
+            self._reject("timeout")
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release(0.0)
+            waiter.cancel()
+            raise
+        ADMISSION_QUEUE_DEPTH.set(self.queue_depth, limiter=self.name)
+        self._admitted(time.monotonic() - started, handed_over=True)
+
+    def _admitted(self, waited, handed_over=False):
+        if not handed_over:
+            self.active += 1
+        ADMISSION_IN_FLIGHT.set(self.active, limiter=self.name)
+        ADMISSION_WAIT.observe(waited, limiter=self.name)
+
+    def release(self, held_seconds):
+        self._hold_seconds = 0.8 * self._hold_seconds + 0.2 * held_seconds
+        # Hand the slot straight to the best live waiter, so it cannot be jumped
+        while self._waiters:
+            *_, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+        ADMISSION_IN_FLIGHT.set(self.active, limiter=self.name)
+
+    @asynccontextmanager
+    async def slot(self, priority=0, timeout=None):
+        await self.acquire(priority, timeout)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+
+class TokenBucket:
+    """Refills rate tokens per second up to burst"""
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self, cost=1.0):
+        """Takes cost tokens; returns 0 on success, else seconds until they are available"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        cost = min(float(cost), self.burst)
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Per-client token buckets, least recently seen clients forgotten first"""
+
+    def __init__(self, rate_per_minute=DEFAULT_RATE_PER_MINUTE, burst=DEFAULT_BURST):
+        self.rate = float(rate_per_minute) / 60.0
+        self.burst = float(burst)
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, client, cost, limiter_name):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = TokenBucket(self.rate, self.burst)
+                while len(self._buckets) > MAX_TRACKED_CLIENTS:
+                    self._buckets.popitem(last=False)
+            self._buckets.move_to_end(client)
+            wait = bucket.take(cost)
+        if wait:
+            ADMISSION_REJECTIONS.inc(limiter=limiter_name, reason="rate_limited")
+            raise AdmissionRejected(limiter_name, "rate_limited", max(1, math.ceil(wait)))
+
+
+def admission_enabled():
+    return str(get_setting("ADMISSION_CONTROL", "1")).lower() not in {"0", "false", "no", "off"}
+
+
+class AdmissionController:
+    """Rate limit, then the endpoint's lane, then the shared heavy pool"""
+
+    def __init__(self, lanes=None, heavy_concurrency=HEAVY_POOL_CONCURRENCY):
+        self.lanes = dict(lanes or LANES)
+        self.limiters = {
+            name: Limiter(name, lane["concurrency"], lane["queue_size"], lane["max_wait"])
+            for name, lane in self.lanes.items()
+        }
+        self.heavy = Limiter(
+            "heavy", min(int(heavy_concurrency), WORKER_THREADS - 1), HEAVY_POOL_QUEUE
+        )
+        self.rate_limiter = RateLimiter(
+            get_setting("RATE_LIMIT_PER_MINUTE", DEFAULT_RATE_PER_MINUTE),
+            get_setting("RATE_LIMIT_BURST", DEFAULT_BURST),
+        )
+
+    @asynccontextmanager
+    async def admit(self, lane_name, client):
+        """Holds a slot for the enclosed work or raises AdmissionRejected"""
+        if not admission_enabled():
+            yield
+            return
+        lane = self.lanes[lane_name]
+        self.rate_limiter.check(client, lane["cost"], lane_name)
+        deadline = time.monotonic() + lane["max_wait"]
+        async with self.limiters[lane_name].slot(lane["priority"]):
+            # Time spent in the lane's queue counts against the same wait budget
+            remaining = max(deadline - time.monotonic(), 0.001)
+            async with self.heavy.slot(lane["priority"], timeout=remaining):
+                yield
+
+    def status(self):
+        """Active slots and queue depth per limiter"""
+        return {
+            limiter.name: {
+                "active": limiter.active,
+                "concurrency": limiter.concurrency,
+                "queued": limiter.queue_depth,
+                "queue_size": limiter.queue_size,
+            }
+            for limiter in [*self.limiters.values(), self.heavy]
+        }
+
+
+_controller = None
+
+
+def get_admission_controller():
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController(
+            heavy_concurrency=get_setting("ADMISSION_HEAVY_CONCURRENCY", HEAVY_POOL_CONCURRENCY)
+        )
+    return _controller
@@ -1,85 +1,91 @@
-from google import genai
-import streamlit as st
+from functools import lru_cache
 
-# Get Google API key from environment variables
-GOOGLE_API_KEY = st.secrets["GOOGLE_CLOUD_API_KEY"]
+from src.config import require_setting
+from src.embeddings import get_embedding_provider
+from src.metrics import (
+    GEMINI_ERRORS,
+    GEMINI_REQUEST_DURATION,
+    GEMINI_TOKENS,
+    instrumented,
+)
 
-# Configure the Gemini API
-client = genai.Client(api_key=GOOGLE_API_KEY)
 
+@lru_cache(maxsize=None)
+def get_genai_client():
+    """Returns the shared Gemini client, created (and the SDK imported) on first use"""
+    from google import genai
 
-def get_data_insights(dataframe, specific_columns=None, question=None):
-    """Generate insights from a dataframe using Gemini AI"""
+    # Get Google API key from environment variables
+    return genai.Client(api_key=require_setting("GOOGLE_CLOUD_API_KEY"))
+
+
+@instrumented("get_data_insights")
+def get_data_insights(
+    dataframe,
+    specific_columns=None,
+    question=None,
+    token_budget=None,
+    sketch=None,
+    content_key=None,
+):
+    """Generate insights from a dataframe using Gemini AI.
+
+    For datasets too large to load, pass a sample as dataframe and the full
+    dataset's column sketch as sketch. token_budget defaults to
+    DEFAULT_TOKEN_BUDGET; content_key (e.g. a content hash)
+    lets the frame's column profile be reused.
+    """
     # Create a model instance
     # model = genai.GenerativeModel("gemini-2.5-flash-preview-04-17")
 
-    # Prepare the dataframe information
-    df_info = dataframe.describe().to_string()
-    df_head = dataframe.head(5).to_string()
-
-    # Prepare column information if specific columns are provided
-    column_info = ""
-    if specific_columns:
-        for col in specific_columns:
-            if col in dataframe.columns:
-                column_info += f"\nColumn {col} statistics:\n"
-                column_info += dataframe[col].describe().to_string()
-
-    # Prepare the prompt
-    if question:
-        prompt = f"""I have a dataset with the following statistics:
-        {df_info}
-        
-        Here's a sample of the data:
-        {df_head}
-        
-        {column_info}
-        
-        Based on this data, please answer the following question: {question}
-        Provide a detailed analysis with key insights."""
-    else:
-        prompt = f"""I have a dataset with the following statistics:
-        {df_info}
-        
-        Here's a sample of the data:
-        {df_head}
-        
-        {column_info}
-        
-        Based on this data, please provide:
-        1. A summary of the key patterns and trends
-        2. Interesting insights or anomalies
-        3. Suggestions for visualizations that would best represent this data
-        4. Potential research questions that could be explored
-        
-        Format your response in markdown with clear sections."""
+    # Imported on first use: the prompt builder pulls in pandas (see bench_startup.py)
+    from src.prompt_builder import DEFAULT_TOKEN_BUDGET, build_insights_prompt
 
-    # Generate the response
-    response = client.models.generate_content(
-        model="gemini-2.0-flash-001", contents=prompt
+    # Compact summary from a cached profile: prompt size (and latency) stays
+    # bounded by token_budget no matter how wide or long the frame is
+    prompt = build_insights_prompt(
+        dataframe,
+        specific_columns=specific_columns,
+        question=question,
+        token_budget=token_budget or DEFAULT_TOKEN_BUDGET,
+        sketch=sketch,
+        content_key=content_key,
     )
+
+    # Generate the response
+    try:
+        with GEMINI_REQUEST_DURATION.time(call="generate_content"):
+            response = get_genai_client().models.generate_content(
+                model="gemini-2.0-flash-001", contents=prompt
+            )
+    except Exception:
+        GEMINI_ERRORS.inc(call="generate_content")
+        raise
+
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        GEMINI_TOKENS.inc(
+            usage.prompt_token_count or 0, call="generate_content", kind="prompt"
+        )
+        GEMINI_TOKENS.inc(
+            usage.candidates_token_count or 0, call="generate_content", kind="output"
+        )
     return response.text
 
 
-def generate_text_embedding(text_to_embed):
-    """Generates an embedding for the given text using Gemini AI."""
+def generate_text_embedding(text_to_embed, provider=None):
+    """Generates an embedding for the given text with the configured embedding provider.
+
+    Empty input embeds to a zero vector; provider failures raise EmbeddingError
+    instead of silently returning zeros.
+    """
+    embedding_provider = get_embedding_provider(provider)
     if not text_to_embed or not isinstance(text_to_embed, str):
-        # Return None or a zero vector if the input is not suitable.
-        # The size of the zero vector should match the embedding dimension.
-        # For 'models/text-embedding-004', the dimension is 768.
-        # Alternatively, raise an error or handle as appropriate.
-        return [0.0] * 768  # Or None, depending on how you want to handle it downstream
+        # The size of the zero vector matches the provider's dimension
+        return [0.0] * embedding_provider.dimension
+    return embedding_provider.embed([text_to_embed])[0].tolist()
 
-    try:
-        # Using a specific model for embeddings, e.g., 'models/text-embedding-004'
-        # Ensure this model is available and appropriate for your use case.
-        result = genai.embed_content(
-            model="models/text-embedding-004",
-            content=text_to_embed,
-            task_type="RETRIEVAL_DOCUMENT",  # or RETRIEVAL_QUERY, SEMANTIC_SIMILARITY etc.
-        )
-        return result["embedding"]
-    except Exception as e:
-        print(f"Error generating embedding: {e}")
-        # Return a zero vector or None in case of an error to avoid breaking the pipeline
-        return [0.0] * 768  # Or None
+
+def generate_text_embeddings(texts, task_type="RETRIEVAL_DOCUMENT", provider=None):
+    """Generates embeddings for a list of texts as one (len(texts), dimension) matrix."""
+    return get_embedding_provider(provider).embed(list(texts), task_type=task_type)
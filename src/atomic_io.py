@@ -0,0 +1,292 @@
+"""
+Crash-safe local file writes for OfflineStorage
+Files are written to temporary siblings and renamed into place. A group of
+files that must change together (a dataset's Parquet data and its metadata)
+is committed through a write-ahead manifest, so a crash either leaves the old
+versions or, after recovery, all of the new ones. Per-key file locks let any
+number of readers (threads or processes) share a key while writers take it
+exclusively; different keys never wait on each other.
+"""
+import hashlib
+import json
+import os
+import secrets
+import threading
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: locks fall back to this process only
+    fcntl = None
+
+TEMP_SUFFIX = ".tmp"
+# The manifest is compacted once it grows past this many bytes
+MANIFEST_COMPACT_BYTES = 64 * 1024
+
+_local_locks = {}
+_local_locks_guard = threading.Lock()
+
+
+def _fsync_directory(directory):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return  # Not supported on this platform
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def file_lock(lock_dir, key, shared=False):
+    """Holds a shared (reader) or exclusive (writer) lock on key.
+
+    Backed by flock on a per-key lock file, so it also excludes other
+    processes; without fcntl every lock is exclusive and process-local.
+    """
+    lock_dir = Path(lock_dir)
+    if fcntl is None:
+        with _local_locks_guard:
+            lock = _local_locks.setdefault((str(lock_dir), key), threading.RLock())
+        with lock:
+            yield
+        return
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    path = lock_dir / (hashlib.sha1(key.encode()).hexdigest()[:20] + ".lock")
+    with open(path, "a+") as handle:
+        fcntl.flock(handle, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+_boot_id = None
+
+
+def _process_start(pid):
+    """Boot id plus start time of pid, or None where /proc is unavailable.
+
+    Together with the pid it names one process: a pid reused after a restart
+    (common in containers, where numbering starts over) has another start time.
+    """
+    global _boot_id
+    try:
+        if _boot_id is None:
+            with open("/proc/sys/kernel/random/boot_id") as handle:
+                _boot_id = handle.read().strip().replace("-", "")[:8]
+        with open(f"/proc/{pid}/stat") as handle:
+            stat = handle.read()
+    except OSError:
+        return None
+    # starttime is field 22; fields are counted after the parenthesized command name
+    return f"{_boot_id}{stat.rsplit(')', 1)[1].split()[19]}"
+
+
+def _writer_token():
+    """Identifies the current process as "<pid>-<start>" (or "<pid>" without /proc)"""
+    pid = os.getpid()
+    start = _process_start(pid)
+    return f"{pid}-{start}" if start else str(pid)
+
+
+def _writer_alive(token):
+    pid, _, start = token.partition("-")
+    if not _pid_alive(int(pid)):
+        return False
+    # Tokens without a start time (no /proc) trust the pid
+    return not start or _process_start(int(pid)) in (None, start)
+
+
+def temp_path(final_path):
+    """Hidden sibling of final_path; the writer token lets recovery tell live writers from dead ones"""
+    final_path = Path(final_path)
+    return final_path.with_name(
+        f".{final_path.name}.{_writer_token()}.{secrets.token_hex(4)}{TEMP_SUFFIX}"
+    )
+
+
+def _fsync_file(path):
+    with open(path, "rb") as handle:
+        os.fsync(handle.fileno())
+
+
+def atomic_write_text(final_path, text):
+    """Replaces one file atomically (no manifest needed for a single rename)"""
+    final_path = Path(final_path)
+    temp = temp_path(final_path)
+    try:
+        with open(temp, "w") as handle:
+            handle.write(text)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(temp, final_path)
+    except BaseException:
+        temp.unlink(missing_ok=True)
+        raise
+    _fsync_directory(final_path.parent)
+
+
+def _pid_alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+class WriteAheadManifest:
+    """Redo log of multi-file commits.
+
+    A commit writes every new file to a temporary sibling, appends one
+    ``commit`` record naming the renames, performs them, runs the commit's
+    ``after_apply`` callbacks and appends ``done``. ``recover`` redoes the
+    renames of committed-but-unfinished records, returning their targets so
+    the caller can redo its own bookkeeping, and deletes temporaries left by
+    writers that died before committing.
+    """
+
+    def __init__(self, path, lock_dir):
+        self.path = Path(path)
+        self.lock_dir = lock_dir
+
+    def _append(self, record):
+        with file_lock(self.lock_dir, "manifest"):
+            with open(self.path, "a") as handle:
+                handle.write(json.dumps(record) + "\n")
+                handle.flush()
+                os.fsync(handle.fileno())
+
+    def _records(self):
+        records = []
+        try:
+            with open(self.path) as handle:
+                for line in handle:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        break  # Torn last line of a crashed append
+        except FileNotFoundError:
+            pass
+        return records
+
+    def _unfinished(self, records):
+        done = {record["txn"] for record in records if record.get("state") == "done"}
+        return [
+            record
+            for record in records
+            if record.get("state") == "commit" and record["txn"] not in done
+        ]
+
+    @contextmanager
+    def commit(self, lock_key=None):
+        """Yields a Commit; on a clean exit its files replace their targets together
+
+        The exclusive lock on ``lock_key`` is held throughout; pass None when
+        the caller already holds it.
+        """
+        lock = file_lock(self.lock_dir, lock_key) if lock_key else nullcontext()
+        with lock:
+            current = Commit()
+            try:
+                yield current
+            except BaseException:
+                current.discard()
+                raise
+            current.sync()
+            txn = f"{_writer_token()}:{secrets.token_hex(6)}"
+            self._append({"txn": txn, "state": "commit", "renames": current.renames()})
+            current.apply()
+            current.run_callbacks()
+            self._append({"txn": txn, "state": "done"})
+        if self.path.stat().st_size > MANIFEST_COMPACT_BYTES:
+            self.compact()
+
+    def compact(self):
+        """Rewrites the manifest keeping only unfinished commits"""
+        with file_lock(self.lock_dir, "manifest"):
+            pending = self._unfinished(self._records())
+            atomic_write_text(
+                self.path, "".join(json.dumps(record) + "\n" for record in pending)
+            )
+
+    def recover(self, directories):
+        """Finishes interrupted commits and removes temporaries of dead writers.
+
+        Returns the target paths of the commits it finished.
+        """
+        finished = []
+        with file_lock(self.lock_dir, "manifest"):
+            for record in self._unfinished(self._records()):
+                writer = record["txn"].split(":", 1)[0]
+                if _writer_alive(writer):
+                    continue  # Its writer is still applying it
+                for temp, final in record["renames"]:
+                    if Path(temp).exists():
+                        os.replace(temp, final)
+                    finished.append(Path(final))
+                with open(self.path, "a") as handle:
+                    handle.write(json.dumps({"txn": record["txn"], "state": "done"}) + "\n")
+        for directory in directories:
+            for temp in Path(directory).glob(f".*{TEMP_SUFFIX}"):
+                try:
+                    writer = temp.name.rsplit(".", 3)[1]
+                    alive = _writer_alive(writer)
+                except (IndexError, ValueError):
+                    continue
+                if not alive:
+                    temp.unlink(missing_ok=True)
+        self.compact()
+        return finished
+
+
+class Commit:
+    """Files staged for one manifest commit"""
+
+    def __init__(self):
+        self._files = {}
+        self._callbacks = []
+
+    def path(self, final_path):
+        """Temporary path to write the new version of final_path to"""
+        final_path = Path(final_path)
+        temp = temp_path(final_path)
+        self._files[final_path] = temp
+        return temp
+
+    def write_text(self, final_path, text):
+        with open(self.path(final_path), "w") as handle:
+            handle.write(text)
+
+    def after_apply(self, callback):
+        """Runs callback() once the files are in place, before the commit is marked done"""
+        self._callbacks.append(callback)
+
+    def run_callbacks(self):
+        for callback in self._callbacks:
+            callback()
+
+    def renames(self):
+        return [[str(temp), str(final)] for final, temp in self._files.items()]
+
+    def sync(self):
+        for temp in self._files.values():
+            _fsync_file(temp)
+
+    def apply(self):
+        for final, temp in self._files.items():
+            os.replace(temp, final)
+        for directory in {final.parent for final in self._files}:
+            _fsync_directory(directory)
+
+    def discard(self):
+        for temp in self._files.values():
+            temp.unlink(missing_ok=True)
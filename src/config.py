@@ -0,0 +1,57 @@
+"""
+Configuration for Plot Pyre
+Reads settings from environment variables (and a local .env file), falling back
+to Streamlit secrets only when running inside the Streamlit app
+"""
+import os
+import sys
+from functools import lru_cache
+from pathlib import Path
+
+ENV_FILE = Path(__file__).resolve().parent.parent / ".env"
+
+
+@lru_cache(maxsize=None)
+def _dotenv_values():
+    """Parses KEY=VALUE lines from the project's .env file, if present"""
+    values = {}
+    if not ENV_FILE.exists():
+        return values
+    for line in ENV_FILE.read_text().splitlines():
+        line = line.strip()
+        if not line or line.startswith("#") or "=" not in line:
+            continue
+        key, value = line.split("=", 1)
+        values[key.strip()] = value.strip().strip("'\"")
+    return values
+
+
+def get_setting(name, default=None):
+    """Returns a setting from the environment, .env or Streamlit secrets (in that order)"""
+    value = os.environ.get(name)
+    if value is not None:
+        return value
+
+    value = _dotenv_values().get(name)
+    if value is not None:
+        return value
+
+    # Never import Streamlit just to read a setting; the API runs without it
+    streamlit = sys.modules.get("streamlit")
+    if streamlit is not None:
+        try:
+            return streamlit.secrets[name]
+        except Exception:
+            pass
+    return default
+
+
+def require_setting(name):
+    """Returns a setting or raises a RuntimeError naming the missing key"""
+    value = get_setting(name)
+    if value is None:
+        raise RuntimeError(
+            f"Missing setting '{name}'. Set it as an environment variable, in .env, "
+            "or in .streamlit/secrets.toml."
+        )
+    return value
@@ -1,16 +1,90 @@
+import hashlib
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache
+
+import numpy as np
 import pandas as pd  # Added import for DataFrame manipulation
-import streamlit as st
-from pymongo import MongoClient
 
-from src.ai_utils import generate_text_embedding  # Added import
+from src.config import get_setting, require_setting
+from src.embeddings import EmbeddingError, get_embedding_provider
+from src.metrics import instrumented, mongo_command_listener
+from src.search_cache import get_search_cache
+from src.search_utils import (
+    bm25_scores,
+    cosine_to_score,
+    cosine_top_k,
+    cosine_top_k_batch,
+    keyword_filter,
+    validate_filters,
+)
+from src.sketches import DatasetSketch
+from src.text_assembly import build_text_series, template_columns
+from src.vector_utils import DEFAULT_EMBEDDING_FORMAT, decode_vectors, encode_vectors
+
+# Server selection timeout; pymongo's default (30 s) stalls every call when offline
+DEFAULT_MONGODB_TIMEOUT_MS = 10000
+# Rows converted, embedded and inserted per round trip in store_dataset
+INSERT_BATCH_SIZE = 1000
 
-# Get MongoDB connection string from environment variables
-MONGODB_URI = st.secrets["MONGODB_URI"]
+VECTOR_INDEX_NAME = "vector_index"
+# Seconds to wait for a new search index to become queryable, and between polls
+VECTOR_INDEX_TIMEOUT = 600
+VECTOR_INDEX_POLL_INTERVAL = 5
+# Filter fields indexed alongside the vector, and the cardinality limit for strings
+MAX_FILTER_FIELDS = 16
+FILTER_FIELD_MAX_DISTINCT = 1000
+# Float vectors are scalar-quantized in the index from this many rows on
+QUANTIZATION_MIN_ROWS = 100000
+# Upper bound Atlas accepts for $vectorSearch numCandidates
+MAX_NUM_CANDIDATES = 10000
+# numCandidates = num_results * multiplier; tuned per dataset once its index is ready
+DEFAULT_CANDIDATE_MULTIPLIER = 10
+CANDIDATE_MULTIPLIERS = (10, 20, 50, 100, 200)
+TARGET_RECALL = 0.95
+# Concurrent $vectorSearch pipelines issued by batch_vector_search
+BATCH_SEARCH_WORKERS = 8
+# Per-dataset metadata (row count, schema, embedding, indexes, ...) is kept here
+CATALOG_COLLECTION = "_catalog"
+CATALOG_PAGE_SIZE = 50
+# Streaming column sketches (distinct counts, quantiles, heavy hitters) per dataset
+SKETCH_COLLECTION = "_sketches"
+# "sync" rewrites only the row blocks whose content changed (see store_dataset)
+STORE_MODES = ("replace", "append", "sync")
+# Each stored row records the insert batch (block) it came from, so changed
+# blocks can be replaced without touching the rest
+BLOCK_FIELD = "_block"
 
+# Background polling of search index builds
+_index_waiters = ThreadPoolExecutor(
+    max_workers=2, thread_name_prefix="plot-pyre-vector-index"
+)
 
+
+@lru_cache(maxsize=None)
 def get_mongodb_client():
-    """Returns a MongoDB client instance"""
-    return MongoClient(MONGODB_URI)
+    """Returns the shared MongoDB client instance, created on first use"""
+    # Get MongoDB connection string from environment variables
+    uri = require_setting("MONGODB_URI")
+    if uri.startswith("mongomock://"):
+        # In-process stand-in used by benchmarks and offline development
+        import mongomock
+
+        return mongomock.MongoClient()
+
+    from pymongo import MongoClient
+
+    # Every command's latency is exported through the metrics registry. A
+    # short server selection timeout lets offline-first callers fall back fast
+    return MongoClient(
+        uri,
+        event_listeners=[mongo_command_listener()],
+        serverSelectionTimeoutMS=int(
+            get_setting("MONGODB_TIMEOUT_MS", DEFAULT_MONGODB_TIMEOUT_MS)
+        ),
+    )
 
 
 def get_database(database_name="data_viz_ai"):
@@ -19,169 +93,920 @@ def get_database(database_name="data_viz_ai"):
     return client[database_name]
 
 
-def store_dataset(dataset_name, dataset_df, text_column_for_embedding=None):
-    """Stores a pandas DataFrame in MongoDB, generates embeddings, and creates a vector index."""
+@lru_cache(maxsize=None)
+def get_catalog():
+    """Returns the dataset catalog collection, creating its indexes on first use"""
+    catalog = get_database()[CATALOG_COLLECTION]
+    catalog.create_index("name_lower")
+    catalog.create_index("updated_at")
+    return catalog
+
+
+def get_dataset_info(dataset_name):
+    """Returns the catalog entry recorded for a dataset, or None"""
+    return get_catalog().find_one({"_id": dataset_name})
+
+
+def _update_catalog(dataset_name, fields, new_version=False):
+    """Upserts catalog fields; new_version bumps the version when the data changed"""
+    now = datetime.now(timezone.utc)
+    update = {
+        "$set": {**fields, "name_lower": dataset_name.lower(), "updated_at": now},
+        "$setOnInsert": {"created_at": now},
+    }
+    if new_version:
+        update["$inc"] = {"version": 1}
+    get_catalog().update_one({"_id": dataset_name}, update, upsert=True)
+
+
+def _hash_chunk(chunk):
+    """Row hashes of a chunk as bytes, independent of its index"""
+    try:
+        hashes = pd.util.hash_pandas_object(chunk, index=False)
+    except TypeError:
+        # Unhashable cells (lists, dicts); hash their text form instead
+        hashes = pd.util.hash_pandas_object(chunk.astype(str), index=False)
+    return hashes.to_numpy().tobytes()
+
+
+def _block_hash(chunk, embedding_settings):
+    # Embedding settings are part of a block's identity: changing them re-embeds it
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr(embedding_settings).encode())
+    digest.update(_hash_chunk(chunk))
+    return digest.hexdigest()
+
+
+def _describe_schema(dataset_df):
+    return [
+        {"name": str(column), "dtype": str(dtype)}
+        for column, dtype in dataset_df.dtypes.items()
+    ]
+
+
+def _embedding_provider_for(info):
+    embedding = (info or {}).get("embedding") or {}
+    return get_embedding_provider(embedding.get("provider"), embedding.get("dimension"))
+
+
+def get_dataset_embedding_provider(dataset_name):
+    """Returns the provider a dataset was embedded with, so queries use the same space"""
+    return _embedding_provider_for(get_dataset_info(dataset_name))
+
+
+def _search_settings(dataset_name):
+    """Query provider, numCandidates multiplier and Atlas readiness from one catalog read"""
+    info = get_dataset_info(dataset_name) or {}
+    tuning = info.get("search_tuning") or {}
+    vector_index = info.get("vector_index")
+    # Datasets stored before index tracking have no entry; let Atlas decide
+    atlas_ready = vector_index is None or bool(vector_index.get("queryable"))
+    return (
+        _embedding_provider_for(info),
+        tuning.get("num_candidates_multiplier", DEFAULT_CANDIDATE_MULTIPLIER),
+        atlas_ready,
+    )
+
+
+@instrumented("store_dataset")
+def store_dataset(
+    dataset_name,
+    dataset_df,
+    text_column_for_embedding=None,
+    text_columns=None,
+    text_template=None,
+    embedding_format=DEFAULT_EMBEDDING_FORMAT,
+    embedding_provider=None,
+    filter_fields=None,
+    vector_quantization=None,
+    mode="replace",
+):
+    """Stores a pandas DataFrame in MongoDB, generates embeddings, and creates a vector index.
+
+    The embedded text comes from ``text_column_for_embedding``, from several
+    ``text_columns`` joined with spaces, or from a ``text_template`` such as
+    ``"{title}: {body}"``. Embeddings are stored as ``embedding_format``: BSON
+    binary ``"float32"`` (default), per-row quantized ``"int8"`` or a plain
+    ``"array"`` of doubles. ``embedding_provider`` names the backend (see
+    ``src.embeddings``); it and its dimension are recorded in the catalog.
+    If embedding fails (after the provider's retries), the remaining rows are
+    stored without embeddings: rows already embedded keep theirs, the error is
+    recorded as the catalog's ``embedding_error`` and the affected blocks as
+    ``stale_blocks``, which the next ``mode="sync"`` store re-embeds.
+
+    The Atlas vector index covers ``filter_fields`` (default: see
+    ``suggest_filter_fields``) and uses ``vector_quantization`` ("none",
+    "scalar" or "binary"; by default "scalar" for large float datasets).
+
+    ``mode="append"`` adds the rows to an existing dataset instead of
+    replacing it: column sketches are merged, and embedding settings default
+    to the ones the dataset was first stored with.
+
+    ``mode="sync"`` makes the dataset equal to ``dataset_df`` like "replace",
+    but transfers (and embeds) only the blocks of ``INSERT_BATCH_SIZE`` rows
+    whose content hash differs from the one recorded in the catalog. Each
+    block's hash is recorded as soon as it is written, so an interrupted sync
+    resumes where it stopped when run again. Returns the rows written.
+    """
+    if mode not in STORE_MODES:
+        raise ValueError(f"Unknown store mode '{mode}'. Use one of {STORE_MODES}.")
     db = get_database()
     collection = db[dataset_name]
+    previous = (get_dataset_info(dataset_name) or {}) if mode != "replace" else {}
+    previous_embedding = previous.get("embedding") or {}
+    appended = mode == "append"
+    if (
+        appended
+        and previous_embedding
+        and not (text_column_for_embedding or text_columns or text_template)
+    ):
+        # Appended rows are embedded like the rows already stored
+        text_columns = previous_embedding.get("text_columns")
+        text_template = previous_embedding.get("text_template")
+        embedding_provider = embedding_provider or previous_embedding.get("provider")
+        embedding_format = previous_embedding.get("format", embedding_format)
 
-    # Generate embeddings if a text column is specified
-    if text_column_for_embedding and text_column_for_embedding in dataset_df.columns:
-        # Ensure the text column is of string type, fill NaNs with empty strings
-        dataset_df[text_column_for_embedding] = (
-            dataset_df[text_column_for_embedding].astype(str).fillna("")
-        )
-        # Generate embeddings in batches or one by one
-        # Note: Batching would be more efficient for large datasets
-        dataset_df["embedding"] = dataset_df[text_column_for_embedding].apply(
-            lambda x: generate_text_embedding(x) if x else [0.0] * 768
-        )
-        # Or keep it if it's a primary column users might want to see
-    # Drop the original text column if it's a concatenation or temporary
-    else:
+    if text_column_for_embedding and not text_columns and not text_template:
+        text_columns = [text_column_for_embedding]
+    embedding_columns = template_columns(text_columns, text_template)
+
+    # Generate embeddings if the text columns exist
+    generate_embeddings = bool(embedding_columns) and all(
+        column in dataset_df.columns for column in embedding_columns
+    )
+    if not generate_embeddings:
         # If no specific column, or column doesn't exist, store without embeddings
-        # Or, alternatively, try to concatenate all string columns (more complex)
         print(
-            f"Warning: Text column '{text_column_for_embedding}' not found or not specified. Storing data without embeddings."
+            f"Warning: Text column(s) {embedding_columns or text_column_for_embedding} not found or not specified. Storing data without embeddings."
         )
+    provider = get_embedding_provider(embedding_provider)
+    if appended and previous_embedding.get("provider") == provider.name:
+        # Appended rows keep the dimension the dataset's vectors already have
+        provider = get_embedding_provider(
+            embedding_provider, previous_embedding.get("dimension")
+        )
+    embedding_settings = (
+        (provider.describe(), embedding_format, embedding_columns, text_template)
+        if generate_embeddings
+        else None
+    )
 
-    records = dataset_df.to_dict("records")
+    sketch = None
+    previous_blocks = previous.get("blocks") or {}
+    blocks = dict(previous_blocks) if mode == "append" else {}
+    first_block = 0
+    if mode == "replace" or (mode == "sync" and not previous_blocks):
+        # Nothing to diff against: a sync of a dataset without block hashes is a full rewrite
+        collection.delete_many({})
+    elif mode == "sync":
+        collection.create_index(BLOCK_FIELD)
+        # Rows written before block tracking cannot be matched to a block
+        collection.delete_many({BLOCK_FIELD: {"$exists": False}})
+    else:
+        sketch = get_dataset_sketch(dataset_name)
+        first_block = max((int(block) + 1 for block in previous_blocks), default=0)
+    sketch = sketch or DatasetSketch()
 
-    collection.delete_many({})
-    result = collection.insert_many(records)
+    # Text is assembled, embedded and inserted one batch at a time, so neither the
+    # combined text nor the full embedding column is ever materialized
+    inserted_count = 0
+    embedding_error = None
+    unembedded_blocks = (
+        set(previous.get("stale_blocks") or []) if mode != "replace" else set()
+    )
+    content_hash = hashlib.blake2b(digest_size=16)
+    if mode == "append" and previous.get("content_hash"):
+        # Appends chain onto the existing content's hash
+        content_hash.update(bytes.fromhex(previous["content_hash"]))
+    for block, start in enumerate(
+        range(0, len(dataset_df), INSERT_BATCH_SIZE), start=first_block
+    ):
+        chunk = dataset_df.iloc[start : start + INSERT_BATCH_SIZE]
+        content_hash.update(_hash_chunk(chunk))
+        # Column sketches are updated in the same pass, one chunk at a time
+        sketch.update(chunk)
+        block_hash = _block_hash(chunk, embedding_settings)
+        blocks[str(block)] = block_hash
+        if mode == "sync":
+            if previous_blocks.get(str(block)) == block_hash:
+                continue
+            # Forget the old hash first, so a crash mid-block never looks synced
+            get_catalog().update_one(
+                {"_id": dataset_name}, {"$unset": {f"blocks.{block}": ""}}
+            )
+            collection.delete_many({BLOCK_FIELD: block})
+        records = chunk.to_dict("records")
+        for record in records:
+            record[BLOCK_FIELD] = block
+        unembedded_blocks.discard(block)
+        if generate_embeddings:
+            embeddings = None
+            if embedding_error is None:
+                texts = build_text_series(chunk, text_columns, text_template).tolist()
+                try:
+                    embeddings = encode_vectors(provider.embed(texts), embedding_format)
+                except Exception as e:
+                    # The provider has already retried; store every row rather than
+                    # stop halfway, and leave the rest of the dataset unembedded
+                    print(f"Error embedding '{dataset_name}', storing the remaining rows without embeddings: {e}")
+                    embedding_error = str(e)
+            if embeddings is None:
+                # Hashed as unembedded, so the next sync re-embeds just this block
+                unembedded_blocks.add(block)
+                block_hash = blocks[str(block)] = _block_hash(chunk, None)
+            else:
+                for record, embedding in zip(records, embeddings):
+                    record["embedding"] = embedding
+        result = collection.insert_many(records)
+        inserted_count += len(result.inserted_ids)
+        if mode == "sync":
+            get_catalog().update_one(
+                {"_id": dataset_name}, {"$set": {f"blocks.{block}": block_hash}}
+            )
+
+    if mode == "sync":
+        # Blocks past the new end of the dataset
+        stale_blocks = [int(block) for block in previous_blocks if block not in blocks]
+        if stale_blocks:
+            collection.delete_many({BLOCK_FIELD: {"$in": stale_blocks}})
+
+    # Only blocks still in the dataset and still meant to be embedded can be stale
+    unembedded_blocks = (
+        {block for block in unembedded_blocks if str(block) in blocks}
+        if generate_embeddings
+        else set()
+    )
+    if unembedded_blocks and not embedding_error:
+        embedding_error = previous.get("embedding_error")
+
+    _save_dataset_sketch(dataset_name, sketch)
+    vector_index_exists = bool(previous.get("vector_index"))
+
+    embedding_entry = None
+    if generate_embeddings:
+        embedding_entry = {
+            "field": "embedding",
+            **provider.describe(),
+            "format": embedding_format,
+            "text_columns": embedding_columns,
+            "text_template": text_template,
+        }
+    _update_catalog(
+        dataset_name,
+        {
+            "name": dataset_name,
+            "row_count": (previous.get("row_count", 0) if appended else 0)
+            + len(dataset_df),
+            "schema": _describe_schema(dataset_df),
+            "byte_size": (previous.get("byte_size", 0) if appended else 0)
+            + int(dataset_df.memory_usage(deep=True).sum()),
+            "content_hash": content_hash.hexdigest(),
+            "blocks": blocks,
+            "embedding": embedding_entry,
+            "embedding_error": embedding_error,
+            "stale_blocks": sorted(unembedded_blocks),
+            **(
+                {}
+                if vector_index_exists
+                else {
+                    "vector_index": {
+                        "name": VECTOR_INDEX_NAME,
+                        "status": "PENDING",
+                        "queryable": False,
+                    }
+                    if generate_embeddings
+                    else None,
+                    # Tuned again once the new index is queryable
+                    "search_tuning": None,
+                }
+            ),
+        },
+        new_version=True,
+    )
 
-    # Create vector index if embeddings were generated
-    if "embedding" in dataset_df.columns:
+    # Create vector index if embeddings were generated (appends reuse the existing one)
+    if generate_embeddings and not vector_index_exists:
+        if vector_quantization is None:
+            # int8 vectors are already quantized; Atlas only quantizes float input
+            vector_quantization = (
+                "scalar"
+                if embedding_format != "int8" and inserted_count >= QUANTIZATION_MIN_ROWS
+                else "none"
+            )
+        if filter_fields is None:
+            filter_fields = [
+                field
+                for field in suggest_filter_fields(dataset_df)
+                if field not in embedding_columns
+            ]
         try:
+            # Polled in the background; searches run locally until it is queryable
             create_vector_index(
-                collection, "embedding", 768
-            )  # 768 is dimension for text-embedding-004
-            print(
-                f"INFO: Embeddings generated for collection '{dataset_name}'. "
-                f"Please ensure a vector search index (e.g., named 'vector_index') is manually created in MongoDB Atlas "
-                f"on the 'embedding' field using the definition provided by 'create_vector_index' logs."
+                collection,
+                "embedding",
+                provider.dimension,
+                filter_fields=filter_fields,
+                quantization=vector_quantization,
             )
         except Exception as e:
-            print(f"Error during vector index guidance for '{dataset_name}': {e}")
+            print(f"Error creating vector index for '{dataset_name}': {e}")
 
-    return len(result.inserted_ids)
+    # Index sizes in the catalog; unused managed indexes are dropped off-thread
+    from src.index_manager import drop_unused_indexes, refresh_index_stats, schedule
 
+    schedule(refresh_index_stats, dataset_name)
+    schedule(drop_unused_indexes, dataset_name)
+    # The new catalog version already retires old results; this frees them now
+    get_search_cache().invalidate(dataset_name)
 
-def create_vector_index(
-    collection, field_name, vector_dimension, index_name="vector_index"
-):
-    """Creates a vector search index on the specified field."""
-    # Check if the index already exists
-    # Note: PyMongo's list_indexes() might not show search indexes directly.
-    # Managing search indexes is often done via Atlas UI or Atlas Admin API.
-    # For self-managed MongoDB, vector search capabilities depend on version and configuration.
-    # This is a simplified representation. Actual index creation for Atlas Search:
+    return inserted_count
+
+
+def _save_dataset_sketch(dataset_name, sketch):
+    """Stores one document per column (a wide dataset's sketches exceed 16 MB
+    together), then a header naming the new generation; failures are logged"""
+    sketches = get_database()[SKETCH_COLLECTION]
+    document = sketch.to_document()
+    generation = time.time_ns()
     try:
-        # Example for Atlas Search (requires Atlas Admin API or UI setup for search indexes)
-        # This command is illustrative; actual creation is via Atlas UI or specific API calls
-        # For on-prem/community, vector search might use different mechanisms or not be available directly like this.
-
-        # A more direct way if using a version of MongoDB that supports $vectorSearch natively
-        # and allows index creation via commands (e.g., MongoDB 6.0+ with specific index types like HNSW)
-        # db.command({ createIndexes: collection.name, indexes: [{ key: { [field_name]: "vector" }, name: index_name, vectorOptions: { type: "hnsw", dimensions: vector_dimension, similarity: "cosine" }}]})
-        # The above is a conceptual command structure. Actual syntax may vary.
-
-        # For Atlas, search indexes are defined separately.
-        # This function assumes the index needs to be created if not present.
-        # We'll define a search index structure. This is typically done once.
-        search_index_model = {
-            "name": index_name,
-            "definition": {
-                "mappings": {
-                    "dynamic": True,  # or False, depending on your needs
-                    "fields": {
-                        field_name: [
-                            {
-                                "type": "vector",
-                                "dimensions": vector_dimension,
-                                "similarity": "cosine",  # or "euclidean", "dotProduct"
-                            }
-                        ]
-                    },
-                }
-            },
+        sketches.create_index([("dataset", 1), ("generation", 1)])
+        columns = [
+            {
+                "dataset": dataset_name,
+                "generation": generation,
+                "position": position,
+                **column,
+            }
+            for position, column in enumerate(document["columns"])
+        ]
+        if columns:
+            sketches.insert_many(columns)
+        # Written last: readers only use generations whose header exists
+        sketches.insert_one(
+            {
+                "dataset": dataset_name,
+                "generation": generation,
+                "position": -1,
+                "rows": document["rows"],
+            }
+        )
+        sketches.delete_many({"dataset": dataset_name, "generation": {"$ne": generation}})
+    except Exception as e:
+        print(f"Error saving column sketches for '{dataset_name}': {e}")
+
+
+def get_dataset_sketch(dataset_name):
+    """Returns the dataset's merged column sketches, or None if it has none"""
+    sketches = get_database()[SKETCH_COLLECTION]
+    header = sketches.find_one(
+        {"dataset": dataset_name, "position": -1}, sort=[("generation", -1)]
+    )
+    if header is None:
+        return None
+    columns = sketches.find(
+        {
+            "dataset": dataset_name,
+            "generation": header["generation"],
+            "position": {"$gte": 0},
         }
+    ).sort("position", 1)
+    return DatasetSketch.from_document({"rows": header["rows"], "columns": list(columns)})
 
-        # This is a conceptual representation. Actual index creation on Atlas
-        # is usually done through the Atlas UI, Atlas CLI, or Atlas Admin API.
-        # PyMongo itself doesn't have a direct `create_search_index` method like this for Atlas Search.
-        # We'll print a message indicating the need for manual setup or Atlas API usage.
-        print(
-            f"INFO: Vector search index '{index_name}' on field '{field_name}' needs to be created in MongoDB Atlas."
+
+def get_dataset_stats(dataset_name):
+    """Per-column summary (count, distinct, mean/std, quantiles, top values) from sketches"""
+    sketch = get_dataset_sketch(dataset_name)
+    return sketch.summary() if sketch is not None else pd.DataFrame()
+
+
+def suggest_filter_fields(dataset_df, max_fields=MAX_FILTER_FIELDS):
+    """Scalar columns worth indexing as $vectorSearch filter fields.
+
+    Booleans, numbers, datetimes and low-cardinality strings qualify; free
+    text and nested values do not.
+    """
+    fields = []
+    for column in dataset_df.columns:
+        series = dataset_df[column]
+        if (
+            pd.api.types.is_bool_dtype(series)
+            or pd.api.types.is_numeric_dtype(series)
+            or pd.api.types.is_datetime64_any_dtype(series)
+        ):
+            fields.append(str(column))
+        elif series.dtype == object or pd.api.types.is_string_dtype(series):
+            sample = series.dropna().head(10000)
+            if (
+                len(sample)
+                and sample.map(type).eq(str).all()
+                and sample.nunique() <= FILTER_FIELD_MAX_DISTINCT
+            ):
+                fields.append(str(column))
+        if len(fields) >= max_fields:
+            break
+    return fields
+
+
+def vector_index_definition(
+    field_name, vector_dimension, filter_fields=None, quantization=None
+):
+    """Atlas vectorSearch index definition for an embedding field"""
+    vector_field = {
+        "type": "vector",
+        "path": field_name,
+        "numDimensions": int(vector_dimension),
+        "similarity": "cosine",
+    }
+    if quantization and quantization != "none":
+        # "scalar" (int8) or "binary"; Atlas rescores with full-fidelity vectors
+        vector_field["quantization"] = quantization
+    return {
+        "fields": [vector_field]
+        + [{"type": "filter", "path": field} for field in filter_fields or []]
+    }
+
+
+def _set_vector_index_status(dataset_name, **fields):
+    get_catalog().update_one(
+        {"_id": dataset_name},
+        {
+            "$set": {
+                **{f"vector_index.{key}": value for key, value in fields.items()},
+                "vector_index.checked_at": datetime.now(timezone.utc),
+            }
+        },
+    )
+
+
+def get_vector_index_status(collection, index_name=VECTOR_INDEX_NAME):
+    """Returns the Atlas search index status document, or None if it does not exist"""
+    for index in collection.list_search_indexes(index_name):
+        return {
+            "name": index.get("name"),
+            "status": index.get("status"),
+            "queryable": bool(index.get("queryable")),
+        }
+    return None
+
+
+def wait_for_vector_index(
+    collection,
+    index_name=VECTOR_INDEX_NAME,
+    timeout=VECTOR_INDEX_TIMEOUT,
+    interval=VECTOR_INDEX_POLL_INTERVAL,
+):
+    """Polls until the search index is queryable, recording each status in the catalog.
+
+    Once queryable, numCandidates is tuned for the dataset. Returns the final status.
+    """
+    deadline = time.monotonic() + timeout
+    status = None
+    while time.monotonic() < deadline:
+        status = get_vector_index_status(collection, index_name)
+        if status is None:
+            # Dropped, or never created; PENDING would never resolve
+            _set_vector_index_status(collection.name, status="MISSING", queryable=False)
+            break
+        _set_vector_index_status(
+            collection.name, status=status["status"], queryable=status["queryable"]
         )
-        print(f"Index definition to use: {search_index_model}")
-        # Example: collection.create_index([(field_name, "text")]) # This is for text index, not vector
-        # If your MongoDB server and version support it directly via a command:
-        # try:
-        #     collection.database.command(
-        #         'createIndexes',
-        #         collection.name,
-        #         indexes=[{
-        #             'name': index_name,
-        #             'key': {field_name: 'vector'},
-        #             # Specific options for vector index type (e.g., 'ivfFlat', 'hnsw') and similarity
-        #             # This part is highly dependent on the MongoDB version and vector search implementation
-        #             'vectorSearch': {
-        #                 'dimensions': vector_dimension,
-        #                 'similarity': 'cosine', # or 'euclidean', 'dotProduct'
-        #                 # 'type': 'ivfFlat', # Example type
-        #                 # 'm': 16, # Example parameter for HNSW
-        #                 # 'efConstruction': 100 # Example parameter for HNSW
-        #             }
-        #         }]
-        #     )
-        #     print(f"Vector index '{index_name}' created successfully on '{field_name}'.")
-        # except Exception as e:
-        #     if "already exists" in str(e).lower():
-        #         print(f"Vector index '{index_name}' already exists on '{field_name}'.")
-        #     else:
-        #         raise e
+        if status["queryable"] or status["status"] == "FAILED":
+            break
+        time.sleep(interval)
+    else:
+        _set_vector_index_status(collection.name, status="TIMEOUT", queryable=False)
 
+    if status and status["queryable"]:
+        try:
+            tune_num_candidates(collection.name)
+        except Exception as e:
+            print(f"Error tuning numCandidates for '{collection.name}': {e}")
+    return status
+
+
+def create_vector_index(
+    collection,
+    field_name,
+    vector_dimension,
+    index_name=VECTOR_INDEX_NAME,
+    filter_fields=None,
+    quantization=None,
+    wait=False,
+):
+    """Creates (or updates) the Atlas vector search index on the specified field.
+
+    The index is built through the driver's search index API. Its status is
+    polled until it is queryable, in the background unless ``wait`` is set,
+    and tracked in the catalog's ``vector_index`` entry. Until then, and on
+    deployments without Atlas Search, vector_search uses the exact local path.
+    """
+    definition = vector_index_definition(
+        field_name, vector_dimension, filter_fields, quantization
+    )
+    _set_vector_index_status(
+        collection.name,
+        name=index_name,
+        field=field_name,
+        filter_fields=list(filter_fields or []),
+        quantization=quantization or "none",
+        status="PENDING",
+        queryable=False,
+        error=None,
+    )
+    try:
+        from pymongo.operations import SearchIndexModel
+
+        if get_vector_index_status(collection, index_name) is None:
+            collection.create_search_index(
+                SearchIndexModel(
+                    definition=definition, name=index_name, type="vectorSearch"
+                )
+            )
+        else:
+            # New dimension, filters or quantization; Atlas rebuilds in place
+            collection.update_search_index(index_name, definition)
     except Exception as e:
-        print(
-            f"Error during vector index creation check/attempt for field '{field_name}': {e}"
+        # Self-managed servers and in-process stand-ins have no search indexes
+        print(f"Vector search index '{index_name}' unavailable on '{collection.name}': {e}")
+        _set_vector_index_status(
+            collection.name, status="UNSUPPORTED", queryable=False, error=str(e)
+        )
+        return None
+
+    if wait:
+        return wait_for_vector_index(collection, index_name)
+    return _index_waiters.submit(wait_for_vector_index, collection, index_name)
+
+
+def refresh_vector_index_status(dataset_name):
+    """Re-reads the Atlas index status into the catalog; returns index and tuning info"""
+    info = get_dataset_info(dataset_name) or {}
+    vector_index = info.get("vector_index")
+    if vector_index and vector_index.get("status") != "UNSUPPORTED":
+        try:
+            status = get_vector_index_status(
+                get_database()[dataset_name], vector_index.get("name", VECTOR_INDEX_NAME)
+            )
+        except Exception as e:
+            status = {"status": "UNSUPPORTED", "queryable": False, "error": str(e)}
+        _set_vector_index_status(
+            dataset_name, **(status or {"status": "MISSING", "queryable": False})
         )
-        # It's often better to ensure indexes are created out-of-band (e.g., via deployment scripts or Atlas UI)
-        # rather than at runtime in the application, especially for complex indexes like search/vector indexes.
+        info = get_dataset_info(dataset_name) or {}
+    return {
+        "vector_index": info.get("vector_index"),
+        "search_tuning": info.get("search_tuning"),
+    }
 
 
-def get_dataset_names():
-    """Returns a list of dataset names stored in MongoDB"""
+def tune_num_candidates(
+    dataset_name,
+    index_field="embedding",
+    num_results=10,
+    sample_queries=20,
+    target_recall=TARGET_RECALL,
+):
+    """Finds the smallest numCandidates multiplier reaching target_recall.
+
+    Stored embeddings of sampled documents serve as queries, so tuning makes
+    no embedding API calls. Approximate results are compared with exact
+    (ENN) search. The result is saved in the catalog's ``search_tuning``.
+    """
+    collection = get_database()[dataset_name]
+    documents = list(
+        collection.aggregate(
+            [
+                {"$sample": {"size": sample_queries}},
+                {"$project": {"_id": 0, index_field: 1}},
+            ]
+        )
+    )
+    queries = [
+        vector.tolist()
+        for vector in decode_vectors(document.get(index_field) for document in documents)
+        if vector.any()
+    ]
+    if not queries:
+        return None
+
+    truth = [
+        {
+            document["_id"]
+            for document in _atlas_vector_search(
+                collection, query, index_field, num_results, None, None, {"_id": 1}, exact=True
+            )
+        }
+        for query in queries
+    ]
+    chosen, recall = CANDIDATE_MULTIPLIERS[-1], None
+    for multiplier in CANDIDATE_MULTIPLIERS:
+        num_candidates = min(num_results * multiplier, MAX_NUM_CANDIDATES)
+        found = 0
+        for query, exact_ids in zip(queries, truth):
+            results = _atlas_vector_search(
+                collection, query, index_field, num_results, num_candidates, None, {"_id": 1}
+            )
+            found += len(exact_ids & {document["_id"] for document in results})
+        recall = found / max(sum(len(ids) for ids in truth), 1)
+        if recall >= target_recall:
+            chosen = multiplier
+            break
+
+    tuning = {
+        "num_candidates_multiplier": chosen,
+        "recall": round(recall, 4),
+        "target_recall": target_recall,
+        "sample_queries": len(queries),
+        "tuned_at": datetime.now(timezone.utc),
+    }
+    _update_catalog(dataset_name, {"search_tuning": tuning})
+    return tuning
+
+
+_catalog_backfilled = False
+
+
+def backfill_catalog():
+    """Registers collections stored before the catalog existed; returns how many"""
     db = get_database()
-    return db.list_collection_names()
+    known = {entry["_id"] for entry in get_catalog().find({}, {"_id": 1})}
+    added = 0
+    # Skip internal collections such as the catalog
+    for name in db.list_collection_names():
+        if name.startswith(("_", "system.")) or name in known:
+            continue
+        _update_catalog(
+            name,
+            {"name": name, "row_count": db[name].estimated_document_count()},
+            new_version=True,
+        )
+        added += 1
+    return added
+
+
+def list_datasets(search=None, limit=CATALOG_PAGE_SIZE, after=None):
+    """Returns one page of catalog entries ordered by name.
 
+    ``search`` matches a case-insensitive name prefix using the catalog's
+    ``name_lower`` index. Pass the ``next`` value of one page as ``after`` to
+    fetch the following page. Returns ``{"datasets", "next", "total"}``.
+    """
+    global _catalog_backfilled
+    if not _catalog_backfilled:
+        # Datasets stored before the catalog existed are registered once per process
+        backfill_catalog()
+        _catalog_backfilled = True
+    catalog = get_catalog()
+    query = {}
+    if search:
+        query["name_lower"] = {"$regex": "^" + re.escape(search.lower())}
+    total = catalog.count_documents(query)
+    if after:
+        query["_id"] = {"$gt": after}
+    entries = list(catalog.find(query).sort("_id", 1).limit(limit + 1))
+    next_cursor = entries[limit - 1]["_id"] if len(entries) > limit else None
+    return {"datasets": entries[:limit], "next": next_cursor, "total": total}
 
-def get_dataset(dataset_name):
-    """Returns a dataset from MongoDB as a pandas DataFrame"""
-    import pandas as pd
 
+@instrumented("get_dataset")
+def get_dataset(dataset_name, embedding_field="embedding", filters=None):
+    """Returns a dataset from MongoDB as a pandas DataFrame.
+
+    ``filters`` is an optional MongoDB filter document; the columns it uses
+    are reported to the index advisor.
+    """
     db = get_database()
     collection = db[dataset_name]
 
-    # Get all documents from the collection
-    cursor = collection.find({}, {"_id": 0})
+    if filters:
+        from src.index_manager import filter_columns, record_column_usage
+
+        record_column_usage(dataset_name, filter_columns(filters), "filter")
+
+    # Get all (matching) documents from the collection
+    cursor = collection.find(filters or {}, {"_id": 0, BLOCK_FIELD: 0})
 
     # Convert to DataFrame
     df = pd.DataFrame(list(cursor))
+
+    # Binary/quantized embeddings are decoded into one contiguous matrix; each
+    # row of the column is a view into it
+    if embedding_field in df.columns:
+        matrix = decode_vectors(df[embedding_field])
+        df[embedding_field] = list(matrix)
     return df
 
 
+@instrumented("get_dataset_sample")
+def get_dataset_sample(dataset_name, size, embedding_field="embedding"):
+    """Returns a uniform random sample of up to size rows, without embeddings"""
+    collection = get_database()[dataset_name]
+    documents = collection.aggregate(
+        [
+            {"$sample": {"size": int(size)}},
+            {"$project": {"_id": 0, BLOCK_FIELD: 0, embedding_field: 0}},
+        ]
+    )
+    return pd.DataFrame(list(documents))
+
+
+def get_embedding_matrix(dataset_name, embedding_field="embedding"):
+    """Returns a dataset's embeddings as a contiguous (rows, dimension) float32 matrix"""
+    db = get_database()
+    collection = db[dataset_name]
+
+    cursor = collection.find({}, {"_id": 0, embedding_field: 1})
+    values = [document.get(embedding_field) for document in cursor]
+    if not values:
+        return np.empty((0, 0), dtype=np.float32)
+    return decode_vectors(values)
+
+
+def _atlas_vector_search(
+    collection,
+    query_vector,
+    index_field,
+    num_results,
+    num_candidates,
+    filters,
+    projection,
+    exact=False,
+):
+    """Runs a $vectorSearch aggregation and returns the matching documents"""
+    vector_stage = {
+        "index": VECTOR_INDEX_NAME,  # This should match the name of your Atlas Search vector index
+        "path": index_field,
+        "queryVector": query_vector,
+        "limit": num_results,
+    }
+    if exact:
+        # Exhaustive (ENN) search, used as ground truth when measuring recall
+        vector_stage["exact"] = True
+    else:
+        vector_stage["numCandidates"] = num_candidates
+    if filters:
+        # Filter fields must be indexed with type "filter" in the vector index
+        vector_stage["filter"] = filters
+
+    pipeline = [{"$vectorSearch": vector_stage}, {"$project": projection}]
+    return list(collection.aggregate(pipeline))
+
+
+def _atlas_index_queryable(collection):
+    """Whether the collection's Atlas vector index exists and answers queries"""
+    try:
+        status = get_vector_index_status(collection, VECTOR_INDEX_NAME)
+    except Exception:
+        return False
+    return bool(status and status.get("queryable"))
+
+
+def _embedded_rows(filters, index_field):
+    # Rows of a stale block (see store_dataset) have no vector to rank
+    has_vector = {index_field: {"$exists": True}}
+    return {"$and": [filters, has_vector]} if filters else has_vector
+
+
+def _local_vector_search(
+    collection,
+    query_vector,
+    index_field,
+    num_results,
+    num_candidates,
+    filters,
+    keyword,
+    keyword_field,
+    return_fields,
+):
+    """Filters in MongoDB, optionally BM25-prefilters, then ranks by exact cosine locally"""
+    query = _embedded_rows(filters, index_field)
+    if keyword and keyword_field:
+        keyword_query = keyword_filter(keyword_field, keyword)
+        if keyword_query:
+            query = {"$and": [query, keyword_query]}
+
+    projection = {"_id": 0, index_field: 1}
+    for field in return_fields + ([keyword_field] if keyword_field else []):
+        projection[field] = 1
+    documents = list(collection.find(query, projection))
+    scanned = len(documents)
+
+    # Keyword prefilter: keep the best num_candidates BM25 matches for vector rerank
+    if keyword and keyword_field and documents:
+        keyword_scores = bm25_scores(
+            [document.get(keyword_field) for document in documents], keyword
+        )
+        ranked = np.argsort(-keyword_scores)[:num_candidates]
+        documents = [documents[i] for i in ranked if keyword_scores[i] > 0]
+
+    matrix = decode_vectors(document.get(index_field) for document in documents)
+    top, similarities = cosine_top_k(matrix, query_vector, num_results)
+    scores = cosine_to_score(similarities)
+
+    results = []
+    for i, score in zip(top, scores):
+        result = {"score": float(score)}
+        for field in return_fields:
+            result[field] = documents[i].get(field)
+        results.append(result)
+    return results, scanned
+
+
+def _catalog_version(dataset_name):
+    return (get_dataset_info(dataset_name) or {}).get("version")
+
+
+def _cached_results(results_df, outcome, started):
+    # Callers may modify the frame they get; the cached one stays untouched
+    results = results_df.copy()
+    stats = dict(results_df.attrs.get("search_stats", {}))
+    stats["cache"] = outcome
+    stats["latency_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    results.attrs["search_stats"] = stats
+    return results
+
+
+def _record_prefilter_usage(collection_name, filters):
+    # Local fallback searches run these filters as ordinary find() queries
+    if filters:
+        from src.index_manager import filter_columns, record_column_usage
+
+        record_column_usage(collection_name, filter_columns(filters), "search_prefilter")
+
+
+@instrumented("vector_search")
 def vector_search(
     collection_name,
     query_text,
     index_field="embedding",
     num_results=5,
     text_field_to_return=None,
+    filters=None,
+    keyword=None,
+    keyword_field=None,
+    num_candidates=None,
+    measure_recall=False,
+    use_cache=True,
 ):
-    """Performs a vector search in the specified collection."""
+    """Performs a vector search in the specified collection.
+
+    ``filters`` is a MongoDB filter document (e.g. ``{"region": "EU", "price":
+    {"$lt": 100}}``) pushed into ``$vectorSearch``; anything but plain fields
+    and comparison operators raises ValueError (see ``validate_filters``). A
+    ``keyword`` filters ``keyword_field`` (default: ``text_field_to_return``)
+    with BM25: locally before the vector rerank, or over the nearest
+    candidates once the Atlas index is queryable. Queries Atlas cannot serve
+    fall back to an exact local search. Per-query stats (engine, latency, candidates, recall) are returned
+    in ``results.attrs["search_stats"]``. A ``keyword`` with no field to match
+    it against raises ValueError.
+
+    With ``use_cache``, repeated searches of the same dataset version are
+    answered from an in-process cache (see ``src.search_cache``) without
+    embedding the query or touching MongoDB; ``search_stats["cache"]`` says
+    whether the results were a "hit", a near-duplicate ("similar") or a "miss".
+    Recall measurements always run the search.
+    """
+    started = time.perf_counter()
+    keyword_field = keyword_field or text_field_to_return
+    if keyword and not keyword_field:
+        raise ValueError("A keyword prefilter needs keyword_field or text_field_to_return.")
+    filters = validate_filters(filters)
+    _record_prefilter_usage(collection_name, filters)
+
+    cache = get_search_cache() if use_cache and not measure_recall else None
+    if cache is not None:
+        version = cache.dataset_version(collection_name, _catalog_version)
+        search_key = cache.search_key(
+            collection_name,
+            version=version,
+            index_field=index_field,
+            num_results=num_results,
+            text_field_to_return=text_field_to_return,
+            filters=filters,
+            keyword=keyword,
+            keyword_field=keyword_field,
+            num_candidates=num_candidates,
+        )
+        cached = cache.get(search_key, query_text)
+        if cached is not None:
+            return _cached_results(cached, "hit", started)
+
     db = get_database()
     collection = db[collection_name]
-
-    query_vector = generate_text_embedding(query_text)
+    try:
+        # Queries are embedded by the provider the dataset was stored with
+        provider, multiplier, atlas_ready = _search_settings(collection_name)
+        query_vector = None
+        if cache is not None:
+            query_vector = cache.get_embedding((collection_name, version), query_text)
+        if query_vector is None:
+            query_vector = provider.embed([query_text], task_type="RETRIEVAL_QUERY")[0]
+            query_vector = query_vector.tolist()
+            if cache is not None:
+                cache.put_embedding((collection_name, version), query_text, query_vector)
+    except EmbeddingError as e:
+        print(f"Error generating query embedding: {e}")
+        return pd.DataFrame()
 
     if not query_vector or all(
         v == 0.0 for v in query_vector
@@ -189,44 +1014,230 @@ def vector_search(
         print("Could not generate a valid query vector.")
         return pd.DataFrame()  # Return empty DataFrame
 
-    pipeline = [
-        {
-            "$vectorSearch": {
-                "index": "vector_index",  # This should match the name of your Atlas Search vector index
-                "path": index_field,
-                "queryVector": query_vector,
-                "numCandidates": num_results * 10,  # Number of candidates to consider
-                "limit": num_results,
-            }
-        },
-        {
-            "$project": {
-                "_id": 0,
-                "score": {"$meta": "vectorSearchScore"},  # Include the search score
-                # Add other fields you want to return
-            }
-        },
-    ]
+    if cache is not None:
+        similar = cache.get_similar(search_key, query_vector)
+        if similar is not None:
+            return _cached_results(similar, "similar", started)
 
-    # If a specific text field should be returned, add it to $project
-    if text_field_to_return and text_field_to_return != "_id":
-        pipeline[1]["$project"][text_field_to_return] = 1
-    else:  # If no specific text field, try to return all fields except embedding
-        # This requires knowing the fields. A safer bet is to project specific known fields.
-        # For simplicity, if not specified, we are only returning score.
-        # You might want to list all fields of the document excluding the 'embedding' field.
-        # Example: Get all fields except 'embedding'
-        # This is complex to do dynamically in $project without knowing field names.
-        # A common pattern is to return specific, known, useful fields.
-        pass  # Default projection only includes score and _id (if not excluded)
+    num_candidates = min(
+        max(num_candidates or num_results * multiplier, num_results), MAX_NUM_CANDIDATES
+    )
+    return_fields = (
+        [text_field_to_return]
+        if text_field_to_return and text_field_to_return != "_id"
+        else []
+    )
+    stats = {
+        "engine": "atlas",
+        "num_candidates": num_candidates,
+        "filtered": bool(filters),
+        "keyword": keyword,
+        "recall": None,
+        "cache": "miss" if cache is not None else None,
+    }
 
-    try:
-        results = list(collection.aggregate(pipeline))
-        return pd.DataFrame(results)
-    except Exception as e:
-        print(f"Error during vector search: {e}")
-        print(
-            "Please ensure that a vector search index named 'vector_index' exists on the collection "
-            f"'{collection_name}' for the field '{index_field}' and that the query is valid."
-        )
-        return pd.DataFrame()  # Return empty DataFrame on error
+    results = None
+    # Everything runs locally until the dataset's Atlas index is queryable
+    if atlas_ready:
+        projection = {"_id": 1, "score": {"$meta": "vectorSearchScore"}}
+        for field in return_fields + ([keyword_field] if keyword else []):
+            projection[field] = 1
+        try:
+            if keyword:
+                # Full-text prefiltering cannot precede $vectorSearch, so the
+                # keyword filters Atlas' nearest candidates instead
+                candidates = _atlas_vector_search(
+                    collection,
+                    query_vector,
+                    index_field,
+                    num_candidates,
+                    num_candidates,
+                    filters,
+                    projection,
+                )
+                keyword_scores = bm25_scores(
+                    [document.get(keyword_field) for document in candidates], keyword
+                )
+                results = [
+                    document
+                    for document, keyword_score in zip(candidates, keyword_scores)
+                    if keyword_score > 0
+                ][:num_results]
+                if keyword_field not in return_fields:
+                    for document in results:
+                        document.pop(keyword_field, None)
+            else:
+                results = _atlas_vector_search(
+                    collection,
+                    query_vector,
+                    index_field,
+                    num_results,
+                    num_candidates,
+                    filters,
+                    projection,
+                )
+            if measure_recall and results and not keyword:
+                exact_results = _atlas_vector_search(
+                    collection,
+                    query_vector,
+                    index_field,
+                    num_results,
+                    num_candidates,
+                    filters,
+                    {"_id": 1},
+                    exact=True,
+                )
+                exact_ids = {document["_id"] for document in exact_results}
+                found_ids = {document["_id"] for document in results}
+                stats["recall"] = len(exact_ids & found_ids) / max(len(exact_ids), 1)
+            for document in results:
+                document.pop("_id", None)
+        except Exception as e:
+            print(f"Error during vector search: {e}")
+            print(
+                f"Please ensure that a vector search index named '{VECTOR_INDEX_NAME}' exists on the collection "
+                f"'{collection_name}' for the field '{index_field}' (with any filter fields indexed) and that the query is valid. "
+                "Falling back to local search."
+            )
+            results = None
+
+    # A missing or still-building Atlas index returns nothing rather than failing;
+    # no hits from a queryable index is a real answer
+    if results == [] and not _atlas_index_queryable(collection):
+        results = None
+    if results is None:
+        try:
+            results, scanned = _local_vector_search(
+                collection,
+                query_vector,
+                index_field,
+                num_results,
+                num_candidates,
+                filters,
+                keyword,
+                keyword_field,
+                return_fields,
+            )
+            stats["engine"] = "local"
+            stats["documents_scanned"] = scanned
+            # Local search is exact over the filtered candidates
+            stats["recall"] = 1.0 if results else None
+        except Exception as e:
+            print(f"Error during local vector search: {e}")
+            results = []
+
+    stats["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    results_df = pd.DataFrame(results)
+    results_df.attrs["search_stats"] = stats
+    if cache is not None and results:
+        # Empty results may be a transient failure; only real answers are reused
+        cache.put(search_key, query_text, results_df, query_vector)
+    return results_df
+
+
+@instrumented("batch_vector_search")
+def batch_vector_search(
+    collection_name,
+    queries,
+    index_field="embedding",
+    num_results=5,
+    text_field_to_return=None,
+    filters=None,
+    num_candidates=None,
+    engine="auto",
+):
+    """Runs many vector searches at once and returns one DataFrame per query.
+
+    All queries are embedded in one batched call. ``engine="atlas"`` runs the
+    ``$vectorSearch`` pipelines concurrently, ``engine="local"`` scores every
+    query with a single matrix-matrix product, and ``"auto"`` tries Atlas and
+    answers any query it cannot serve locally. Batch stats are returned in
+    ``results[i].attrs["search_stats"]``.
+    """
+    started = time.perf_counter()
+    filters = validate_filters(filters)
+    db = get_database()
+    collection = db[collection_name]
+    _record_prefilter_usage(collection_name, filters)
+
+    provider, multiplier, atlas_ready = _search_settings(collection_name)
+    query_matrix = provider.embed(list(queries), task_type="RETRIEVAL_QUERY")
+    query_vectors = query_matrix.tolist()
+    valid = [i for i, vector in enumerate(query_vectors) if any(vector)]
+    num_candidates = min(
+        max(num_candidates or num_results * multiplier, num_results), MAX_NUM_CANDIDATES
+    )
+    return_fields = (
+        [text_field_to_return]
+        if text_field_to_return and text_field_to_return != "_id"
+        else []
+    )
+    results = [[] for _ in queries]
+    engines = [None for _ in queries]
+
+    if valid and (engine == "atlas" or (engine == "auto" and atlas_ready)):
+        projection = {"_id": 0, "score": {"$meta": "vectorSearchScore"}}
+        for field in return_fields:
+            projection[field] = 1
+
+        def run_atlas(i):
+            try:
+                return i, _atlas_vector_search(
+                    collection,
+                    query_vectors[i],
+                    index_field,
+                    num_results,
+                    num_candidates,
+                    filters,
+                    projection,
+                )
+            except Exception as e:
+                print(f"Error during vector search for query {i}: {e}")
+                return i, None
+
+        with ThreadPoolExecutor(max_workers=BATCH_SEARCH_WORKERS) as executor:
+            answered = list(executor.map(run_atlas, valid))
+        # Failed queries (None) fall back; so do empty answers, unless the index
+        # is queryable, in which case no hits is the real answer
+        queryable = None
+        for i, documents in answered:
+            if documents == [] and engine == "auto":
+                if queryable is None:
+                    queryable = _atlas_index_queryable(collection)
+                if not queryable:
+                    continue
+            if documents is not None:
+                results[i] = documents
+                engines[i] = "atlas"
+
+    pending = [i for i in valid if engines[i] is None]
+    if pending and engine in ("auto", "local"):
+        # One scan of the (filtered) collection serves every remaining query
+        projection = {"_id": 0, index_field: 1}
+        for field in return_fields:
+            projection[field] = 1
+        documents = list(collection.find(_embedded_rows(filters, index_field), projection))
+        matrix = decode_vectors(document.get(index_field) for document in documents)
+        top, similarities = cosine_top_k_batch(matrix, query_matrix[pending], num_results)
+        scores = cosine_to_score(similarities)
+        for row, i in enumerate(pending):
+            for document_index, score in zip(top[row], scores[row]):
+                result = {"score": float(score)}
+                for field in return_fields:
+                    result[field] = documents[document_index].get(field)
+                results[i].append(result)
+            engines[i] = "local"
+
+    latency_ms = round((time.perf_counter() - started) * 1000, 2)
+    results_dfs = []
+    for i, documents in enumerate(results):
+        results_df = pd.DataFrame(documents)
+        results_df.attrs["search_stats"] = {
+            "engine": engines[i],
+            "num_candidates": num_candidates,
+            "filtered": bool(filters),
+            "batch_size": len(queries),
+            "batch_latency_ms": latency_ms,
+        }
+        results_dfs.append(results_df)
+    return results_dfs
@@ -0,0 +1,175 @@
+"""
+Embedding providers for Plot Pyre
+A common interface over the Gemini API and a deterministic local CPU backend
+"""
+import random
+import time
+import zlib
+from functools import lru_cache
+from typing import Optional, Sequence
+
+import numpy as np
+
+from src.config import get_setting
+from src.metrics import (
+    EMBEDDING_DURATION,
+    EMBEDDINGS_GENERATED,
+    GEMINI_ERRORS,
+    GEMINI_REQUEST_DURATION,
+)
+from src.search_utils import normalize_rows, tokenize
+
+DEFAULT_EMBEDDING_PROVIDER = "gemini"
+
+
+class EmbeddingError(RuntimeError):
+    """Raised when a provider cannot produce embeddings"""
+
+
+class EmbeddingProvider:
+    """Base class for embedding backends.
+
+    Subclasses set ``name`` and ``dimension`` and implement ``_embed`` for a
+    list of non-empty texts. Empty or non-string inputs embed to zero vectors.
+    """
+
+    name = "base"
+    dimension = 0
+
+    def _embed(self, texts, task_type):
+        raise NotImplementedError
+
+    def embed(
+        self, texts: Sequence[str], task_type: str = "RETRIEVAL_DOCUMENT"
+    ) -> np.ndarray:
+        """Returns a (len(texts), dimension) float32 matrix of embeddings"""
+        matrix = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        positions = [i for i, text in enumerate(texts) if text and isinstance(text, str)]
+        if positions:
+            with EMBEDDING_DURATION.time(provider=self.name):
+                matrix[positions] = self._embed(
+                    [texts[i] for i in positions], task_type
+                )
+            EMBEDDINGS_GENERATED.inc(len(positions), provider=self.name)
+        return matrix
+
+    def describe(self):
+        """Returns the provider identity recorded with each embedded dataset"""
+        return {"provider": self.name, "dimension": self.dimension}
+
+
+class GeminiEmbeddingProvider(EmbeddingProvider):
+    """Embeds text with Google's text-embedding-004 model"""
+
+    name = "gemini"
+    model = "models/text-embedding-004"
+    dimension = 768
+    # Maximum number of texts the embedding API accepts per request
+    batch_size = 100
+    # Attempts per request; the wait before each retry doubles from retry_delay
+    max_attempts = 4
+    retry_delay = 1.0
+
+    @staticmethod
+    def _retryable(error):
+        # Rate limits, server errors and failures without a status (network)
+        code = getattr(error, "code", None)
+        return not isinstance(code, int) or code == 429 or code >= 500
+
+    def _embed(self, texts, task_type):
+        from google.genai import types
+
+        from src.ai_utils import get_genai_client
+
+        client = get_genai_client()
+        rows = []
+        for start in range(0, len(texts), self.batch_size):
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    with GEMINI_REQUEST_DURATION.time(call="embed_content"):
+                        result = client.models.embed_content(
+                            model=self.model,
+                            contents=texts[start : start + self.batch_size],
+                            config=types.EmbedContentConfig(task_type=task_type),
+                        )
+                    break
+                except Exception as e:
+                    GEMINI_ERRORS.inc(call="embed_content")
+                    if attempt == self.max_attempts or not self._retryable(e):
+                        raise EmbeddingError(
+                            f"Gemini embedding failed for batch starting at {start} "
+                            f"after {attempt} attempt(s): {e}"
+                        ) from e
+                    # Jittered so concurrent stores do not retry in lockstep
+                    delay = self.retry_delay * 2 ** (attempt - 1)
+                    time.sleep(delay * random.uniform(0.5, 1.0))
+            rows.extend(embedding.values for embedding in result.embeddings)
+        return np.asarray(rows, dtype=np.float32)
+
+    def describe(self):
+        return {**super().describe(), "model": self.model}
+
+
+@lru_cache(maxsize=2**18)
+def _feature_hash(feature):
+    return zlib.crc32(feature.encode("utf-8"))
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """Deterministic offline embeddings from signed feature hashing.
+
+    Unigrams and bigrams are hashed into ``dimension`` buckets and the rows
+    L2-normalized, so cosine similarity reflects lexical overlap. Needs no
+    network access or model files, and is stable across processes.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dimension=384):
+        self.dimension = int(dimension)
+
+    def _embed(self, texts, task_type):
+        rows, columns, signs = [], [], []
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            for feature in features:
+                hashed = _feature_hash(feature)
+                rows.append(row)
+                columns.append(hashed % self.dimension)
+                signs.append(1.0 if hashed & 0x80000000 else -1.0)
+
+        matrix = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        # intp: a batch without any word token yields empty (float64 by default) indexes
+        np.add.at(
+            matrix,
+            (np.asarray(rows, dtype=np.intp), np.asarray(columns, dtype=np.intp)),
+            np.asarray(signs, dtype=np.float32),
+        )
+        return normalize_rows(matrix)
+
+
+PROVIDERS = {
+    GeminiEmbeddingProvider.name: GeminiEmbeddingProvider,
+    HashingEmbeddingProvider.name: HashingEmbeddingProvider,
+}
+
+
+@lru_cache(maxsize=None)
+def _provider(name, dimension):
+    if name not in PROVIDERS:
+        raise ValueError(
+            f"Unknown embedding provider '{name}'. Use one of {sorted(PROVIDERS)}."
+        )
+    if dimension and name == HashingEmbeddingProvider.name:
+        return PROVIDERS[name](dimension)
+    return PROVIDERS[name]()
+
+
+def get_embedding_provider(
+    name: Optional[str] = None, dimension: Optional[int] = None
+) -> EmbeddingProvider:
+    """Returns the named provider, defaulting to the EMBEDDING_PROVIDER setting"""
+    name = name or get_setting("EMBEDDING_PROVIDER", DEFAULT_EMBEDDING_PROVIDER)
+    dimension = dimension or get_setting("EMBEDDING_DIMENSION")
+    return _provider(name, int(dimension) if dimension else None)
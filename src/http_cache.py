@@ -0,0 +1,179 @@
+"""
+HTTP caching helpers for the API
+Validators (ETag / Last-Modified) derived from catalog versions, conditional
+request checks, Accept-Encoding negotiation (zstd, brotli, gzip) and an
+in-process cache of serialized, compressed response bodies.
+"""
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from src.config import get_setting
+from src.metrics import record_cache
+
+try:
+    import brotli
+except ImportError:  # Optional: pip install brotli
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # Optional: pip install zstandard
+    zstandard = None
+
+# Bodies smaller than this are sent uncompressed; headers would eat the savings
+MIN_COMPRESS_BYTES = 1024
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+ZSTD_LEVEL = 3
+
+
+def available_encodings():
+    """Content codings this process can produce, most preferred first"""
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+
+def make_etag(*parts):
+    """Strong ETag from the values that determine a response (version, parameters)"""
+    digest = hashlib.blake2b(
+        json.dumps(parts, sort_keys=True, default=str).encode(), digest_size=12
+    )
+    return f'"{digest.hexdigest()}"'
+
+
+def http_date(moment):
+    """Formats a datetime (naive values are UTC, as MongoDB returns them) for Last-Modified"""
+    if moment is None:
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return format_datetime(moment.astimezone(timezone.utc), usegmt=True)
+
+
+def is_not_modified(headers, etag=None, last_modified=None):
+    """True when a GET's If-None-Match / If-Modified-Since say the client copy is current.
+
+    If-None-Match takes precedence over If-Modified-Since (RFC 9110 13.2.2).
+    """
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        if etag is None:
+            return False
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag in tags
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+            return parsedate_to_datetime(last_modified) <= since
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def choose_encoding(accept_encoding):
+    """Picks the preferred available coding the client accepts, or None for identity"""
+    accepted = {}
+    for item in (accept_encoding or "").split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+    for encoding in available_encodings():
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body, encoding):
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL)
+    return body
+
+
+class ResponseCache:
+    """LRU of serialized bodies per (request key, ETag), bounded by total bytes.
+
+    Each entry keeps the identity body plus every compressed variant produced
+    so far, so a hit costs neither serialization nor compression.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = int(max_bytes)
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        record_cache("http_response", entry is not None)
+        return entry
+
+    def put(self, key, body):
+        entry = {None: body}
+        if self.max_bytes <= 0 or len(body) > self.max_bytes:
+            return entry
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= sum(len(variant) for variant in previous.values())
+            self._entries[key] = entry
+            self._size += len(body)
+            self._evict()
+        return entry
+
+    def variant(self, key, entry, encoding):
+        """Body in the given coding, compressed once and then kept with the entry"""
+        if encoding is None or len(entry[None]) < MIN_COMPRESS_BYTES:
+            return entry[None], None
+        body = entry.get(encoding)
+        if body is None:
+            body = compress(entry[None], encoding)
+            with self._lock:
+                if self._entries.get(key) is entry and encoding not in entry:
+                    entry[encoding] = body
+                    self._size += len(body)
+                    self._evict()
+        return body, encoding
+
+    def _evict(self):
+        while self._size > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= sum(len(variant) for variant in evicted.values())
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Process-wide response cache sized by HTTP_CACHE_MAX_BYTES (0 disables it)"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(get_setting("HTTP_CACHE_MAX_BYTES", DEFAULT_CACHE_BYTES))
+    return _cache
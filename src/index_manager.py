@@ -0,0 +1,240 @@
+"""
+Secondary index advisor for Plot Pyre datasets
+Counts how often columns are used for chart X axes, filtered loads and search
+prefilters, builds single or compound MongoDB indexes in the background once
+a column set is hot, and drops the ones it built that are no longer used.
+Managed indexes are named with a ``pp_`` prefix and reported in the catalog.
+"""
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from src.config import get_setting
+from src.db_utils import get_catalog, get_database
+
+USAGE_COLLECTION = "_index_usage"
+MANAGED_PREFIX = "pp_"
+USAGE_KINDS = ("x_axis", "filter", "search_prefilter")
+# Uses of a column set before an index is built for it
+HOT_USAGE_THRESHOLD = 3
+# Managed indexes older than this with no recorded accesses are dropped
+UNUSED_INDEX_AGE = timedelta(days=7)
+MAX_MANAGED_INDEXES = 8
+# Leading operators whose fields can use an index; anything else is ignored
+_RANGE_OPERATORS = {"$gt", "$gte", "$lt", "$lte", "$in", "$ne", "$nin", "$exists"}
+
+# Usage bookkeeping and index builds never run on the request/rerun thread
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="plot-pyre-index")
+
+
+def auto_index_enabled():
+    return str(get_setting("AUTO_INDEX", "1")).lower() not in {"0", "false", "no", "off"}
+
+
+def index_name(columns):
+    """Managed index name for a column set, safe to use as a catalog field name"""
+    parts = [re.sub(r"[^0-9A-Za-z_]", "_", str(column)) for column in columns]
+    return MANAGED_PREFIX + "__".join(parts)
+
+
+def filter_columns(filters):
+    """Columns a filter document constrains: equality fields first, then ranges.
+
+    That order (equality before range) is what a compound index should use.
+    ``$and`` clauses are flattened; ``$or``/``$nor`` and unknown operators are
+    skipped since a single compound index cannot serve them.
+    """
+    equality, ranges = [], []
+
+    def visit(document):
+        for key, value in (document or {}).items():
+            if key == "$and":
+                for clause in value:
+                    visit(clause)
+            elif key.startswith("$"):
+                continue
+            elif isinstance(value, dict) and value and all(
+                operator.startswith("$") for operator in value
+            ):
+                if set(value) <= _RANGE_OPERATORS:
+                    ranges.append(key)
+                elif "$eq" in value:
+                    equality.append(key)
+            else:
+                equality.append(key)
+
+    visit(filters)
+    columns = []
+    for column in equality + ranges:
+        if column not in columns:
+            columns.append(column)
+    return columns
+
+
+def _usage_collection():
+    usage = get_database()[USAGE_COLLECTION]
+    usage.create_index("dataset")
+    return usage
+
+
+def _record(dataset_name, columns, kind):
+    now = datetime.now(timezone.utc)
+    entry = _usage_collection().find_one_and_update(
+        {"dataset": dataset_name, "columns": columns},
+        {
+            "$inc": {"count": 1, f"kinds.{kind}": 1},
+            "$set": {"last_used": now},
+            "$setOnInsert": {"first_used": now},
+        },
+        upsert=True,
+        return_document=True,  # ReturnDocument.AFTER
+    )
+    if (
+        auto_index_enabled()
+        and entry
+        and entry.get("count", 0) >= HOT_USAGE_THRESHOLD
+    ):
+        ensure_index(dataset_name, columns)
+
+
+def record_column_usage(dataset_name, columns, kind):
+    """Counts one use of a column set in the background; builds its index once hot"""
+    if kind not in USAGE_KINDS:
+        raise ValueError(f"Unknown usage kind '{kind}'. Use one of {USAGE_KINDS}.")
+    columns = [str(column) for column in columns if column and column != "_id"]
+    if not dataset_name or not columns:
+        return None
+    return schedule(_record, dataset_name, columns, kind)
+
+
+def _safe_call(function, *args):
+    try:
+        return function(*args)
+    except Exception as e:
+        print(f"Error in index advisor ({function.__name__}): {e}")
+        return None
+
+
+def _set_index_entry(dataset_name, name, fields):
+    get_catalog().update_one(
+        {"_id": dataset_name},
+        {"$set": {f"indexes.{name}.{key}": value for key, value in fields.items()}},
+    )
+
+
+def ensure_index(dataset_name, columns):
+    """Builds a managed index on columns unless an index already starts with them"""
+    collection = get_database()[dataset_name]
+    existing = collection.index_information()
+    managed = [name for name in existing if name.startswith(MANAGED_PREFIX)]
+    for info in existing.values():
+        # An index whose key prefix covers these columns already serves them
+        keys = [field for field, _ in info["key"]]
+        if keys[: len(columns)] == list(columns):
+            return None
+    if len(managed) >= MAX_MANAGED_INDEXES:
+        print(
+            f"Index advisor: '{dataset_name}' already has {len(managed)} managed indexes; "
+            f"not indexing {columns}."
+        )
+        return None
+
+    name = index_name(columns)
+    _set_index_entry(
+        dataset_name,
+        name,
+        {
+            "columns": list(columns),
+            "status": "building",
+            "created_at": datetime.now(timezone.utc),
+        },
+    )
+    try:
+        collection.create_index([(column, 1) for column in columns], name=name)
+    except Exception as e:
+        _set_index_entry(dataset_name, name, {"status": "failed", "error": str(e)})
+        raise
+    _set_index_entry(dataset_name, name, {"status": "ready"})
+    refresh_index_stats(dataset_name)
+    return name
+
+
+def _index_accesses(collection):
+    try:
+        return {
+            stats["name"]: stats["accesses"]
+            for stats in collection.aggregate([{"$indexStats": {}}])
+        }
+    except Exception:
+        # $indexStats is unavailable on some deployments and in-process stand-ins
+        return {}
+
+
+def refresh_index_stats(dataset_name):
+    """Copies index sizes and access counts into the dataset's catalog entry"""
+    db = get_database()
+    collection = db[dataset_name]
+    try:
+        sizes = db.command("collStats", dataset_name).get("indexSizes", {})
+    except Exception:
+        sizes = {}
+    accesses = _index_accesses(collection)
+
+    catalog_indexes = (get_catalog().find_one({"_id": dataset_name}) or {}).get(
+        "indexes", {}
+    )
+    fields = {}
+    for name, info in collection.index_information().items():
+        key = re.sub(r"[^0-9A-Za-z_]", "_", name)
+        fields[f"indexes.{key}.columns"] = [field for field, _ in info["key"]]
+        fields[f"indexes.{key}.size_bytes"] = sizes.get(name)
+        fields[f"indexes.{key}.managed"] = name.startswith(MANAGED_PREFIX)
+        if key not in catalog_indexes:
+            fields[f"indexes.{key}.status"] = "ready"
+        if name in accesses:
+            fields[f"indexes.{key}.accesses"] = accesses[name].get("ops", 0)
+            fields[f"indexes.{key}.accesses_since"] = accesses[name].get("since")
+    if fields:
+        get_catalog().update_one({"_id": dataset_name}, {"$set": fields})
+    return (get_catalog().find_one({"_id": dataset_name}) or {}).get("indexes", {})
+
+
+def drop_unused_indexes(dataset_name, min_age=UNUSED_INDEX_AGE):
+    """Drops managed indexes with no accesses since they were built; returns their names"""
+    collection = get_database()[dataset_name]
+    accesses = _index_accesses(collection)
+    if not accesses:
+        # Without access statistics nothing can be proven unused
+        return []
+    catalog_indexes = (get_catalog().find_one({"_id": dataset_name}) or {}).get(
+        "indexes", {}
+    )
+    cutoff = datetime.now(timezone.utc) - min_age
+    dropped = []
+    for name in collection.index_information():
+        if not name.startswith(MANAGED_PREFIX) or name not in accesses:
+            continue
+        since = accesses[name].get("since")
+        if since is not None and since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        if accesses[name].get("ops", 0) == 0 and since is not None and since < cutoff:
+            collection.drop_index(name)
+            dropped.append(name)
+    if dropped:
+        get_catalog().update_one(
+            {"_id": dataset_name},
+            {"$unset": {f"indexes.{name}": "" for name in dropped}},
+        )
+        # Usage restarts from zero so a dropped index is only rebuilt if it gets hot again
+        for name in dropped:
+            columns = catalog_indexes.get(name, {}).get("columns")
+            if columns:
+                _usage_collection().delete_many(
+                    {"dataset": dataset_name, "columns": columns}
+                )
+    return dropped
+
+
+def schedule(function, *args):
+    """Runs an advisor task (e.g. drop_unused_indexes) on the advisor's worker thread"""
+    return _executor.submit(_safe_call, function, *args)
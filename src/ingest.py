@@ -0,0 +1,198 @@
+"""
+Parallel ingestion for uploaded datasets
+Parses large CSV/Excel uploads across all available CPU cores
+"""
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Union
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+SUPPORTED_EXTENSIONS = ["csv", "xlsx", "xls"]
+
+# Splitting only pays off once the parse dominates the cost of shipping chunks to workers
+PARALLEL_CSV_THRESHOLD_BYTES = 32 * 1024 * 1024
+# Leading rows the default engine parses to check the Arrow engine's column types
+ARROW_DTYPE_CHECK_ROWS = 1000
+# pandas' default missing-value markers and boolean spellings, for the Arrow reader
+PANDAS_NA_VALUES = [
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND",
+    "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+]
+PANDAS_TRUE_VALUES = ["True", "TRUE", "true"]
+PANDAS_FALSE_VALUES = ["False", "FALSE", "false"]
+
+
+def _worker_count():
+    """Returns the number of worker processes to use for parsing"""
+    return max(os.cpu_count() or 1, 1)
+
+
+def _executor(max_workers):
+    # "spawn" keeps workers safe to start from threaded hosts (Streamlit, uvicorn)
+    return ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+def _as_bytes(source):
+    """Returns the raw bytes of an upload (bytes, Streamlit UploadedFile or file-like)"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    if hasattr(source, "getvalue"):
+        return source.getvalue()
+    return source.read()
+
+
+def _split_csv_on_lines(data, num_chunks):
+    """Splits CSV bytes into (header, [bodies]) on line boundaries outside quoted fields"""
+    header_end = data.find(b"\n")
+    if header_end == -1:
+        return data, []
+    header = data[: header_end + 1]
+    body_start = header_end + 1
+    target = max((len(data) - body_start) // num_chunks, 1)
+
+    boundaries = [body_start]
+    quotes_before = data.count(b'"', 0, body_start)
+    position = body_start
+    while position < len(data):
+        candidate = min(position + target, len(data))
+        newline = data.find(b"\n", candidate)
+        # Walk forward until the boundary is not inside a quoted (multi-line) field
+        while newline != -1:
+            if (quotes_before + data.count(b'"', position, newline)) % 2 == 0:
+                break
+            newline = data.find(b"\n", newline + 1)
+        end = len(data) if newline == -1 else newline + 1
+        quotes_before += data.count(b'"', position, end)
+        boundaries.append(end)
+        position = end
+
+    bodies = [data[start:end] for start, end in zip(boundaries, boundaries[1:])]
+    return header, [body for body in bodies if body.strip()]
+
+
+def _parse_csv_chunk(chunk):
+    """Worker entry point: parses one header-prefixed CSV chunk"""
+    return pd.read_csv(io.BytesIO(chunk))
+
+
+def _parse_excel_sheet(data, sheet_name):
+    """Worker entry point: parses one Excel sheet"""
+    return pd.read_excel(io.BytesIO(data), sheet_name=sheet_name)
+
+
+def _arrow_convert_options(column_types=None):
+    return pa_csv.ConvertOptions(
+        column_types=column_types or {},
+        null_values=PANDAS_NA_VALUES,
+        true_values=PANDAS_TRUE_VALUES,
+        false_values=PANDAS_FALSE_VALUES,
+        strings_can_be_null=True,
+    )
+
+
+def _read_csv_arrow(data):
+    """Arrow parse with the default engine's column types, or None if they differ"""
+    try:
+        # Arrow types each column from the first block; the streaming reader reads
+        # only that block, which is enough to find the columns it would turn into
+        # dates, times or timestamps. The default engine keeps those as text, so
+        # the full (multithreaded) read leaves them as strings
+        schema = pa_csv.open_csv(
+            pa.BufferReader(data), convert_options=_arrow_convert_options()
+        ).schema
+        temporal = {
+            field.name: pa.string() for field in schema if pa.types.is_temporal(field.type)
+        }
+        table = pa_csv.read_csv(
+            pa.BufferReader(data), convert_options=_arrow_convert_options(temporal)
+        )
+    except pa.ArrowInvalid:
+        # e.g. a later block that does not fit the inferred types
+        return None
+
+    # All-empty columns come back as the null type; the default engine reads float64
+    for i, field in enumerate(table.schema):
+        if pa.types.is_null(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(pa.float64()))
+    df = table.to_pandas()
+    expected = pd.read_csv(io.BytesIO(data), nrows=ARROW_DTYPE_CHECK_ROWS).dtypes
+    return df if df.dtypes.equals(expected) else None
+
+
+def read_csv_parallel(data: bytes, max_workers: Optional[int] = None) -> pd.DataFrame:
+    """Parses CSV bytes into a DataFrame using every available core"""
+    if HAS_PYARROW:
+        # Arrow's reader parses blocks on a thread pool; inputs it types differently
+        # from the default engine (e.g. a column that turns float after the first
+        # rows) take the per-chunk path below
+        df = _read_csv_arrow(data)
+        if df is not None:
+            return df
+
+    max_workers = max_workers or _worker_count()
+    if max_workers < 2 or len(data) < PARALLEL_CSV_THRESHOLD_BYTES:
+        return pd.read_csv(io.BytesIO(data))
+
+    header, bodies = _split_csv_on_lines(data, max_workers)
+    if len(bodies) < 2:
+        return pd.read_csv(io.BytesIO(data))
+
+    with _executor(min(max_workers, len(bodies))) as executor:
+        frames = list(executor.map(_parse_csv_chunk, [header + body for body in bodies]))
+
+    # Type inference is per chunk; if chunks disagree, a serial parse is the only way
+    # to produce exactly the schema a single-pass read would have inferred
+    first_dtypes = frames[0].dtypes
+    if any(not frame.dtypes.equals(first_dtypes) for frame in frames[1:]):
+        return pd.read_csv(io.BytesIO(data))
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def read_excel_parallel(
+    data: bytes,
+    sheet_names: Optional[List[Union[str, int]]] = None,
+    max_workers: Optional[int] = None,
+) -> Dict[Union[str, int], pd.DataFrame]:
+    """Parses several Excel sheets concurrently, one worker process per sheet"""
+    if sheet_names is None:
+        sheet_names = pd.ExcelFile(io.BytesIO(data)).sheet_names
+
+    max_workers = min(max_workers or _worker_count(), len(sheet_names))
+    if max_workers < 2:
+        return {name: _parse_excel_sheet(data, name) for name in sheet_names}
+
+    with _executor(max_workers) as executor:
+        frames = executor.map(_parse_excel_sheet, [data] * len(sheet_names), sheet_names)
+        return dict(zip(sheet_names, frames))
+
+
+def read_uploaded_file(source, extension: str, sheet_name: Union[str, int] = 0):
+    """Parses an uploaded CSV or Excel file into a DataFrame.
+
+    Pass ``sheet_name=None`` to read every sheet of a workbook in parallel and get a
+    dict of DataFrames, mirroring ``pd.read_excel``.
+    """
+    extension = extension.lower()
+    data = _as_bytes(source)
+
+    if extension == "csv":
+        return read_csv_parallel(data)
+    if extension in ("xlsx", "xls"):
+        if sheet_name is None:
+            return read_excel_parallel(data)
+        return _parse_excel_sheet(data, sheet_name)
+    raise ValueError(f"Unsupported file format: {extension}")
@@ -0,0 +1,285 @@
+"""
+Out-of-core datasets for Plot Pyre
+A LazyDataset describes a scan of a local Parquet copy, a MongoDB cursor or an
+in-memory frame plus the filters and projections to apply to it. Nothing is
+read until a terminal operation (head, count, sample, groupby_agg, sketch)
+streams the data through one chunk at a time, so memory stays bounded by the
+chunk size and the size of the result, not by the dataset.
+"""
+import numpy as np
+import pandas as pd
+
+from src.sketches import DatasetSketch
+
+# Rows per streamed chunk
+CHUNK_ROWS = 50000
+AGGREGATIONS = ("count", "size", "sum", "mean", "min", "max")
+# How each per-chunk partial is computed and how partials are merged
+_PARTIALS = {
+    "size": ("size", "sum"),
+    "count": ("count", "sum"),
+    "sum": ("sum", "sum"),
+    "min": ("min", "min"),
+    "max": ("max", "max"),
+}
+
+
+def _parquet_chunks(path, chunk_rows):
+    def chunks(columns, query):
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(path)
+        try:
+            if columns is not None:
+                columns = [c for c in columns if c in parquet_file.schema_arrow.names]
+            for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=columns):
+                yield batch.to_pandas()
+        finally:
+            parquet_file.close()
+
+    return chunks
+
+
+def _mongo_chunks(dataset_name, filters, chunk_rows, embedding_field):
+    def chunks(columns, query):
+        from src.db_utils import BLOCK_FIELD, get_database
+
+        if columns is None:
+            projection = {"_id": 0, BLOCK_FIELD: 0, embedding_field: 0}
+        else:
+            projection = {"_id": 0, **{column: 1 for column in columns}}
+        combined = {"$and": [filters, query]} if filters and query else (filters or query)
+        cursor = (
+            get_database()[dataset_name]
+            .find(combined or {}, projection)
+            .batch_size(chunk_rows)
+        )
+        try:
+            documents = []
+            for document in cursor:
+                documents.append(document)
+                if len(documents) >= chunk_rows:
+                    yield pd.DataFrame(documents)
+                    documents = []
+            if documents:
+                yield pd.DataFrame(documents)
+        finally:
+            cursor.close()
+
+    return chunks
+
+
+def _frame_chunks(df, chunk_rows):
+    def chunks(columns, query):
+        frame = df if columns is None else df[[c for c in columns if c in df.columns]]
+        for start in range(0, len(frame), chunk_rows):
+            yield frame.iloc[start : start + chunk_rows]
+
+    return chunks
+
+
+class LazyDataset:
+    """Chainable, immutable description of a chunked scan.
+
+    ``filter``, ``isin`` and ``select`` return new datasets; projections are
+    pushed down to the source (Parquet columns, MongoDB projection) and
+    ``isin`` filters to the MongoDB query.
+    """
+
+    def __init__(self, chunks, steps=(), columns=None, query=None, pushdown=True):
+        self._chunks = chunks
+        self._steps = tuple(steps)
+        self._columns = columns
+        self._query = query
+        # False once a filter reads columns it did not declare
+        self._pushdown = pushdown
+
+    @classmethod
+    def from_parquet(cls, path, chunk_rows=CHUNK_ROWS):
+        return cls(_parquet_chunks(path, chunk_rows))
+
+    @classmethod
+    def from_mongo(
+        cls, dataset_name, filters=None, chunk_rows=CHUNK_ROWS, embedding_field="embedding"
+    ):
+        return cls(_mongo_chunks(dataset_name, filters, chunk_rows, embedding_field))
+
+    @classmethod
+    def from_frame(cls, df, chunk_rows=CHUNK_ROWS):
+        return cls(_frame_chunks(df, chunk_rows))
+
+    def _derive(self, step, columns=None, query=None, pushdown=None):
+        return LazyDataset(
+            self._chunks,
+            self._steps + ((step, columns),),
+            self._columns,
+            query if query is not None else self._query,
+            self._pushdown if pushdown is None else pushdown,
+        )
+
+    def filter(self, predicate, columns=None):
+        """Keeps rows where predicate(chunk) is True; columns lists what it reads"""
+        return self._derive(
+            lambda chunk: chunk[predicate(chunk)],
+            columns=columns,
+            pushdown=self._pushdown and columns is not None,
+        )
+
+    def isin(self, column, values):
+        """Keeps rows whose column is one of values (evaluated by MongoDB when possible)"""
+        values = list(values)
+        clause = {column: {"$in": values}}
+        query = {"$and": [self._query, clause]} if self._query else clause
+        return self._derive(
+            lambda chunk: chunk[chunk[column].isin(values)], columns=[column], query=query
+        )
+
+    def select(self, columns):
+        """Keeps only columns; earlier filters still see the columns they read"""
+        columns = list(dict.fromkeys(columns))
+        derived = self._derive(lambda chunk: chunk[[c for c in columns if c in chunk.columns]])
+        if self._pushdown:
+            needed = list(columns)
+            for _, step_columns in self._steps:
+                needed += [c for c in step_columns or () if c not in needed]
+            if self._columns is not None:
+                needed = [c for c in needed if c in self._columns]
+            derived._columns = needed
+        return derived
+
+    def iter_chunks(self):
+        """Yields the transformed, non-empty chunks; closing the generator closes the source"""
+        source = self._chunks(self._columns, self._query)
+        try:
+            for chunk in source:
+                for step, _ in self._steps:
+                    chunk = step(chunk)
+                    if chunk.empty:
+                        break
+                if not chunk.empty:
+                    yield chunk
+        finally:
+            source.close()
+
+    def head(self, n=5):
+        """First n rows; stops reading as soon as they are found"""
+        parts, remaining = [], int(n)
+        if remaining > 0:
+            for chunk in self.iter_chunks():
+                parts.append(chunk.head(remaining))
+                remaining -= len(parts[-1])
+                if remaining <= 0:
+                    break
+        return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+
+    def count(self):
+        return sum(len(chunk) for chunk in self.iter_chunks())
+
+    def sample(self, n, seed=42):
+        """Uniform random sample of up to n rows in one pass (bottom-n random keys)"""
+        n = int(n)
+        if n <= 0:
+            return self.head(0)
+        rng = np.random.default_rng(seed)
+        kept, kept_keys = None, np.empty(0)
+        for chunk in self.iter_chunks():
+            keys = rng.random(len(chunk))
+            if kept is not None:
+                chunk = pd.concat([kept, chunk], ignore_index=True)
+                keys = np.concatenate([kept_keys, keys])
+            if len(chunk) > n:
+                order = np.argpartition(keys, n - 1)[:n]
+                chunk, keys = chunk.iloc[order].reset_index(drop=True), keys[order]
+            kept, kept_keys = chunk.reset_index(drop=True), keys
+        return kept if kept is not None else pd.DataFrame()
+
+    def groupby_agg(self, by, aggregations):
+        """Streaming group-by; aggregations maps column to one of AGGREGATIONS.
+
+        Each chunk is reduced to per-group partial sums, counts, minima and
+        maxima that are merged as the scan goes, so memory grows with the
+        number of groups only. Groups with a null key are dropped, as in pandas.
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        for column, how in aggregations.items():
+            if how not in AGGREGATIONS:
+                raise ValueError(
+                    f"Unsupported aggregation '{how}' for '{column}'. Use one of {AGGREGATIONS}."
+                )
+        # (column, partial) pairs every requested aggregation is derived from
+        needed = set()
+        for column, how in aggregations.items():
+            if how == "mean":
+                needed.update([(column, "sum"), (column, "count")])
+            else:
+                needed.add((column, how))
+        needed = sorted(needed)
+
+        merged = None
+        scanned = self.select(by + [column for column, _ in needed])
+        for chunk in scanned.iter_chunks():
+            grouped = chunk.groupby(by, sort=False)
+            partial = pd.DataFrame(
+                {
+                    (column, how): grouped.size()
+                    if how == "size"
+                    else grouped[column].agg(_PARTIALS[how][0])
+                    for column, how in needed
+                }
+            )
+            if merged is not None:
+                partial = pd.concat([merged, partial])
+                partial = partial.groupby(level=list(range(len(by))), sort=False).agg(
+                    {key: _PARTIALS[key[1]][1] for key in needed}
+                )
+            merged = partial
+
+        # An aggregate of a grouping column is named "<column>_<aggregation>"
+        names = {
+            column: f"{column}_{how}" if column in by else column
+            for column, how in aggregations.items()
+        }
+        if merged is None:
+            return pd.DataFrame(columns=by + list(names.values()))
+        merged.index.names = by
+        result = merged.index.to_frame(index=False)
+        for column, how in aggregations.items():
+            if how == "mean":
+                counts = merged[(column, "count")].replace(0, np.nan)
+                values = merged[(column, "sum")] / counts
+            else:
+                values = merged[(column, how)]
+            result[names[column]] = values.to_numpy()
+        return result
+
+    def sketch(self, skip_columns=()):
+        """Column sketches of the whole scan"""
+        sketch = DatasetSketch()
+        for chunk in self.iter_chunks():
+            sketch.update(chunk, skip_columns=skip_columns)
+        return sketch
+
+    def to_pandas(self, max_rows=None):
+        """Materializes the scan; refuses to grow past max_rows"""
+        parts, rows = [], 0
+        for chunk in self.iter_chunks():
+            rows += len(chunk)
+            if max_rows is not None and rows > max_rows:
+                raise MemoryError(
+                    f"Dataset has more than {max_rows:,} rows; use a streaming operation instead."
+                )
+            parts.append(chunk)
+        return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+
+
+def open_dataset(dataset_name, prefer_local=True, chunk_rows=CHUNK_ROWS):
+    """Lazy scan of a stored dataset: its local Parquet copy while that matches
+    the catalog's content hash, MongoDB otherwise"""
+    if prefer_local:
+        from src.sync import local_copy_path
+
+        path = local_copy_path(dataset_name)
+        if path is not None:
+            # Replacements are renames, so an open file keeps its snapshot
+            return LazyDataset.from_parquet(path, chunk_rows)
+    return LazyDataset.from_mongo(dataset_name, chunk_rows=chunk_rows)
@@ -0,0 +1,190 @@
+"""
+SQLite catalog of local storage
+One row per saved dataset, visualization and cached insight with its size,
+row count, save time and metadata, so listings, searches and storage totals
+are indexed queries instead of directory scans. WAL journaling lets several
+processes read while one writes.
+"""
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+KINDS = ("dataset", "visualization", "insight")
+SORT_COLUMNS = ("saved_at", "name", "size_bytes", "rows")
+# Milliseconds a writer waits for another process's transaction
+BUSY_TIMEOUT_MS = 5000
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS entries (
+        kind TEXT NOT NULL,
+        name TEXT NOT NULL,
+        path TEXT NOT NULL,
+        size_bytes INTEGER NOT NULL DEFAULT 0,
+        file_count INTEGER NOT NULL DEFAULT 1,
+        rows INTEGER,
+        saved_at TEXT,
+        metadata TEXT,
+        PRIMARY KEY (kind, name)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS entries_saved_at ON entries (kind, saved_at)",
+    "CREATE INDEX IF NOT EXISTS entries_size ON entries (kind, size_bytes)",
+    # Case-insensitive name search
+    "CREATE INDEX IF NOT EXISTS entries_name_lower ON entries (kind, lower(name))",
+)
+
+
+def _ascii_lower(text):
+    # SQLite's lower() folds ASCII letters only
+    return "".join(char.lower() if char.isascii() else char for char in text)
+
+
+class LocalCatalog:
+    """Thread-safe handle on the catalog database (one connection per thread)"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        # A new catalog has to be filled from the files already on disk
+        self.created = not self.path.exists()
+        self._local = threading.local()
+        with self.transaction() as connection:
+            for statement in _SCHEMA:
+                connection.execute(statement)
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    @contextmanager
+    def transaction(self):
+        """Commits the enclosed statements together, or rolls them all back"""
+        connection = self._connection()
+        with connection:
+            yield connection
+
+    def upsert(
+        self,
+        kind,
+        name,
+        path,
+        size_bytes,
+        file_count=1,
+        rows=None,
+        saved_at=None,
+        metadata=None,
+    ):
+        with self.transaction() as connection:
+            connection.execute(
+                """
+                INSERT INTO entries (kind, name, path, size_bytes, file_count, rows, saved_at, metadata)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (kind, name) DO UPDATE SET
+                    path = excluded.path,
+                    size_bytes = excluded.size_bytes,
+                    file_count = excluded.file_count,
+                    rows = excluded.rows,
+                    saved_at = excluded.saved_at,
+                    metadata = excluded.metadata
+                """,
+                (
+                    kind,
+                    name,
+                    str(path),
+                    int(size_bytes),
+                    int(file_count),
+                    rows,
+                    saved_at,
+                    json.dumps(metadata) if metadata is not None else None,
+                ),
+            )
+
+    def update_metadata(self, kind, name, metadata, size_bytes=None):
+        with self.transaction() as connection:
+            connection.execute(
+                "UPDATE entries SET metadata = ?, size_bytes = COALESCE(?, size_bytes) "
+                "WHERE kind = ? AND name = ?",
+                (json.dumps(metadata), size_bytes, kind, name),
+            )
+
+    def delete(self, kind=None, name=None):
+        """Deletes one entry, every entry of a kind, or (with no arguments) everything"""
+        query, params = "DELETE FROM entries", []
+        if kind is not None:
+            query += " WHERE kind = ?"
+            params.append(kind)
+            if name is not None:
+                query += " AND name = ?"
+                params.append(name)
+        with self.transaction() as connection:
+            connection.execute(query, params)
+
+    def replace_all(self, entries):
+        """Replaces the whole catalog with entries (dicts of upsert's arguments) at once"""
+        with self.transaction() as connection:
+            connection.execute("DELETE FROM entries")
+            connection.executemany(
+                "INSERT OR REPLACE INTO entries "
+                "(kind, name, path, size_bytes, file_count, rows, saved_at, metadata) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        entry["kind"],
+                        entry["name"],
+                        str(entry["path"]),
+                        int(entry.get("size_bytes", 0)),
+                        int(entry.get("file_count", 1)),
+                        entry.get("rows"),
+                        entry.get("saved_at"),
+                        json.dumps(entry["metadata"])
+                        if entry.get("metadata") is not None
+                        else None,
+                    )
+                    for entry in entries
+                ],
+            )
+
+    def list(
+        self, kind, search=None, sort_by="saved_at", descending=True, limit=None, offset=0
+    ):
+        """Entries of a kind, optionally filtered by case-insensitive name prefix"""
+        if sort_by not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort by '{sort_by}'. Use one of {SORT_COLUMNS}.")
+        query, params = "SELECT * FROM entries WHERE kind = ?", [kind]
+        if search:
+            # Prefix range over lower(name), so entries_name_lower serves it
+            prefix = _ascii_lower(search)
+            query += " AND lower(name) >= ? AND lower(name) < ?"
+            params.extend([prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)])
+        query += f" ORDER BY {sort_by} {'DESC' if descending else 'ASC'}, name"
+        if limit is not None:
+            query += " LIMIT ? OFFSET ?"
+            params.extend([int(limit), int(offset)])
+        rows = self._connection().execute(query, params).fetchall()
+        return [
+            {**dict(row), "metadata": json.loads(row["metadata"]) if row["metadata"] else None}
+            for row in rows
+        ]
+
+    def stats(self):
+        """Entry count, file count and bytes per kind"""
+        rows = self._connection().execute(
+            "SELECT kind, COUNT(*) AS entries, SUM(file_count) AS files, "
+            "SUM(size_bytes) AS size_bytes FROM entries GROUP BY kind"
+        ).fetchall()
+        totals = {kind: {"entries": 0, "files": 0, "size_bytes": 0} for kind in KINDS}
+        for row in rows:
+            totals[row["kind"]] = {
+                "entries": row["entries"],
+                "files": row["files"] or 0,
+                "size_bytes": row["size_bytes"] or 0,
+            }
+        return totals
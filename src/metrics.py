@@ -0,0 +1,275 @@
+"""
+Metrics and tracing for Plot Pyre
+A small thread-safe Prometheus-style registry (text exposition format) plus
+optional OpenTelemetry spans when the opentelemetry API is installed
+"""
+import functools
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from src import profiling
+
+try:
+    from opentelemetry import trace as _otel_trace
+
+    _tracer = _otel_trace.get_tracer("plot_pyre")
+except ImportError:
+    _tracer = None
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels):
+        missing = set(self.labelnames) - set(labels)
+        if missing:
+            raise ValueError(f"Missing labels for {self.name}: {sorted(missing)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        with self._lock:
+            lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    kind = "counter"
+
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self):
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+            for key, value in self._values.items()
+        ]
+
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+
+    kind = "gauge"
+
+    def dec(self, amount=1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket distribution of observed values"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self):
+        lines = []
+        for key, (counts, total) in self._values.items():
+            for bound, count in zip(self.buckets, counts):
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.labelnames, key, {"le": le})
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {counts[-1]}")
+        return lines
+
+
+def render_metrics():
+    """Returns every registered metric in Prometheus text exposition format"""
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+def span(name, **attributes):
+    """OpenTelemetry span context manager; a no-op when OpenTelemetry is not installed"""
+    if _tracer is None:
+        return nullcontext()
+    return _tracer.start_as_current_span(name, attributes=attributes)
+
+
+# HTTP API
+HTTP_REQUEST_DURATION = Histogram(
+    "plot_pyre_http_request_duration_seconds",
+    "API request latency by route",
+    ["method", "route", "status"],
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "plot_pyre_http_requests_in_flight", "API requests currently being served"
+)
+
+# Admission control
+ADMISSION_IN_FLIGHT = Gauge(
+    "plot_pyre_admission_in_flight", "Requests holding an admission slot", ["limiter"]
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "plot_pyre_admission_queue_depth", "Requests waiting for an admission slot", ["limiter"]
+)
+ADMISSION_WAIT = Histogram(
+    "plot_pyre_admission_wait_seconds", "Time spent queued before admission", ["limiter"]
+)
+ADMISSION_REJECTIONS = Counter(
+    "plot_pyre_admission_rejections_total",
+    "Requests shed with 429, by reason (queue_full, timeout, rate_limited)",
+    ["limiter", "reason"],
+)
+
+# Data layer
+OPERATION_DURATION = Histogram(
+    "plot_pyre_operation_duration_seconds",
+    "Latency of data-layer and AI operations",
+    ["operation"],
+)
+OPERATION_ERRORS = Counter(
+    "plot_pyre_operation_errors_total", "Failed data-layer and AI operations", ["operation"]
+)
+MONGO_COMMAND_DURATION = Histogram(
+    "plot_pyre_mongo_command_duration_seconds",
+    "MongoDB command latency by command name",
+    ["command"],
+)
+MONGO_COMMAND_FAILURES = Counter(
+    "plot_pyre_mongo_command_failures_total", "Failed MongoDB commands", ["command"]
+)
+
+# Gemini and embeddings
+GEMINI_REQUEST_DURATION = Histogram(
+    "plot_pyre_gemini_request_duration_seconds", "Gemini API call latency", ["call"]
+)
+GEMINI_TOKENS = Counter(
+    "plot_pyre_gemini_tokens_total", "Tokens used by Gemini calls", ["call", "kind"]
+)
+GEMINI_ERRORS = Counter("plot_pyre_gemini_errors_total", "Failed Gemini calls", ["call"])
+EMBEDDINGS_GENERATED = Counter(
+    "plot_pyre_embeddings_generated_total", "Texts embedded", ["provider"]
+)
+EMBEDDING_DURATION = Histogram(
+    "plot_pyre_embedding_batch_duration_seconds",
+    "Time to embed one batch of texts",
+    ["provider"],
+)
+
+# Caches
+CACHE_REQUESTS = Counter(
+    "plot_pyre_cache_requests_total", "Cache lookups by outcome", ["cache", "result"]
+)
+
+
+def record_cache(cache, hit):
+    """Counts one cache lookup as a hit or a miss"""
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def instrumented(operation):
+    """Decorator: times a function into OPERATION_DURATION inside a tracing span
+
+    The call is also recorded as a stage of the active profile, if any.
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(f"plot_pyre.{operation}"), profiling.stage(
+                operation
+            ), OPERATION_DURATION.time(operation=operation):
+                try:
+                    return function(*args, **kwargs)
+                except Exception:
+                    OPERATION_ERRORS.inc(operation=operation)
+                    raise
+
+        return wrapper
+
+    return decorator
+
+
+def mongo_command_listener():
+    """Returns a pymongo CommandListener that feeds MONGO_COMMAND_DURATION"""
+    from pymongo import monitoring
+
+    class MongoCommandMetrics(monitoring.CommandListener):
+        def started(self, event):
+            pass
+
+        def succeeded(self, event):
+            seconds = event.duration_micros / 1e6
+            MONGO_COMMAND_DURATION.observe(seconds, command=event.command_name)
+            profiling.record(f"mongo:{event.command_name}", seconds)
+
+        def failed(self, event):
+            seconds = event.duration_micros / 1e6
+            MONGO_COMMAND_DURATION.observe(seconds, command=event.command_name)
+            MONGO_COMMAND_FAILURES.inc(command=event.command_name)
+            profiling.record(f"mongo:{event.command_name}", seconds)
+
+    return MongoCommandMetrics()
@@ -9,18 +9,65 @@ from pathlib import Path
 import pandas as pd
 from typing import Dict, Any, Optional, List
 import hashlib
+import sqlite3
 import streamlit as st
 
+from src.atomic_io import WriteAheadManifest, atomic_write_text, file_lock
+from src.local_catalog import LocalCatalog
+
+# Rows per Parquet row group; small groups let the explorer read one page's worth
+PARQUET_ROW_GROUP_SIZE = 10000
+
 # Local storage configuration
 LOCAL_STORAGE_DIR = Path.home() / ".plot_pyre" / "local_storage"
 CACHE_DIR = LOCAL_STORAGE_DIR / "cache"
 DATASETS_DIR = LOCAL_STORAGE_DIR / "datasets"
 VISUALIZATIONS_DIR = LOCAL_STORAGE_DIR / "visualizations"
 
+LOCK_DIR = LOCAL_STORAGE_DIR / ".locks"
+
 # Ensure directories exist
 for dir_path in [LOCAL_STORAGE_DIR, CACHE_DIR, DATASETS_DIR, VISUALIZATIONS_DIR]:
     dir_path.mkdir(parents=True, exist_ok=True)
 
+# A dataset's Parquet file and metadata are committed together through this log;
+# commits interrupted by a crash are finished (or rolled back) on startup
+_manifest = WriteAheadManifest(LOCAL_STORAGE_DIR / "manifest.wal", LOCK_DIR)
+try:
+    _recovered = _manifest.recover(
+        [LOCAL_STORAGE_DIR, CACHE_DIR, DATASETS_DIR, VISUALIZATIONS_DIR]
+    )
+except OSError as e:
+    _recovered = []
+    print(f"Could not recover local storage manifest: {e}")
+
+
+# Indexed listing and size totals; the files themselves stay the source of truth
+_catalog = LocalCatalog(LOCAL_STORAGE_DIR / "catalog.sqlite3")
+
+
+def _dataset_lock(dataset_name, shared=False):
+    return file_lock(LOCK_DIR, f"dataset:{dataset_name}", shared=shared)
+
+
+def _size(*paths):
+    return sum(path.stat().st_size for path in paths if path.exists())
+
+
+def _dataset_entry(metadata_path, metadata):
+    name = metadata.get("dataset_name") or metadata_path.name[: -len("_metadata.json")]
+    dataset_path = DATASETS_DIR / f"{name}.parquet"
+    return {
+        "kind": "dataset",
+        "name": name,
+        "path": dataset_path,
+        "size_bytes": _size(dataset_path, metadata_path),
+        "file_count": 2,
+        "rows": metadata.get("rows"),
+        "saved_at": metadata.get("saved_at"),
+        "metadata": metadata,
+    }
+
 class OfflineStorage:
     """Handles offline storage of datasets, visualizations, and AI insights"""
     
@@ -31,9 +78,6 @@ class OfflineStorage:
             dataset_path = DATASETS_DIR / f"{dataset_name}.parquet"
             metadata_path = DATASETS_DIR / f"{dataset_name}_metadata.json"
             
-            # Save dataframe as parquet for efficient storage
-            df.to_parquet(dataset_path, index=False)
-            
             # Save metadata
             if metadata is None:
                 metadata = {}
@@ -44,38 +88,154 @@ class OfflineStorage:
                 "saved_at": pd.Timestamp.now().isoformat()
             })
             
-            with open(metadata_path, 'w') as f:
-                json.dump(metadata, f, indent=2)
+            # Readers see either the old pair of files or the new one, never a mix
+            with _dataset_lock(dataset_name):
+                with _manifest.commit() as commit:
+                    # Save dataframe as parquet for efficient storage
+                    df.to_parquet(
+                        commit.path(dataset_path),
+                        index=False,
+                        row_group_size=PARQUET_ROW_GROUP_SIZE,
+                    )
+                    commit.write_text(metadata_path, json.dumps(metadata, indent=2))
+                    # Part of the commit: after a crash, recovery re-indexes the files
+                    commit.after_apply(
+                        lambda: _catalog.upsert(
+                            **_dataset_entry(metadata_path, metadata)
+                        )
+                    )
                 
             return str(dataset_path)
         except Exception as e:
             st.error(f"Error saving dataset locally: {e}")
             return None
     
+    @staticmethod
+    def read_local_dataset(dataset_name: str) -> Optional[pd.DataFrame]:
+        """Like load_local_dataset, but raises read errors instead of showing them
+        (for callers outside a Streamlit session, e.g. the background sync)"""
+        dataset_path = DATASETS_DIR / f"{dataset_name}.parquet"
+        with _dataset_lock(dataset_name, shared=True):
+            if dataset_path.exists():
+                return pd.read_parquet(dataset_path)
+        return None
+
     @staticmethod
     def load_local_dataset(dataset_name: str) -> Optional[pd.DataFrame]:
         """Load dataset from local storage"""
         try:
-            dataset_path = DATASETS_DIR / f"{dataset_name}.parquet"
-            if dataset_path.exists():
-                return pd.read_parquet(dataset_path)
-            return None
+            return OfflineStorage.read_local_dataset(dataset_name)
         except Exception as e:
             st.error(f"Error loading local dataset: {e}")
             return None
     
     @staticmethod
-    def list_local_datasets() -> List[Dict[str, Any]]:
-        """List all locally stored datasets"""
-        datasets = []
+    def get_dataset_metadata(dataset_name: str) -> Optional[Dict[str, Any]]:
+        """Metadata saved with a local dataset, or None"""
+        with _dataset_lock(dataset_name, shared=True):
+            return OfflineStorage._read_metadata(dataset_name)
+    
+    @staticmethod
+    def _read_metadata(dataset_name: str) -> Optional[Dict[str, Any]]:
+        metadata_path = DATASETS_DIR / f"{dataset_name}_metadata.json"
+        try:
+            with open(metadata_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    @staticmethod
+    def update_dataset_metadata(dataset_name: str, fields: Dict[str, Any]):
+        """Merge fields into a local dataset's metadata without rewriting its data"""
+        with _dataset_lock(dataset_name):
+            metadata = OfflineStorage._read_metadata(dataset_name)
+            if metadata is None:
+                return False
+            metadata.update(fields)
+            metadata_path = DATASETS_DIR / f"{dataset_name}_metadata.json"
+            atomic_write_text(metadata_path, json.dumps(metadata, indent=2))
+            _catalog.update_metadata(
+                "dataset",
+                dataset_name,
+                metadata,
+                size_bytes=_size(DATASETS_DIR / f"{dataset_name}.parquet", metadata_path),
+            )
+        return True
+    
+    @staticmethod
+    def delete_local_dataset(dataset_name: str):
+        """Delete a dataset's local files and catalog entry"""
+        with _dataset_lock(dataset_name):
+            for path in [
+                DATASETS_DIR / f"{dataset_name}.parquet",
+                DATASETS_DIR / f"{dataset_name}_metadata.json",
+            ]:
+                path.unlink(missing_ok=True)
+            _catalog.delete("dataset", dataset_name)
+        return True
+    
+    @staticmethod
+    def list_local_datasets(
+        search: str = None,
+        sort_by: str = "saved_at",
+        descending: bool = True,
+        limit: int = None,
+        offset: int = 0,
+    ) -> List[Dict[str, Any]]:
+        """List locally stored datasets' metadata from the catalog, newest first
+
+        ``search`` is a case-insensitive name prefix; ``sort_by`` is one of
+        "saved_at", "name", "size_bytes" or "rows".
+        """
+        entries = _catalog.list(
+            "dataset",
+            search=search,
+            sort_by=sort_by,
+            descending=descending,
+            limit=limit,
+            offset=offset,
+        )
+        return [
+            {
+                **(entry["metadata"] or {"dataset_name": entry["name"]}),
+                "size_bytes": entry["size_bytes"],
+            }
+            for entry in entries
+        ]
+    
+    @staticmethod
+    def rebuild_catalog() -> int:
+        """Re-index every file in local storage; returns the number of entries"""
+        entries = []
         for metadata_path in DATASETS_DIR.glob("*_metadata.json"):
             try:
                 with open(metadata_path, 'r') as f:
                     metadata = json.load(f)
-                    datasets.append(metadata)
-            except:
+            except (OSError, ValueError) as e:
+                # Writes are atomic, so this is damage from outside the app
+                print(f"Skipping unreadable dataset metadata {metadata_path.name}: {e}")
                 continue
-        return sorted(datasets, key=lambda x: x.get("saved_at", ""), reverse=True)
+            entries.append(_dataset_entry(metadata_path, metadata))
+        for kind, directory, suffix, time_field in [
+            ("insight", CACHE_DIR, "_insights.json", "cached_at"),
+            ("visualization", VISUALIZATIONS_DIR, "_config.json", "saved_at"),
+        ]:
+            for path in directory.glob(f"*{suffix}"):
+                try:
+                    with open(path, 'r') as f:
+                        data = json.load(f)
+                except (OSError, ValueError):
+                    data = {}
+                entries.append({
+                    "kind": kind,
+                    "name": path.name[: -len(suffix)],
+                    "path": path,
+                    "size_bytes": _size(path),
+                    "saved_at": data.get(time_field),
+                    "metadata": data if kind == "visualization" else None,
+                })
+        _catalog.replace_all(entries)
+        return len(entries)
     
     @staticmethod
     def cache_ai_insights(dataset_name: str, insights: str, query: str = None):
@@ -91,8 +251,14 @@ class OfflineStorage:
                 "cached_at": pd.Timestamp.now().isoformat()
             }
             
-            with open(cache_path, 'w') as f:
-                json.dump(cache_data, f, indent=2)
+            atomic_write_text(cache_path, json.dumps(cache_data, indent=2))
+            _catalog.upsert(
+                "insight",
+                cache_key,
+                cache_path,
+                _size(cache_path),
+                saved_at=cache_data["cached_at"],
+            )
                 
             return str(cache_path)
         except Exception as e:
@@ -125,8 +291,15 @@ class OfflineStorage:
                 "viz_name": viz_name
             })
             
-            with open(viz_path, 'w') as f:
-                json.dump(config, f, indent=2)
+            atomic_write_text(viz_path, json.dumps(config, indent=2))
+            _catalog.upsert(
+                "visualization",
+                viz_name,
+                viz_path,
+                _size(viz_path),
+                saved_at=config["saved_at"],
+                metadata=config,
+            )
                 
             return str(viz_path)
         except Exception as e:
@@ -150,22 +323,16 @@ class OfflineStorage:
     def get_storage_stats() -> Dict[str, Any]:
         """Get statistics about local storage usage"""
         try:
-            total_size = 0
-            file_count = 0
-            
-            for dir_path in [CACHE_DIR, DATASETS_DIR, VISUALIZATIONS_DIR]:
-                if dir_path.exists():
-                    for file_path in dir_path.rglob("*"):
-                        if file_path.is_file():
-                            total_size += file_path.stat().st_size
-                            file_count += 1
-            
+            # Aggregated in the catalog instead of walking the directories
+            totals = _catalog.stats()
             return {
-                "total_size_mb": round(total_size / (1024 * 1024), 2),
-                "file_count": file_count,
-                "datasets_count": len(list(DATASETS_DIR.glob("*.parquet"))),
-                "cache_entries": len(list(CACHE_DIR.glob("*.json"))),
-                "visualizations": len(list(VISUALIZATIONS_DIR.glob("*.json")))
+                "total_size_mb": round(
+                    sum(kind["size_bytes"] for kind in totals.values()) / (1024 * 1024), 2
+                ),
+                "file_count": sum(kind["files"] for kind in totals.values()),
+                "datasets_count": totals["dataset"]["entries"],
+                "cache_entries": totals["insight"]["entries"],
+                "visualizations": totals["visualization"]["entries"]
             }
         except Exception as e:
             st.error(f"Error getting storage stats: {e}")
@@ -177,6 +344,7 @@ class OfflineStorage:
         try:
             for cache_file in CACHE_DIR.glob("*"):
                 cache_file.unlink()
+            _catalog.delete("insight")
             return True
         except Exception as e:
             st.error(f"Error clearing cache: {e}")
@@ -190,11 +358,28 @@ class OfflineStorage:
                 for file_path in dir_path.rglob("*"):
                     if file_path.is_file():
                         file_path.unlink()
+            _catalog.delete()
             return True
         except Exception as e:
             st.error(f"Error clearing storage: {e}")
             return False
 
+# Storage written before the catalog existed is indexed once
+if _catalog.created:
+    try:
+        OfflineStorage.rebuild_catalog()
+    except (OSError, sqlite3.Error) as e:
+        print(f"Could not index local storage: {e}")
+else:
+    # Datasets whose commits recovery finished may have missed their catalog update
+    for _path in _recovered:
+        if _path.parent == DATASETS_DIR and _path.name.endswith("_metadata.json"):
+            try:
+                with open(_path, 'r') as f:
+                    _catalog.upsert(**_dataset_entry(_path, json.load(f)))
+            except (OSError, ValueError, sqlite3.Error) as e:
+                print(f"Could not re-index recovered dataset {_path.name}: {e}")
+
 # PWA Service Worker for offline functionality
 PWA_SERVICE_WORKER = """
 const CACHE_NAME = 'plot-pyre-v1';
@@ -0,0 +1,226 @@
+"""
+Server-side pagination for the Data Explorer
+Pagers read one page at a time from MongoDB (keyset on a sort key plus _id),
+from Parquet row groups, or from an in-memory frame, and prefetch the next
+page in the background so paging forward costs no visible I/O.
+"""
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import pandas as pd
+
+from src.db_utils import BLOCK_FIELD, get_database
+
+DEFAULT_PAGE_SIZE = 100
+# Pages kept per pager; the current one, its neighbours and a few recent jumps
+PAGE_CACHE_SIZE = 8
+
+_prefetcher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="plot-pyre-prefetch")
+
+
+class Pager:
+    """Base pager: numbered pages (from 1) with an LRU page cache and prefetch.
+
+    Subclasses implement ``_count`` and ``_fetch(page)``.
+    """
+
+    def __init__(self, page_size=DEFAULT_PAGE_SIZE, prefetch=True):
+        self.page_size = int(page_size)
+        self.prefetch = prefetch
+        self._pages = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._total_rows = None
+
+    @property
+    def total_rows(self):
+        if self._total_rows is None:
+            self._total_rows = self._count()
+        return self._total_rows
+
+    @property
+    def page_count(self):
+        return max((self.total_rows + self.page_size - 1) // self.page_size, 1)
+
+    def _count(self):
+        raise NotImplementedError
+
+    def _fetch(self, page):
+        raise NotImplementedError
+
+    def _load(self, page):
+        with self._lock:
+            if page in self._pages:
+                self._pages.move_to_end(page)
+                return self._pages[page]
+            future = self._pending.get(page)
+        frame = future.result() if future is not None else self._fetch(page)
+        with self._lock:
+            self._pending.pop(page, None)
+            self._pages[page] = frame
+            while len(self._pages) > PAGE_CACHE_SIZE:
+                self._pages.popitem(last=False)
+        return frame
+
+    def _schedule(self, page):
+        with self._lock:
+            if page in self._pages or page in self._pending:
+                return
+            self._pending[page] = _prefetcher.submit(self._fetch, page)
+
+    def get_page(self, page):
+        """Returns page (1-based) as a DataFrame and starts fetching the next one"""
+        page = min(max(int(page), 1), self.page_count)
+        frame = self._load(page)
+        if self.prefetch and page < self.page_count:
+            self._schedule(page + 1)
+        return frame
+
+
+class FramePager(Pager):
+    """Pages an in-memory DataFrame"""
+
+    def __init__(self, df, page_size=DEFAULT_PAGE_SIZE):
+        super().__init__(page_size, prefetch=False)
+        self.df = df
+
+    def _count(self):
+        return len(self.df)
+
+    def _fetch(self, page):
+        start = (page - 1) * self.page_size
+        return self.df.iloc[start : start + self.page_size]
+
+
+class ParquetPager(Pager):
+    """Pages a Parquet file by reading only the row groups a page overlaps"""
+
+    def __init__(self, path, page_size=DEFAULT_PAGE_SIZE, columns=None):
+        super().__init__(page_size)
+        import pyarrow.parquet as pq
+
+        self.path = str(path)
+        self.columns = columns
+        self._file = pq.ParquetFile(self.path)
+        metadata = self._file.metadata
+        self._group_starts = []
+        offset = 0
+        for group in range(metadata.num_row_groups):
+            self._group_starts.append(offset)
+            offset += metadata.row_group(group).num_rows
+        self._total_rows = offset
+
+    def _count(self):
+        return self._total_rows
+
+    def _fetch(self, page):
+        start = (page - 1) * self.page_size
+        stop = min(start + self.page_size, self._total_rows)
+        groups = [
+            group
+            for group, group_start in enumerate(self._group_starts)
+            if group_start < stop
+            and group_start + self._file.metadata.row_group(group).num_rows > start
+        ]
+        if not groups:
+            return pd.DataFrame()
+        table = self._file.read_row_groups(groups, columns=self.columns)
+        offset = start - self._group_starts[groups[0]]
+        return table.slice(offset, stop - start).to_pandas()
+
+
+class MongoPager(Pager):
+    """Keyset pagination over a MongoDB collection.
+
+    Pages are ordered by ``sort_key`` with ``_id`` as a tie-breaker, and each
+    page is fetched with a range query after the previous page's last key, so
+    it reads one page of documents however deep it is. Jumping to a page whose
+    start key is not known yet skips over sort keys only (a covered index scan
+    when ``sort_key`` is indexed), not whole documents.
+    """
+
+    def __init__(
+        self,
+        collection,
+        page_size=DEFAULT_PAGE_SIZE,
+        sort_key="_id",
+        filters=None,
+        exclude_fields=("embedding", BLOCK_FIELD),
+    ):
+        super().__init__(page_size)
+        self.collection = collection
+        self.sort_key = sort_key
+        self.filters = dict(filters or {})
+        self.projection = {field: 0 for field in exclude_fields}
+        # Last (sort value, _id) of each page fetched so far
+        self._boundaries = {0: None}
+
+    def _count(self):
+        if self.filters:
+            return self.collection.count_documents(self.filters)
+        return self.collection.estimated_document_count()
+
+    def _sort(self):
+        if self.sort_key == "_id":
+            return [("_id", 1)]
+        return [(self.sort_key, 1), ("_id", 1)]
+
+    def _after(self, boundary):
+        if boundary is None:
+            return self.filters
+        value, last_id = boundary
+        if self.sort_key == "_id":
+            condition = {"_id": {"$gt": last_id}}
+        else:
+            condition = {
+                "$or": [
+                    {self.sort_key: {"$gt": value}},
+                    {self.sort_key: value, "_id": {"$gt": last_id}},
+                ]
+            }
+        return {"$and": [self.filters, condition]} if self.filters else condition
+
+    def _boundary_before(self, page):
+        with self._lock:
+            if page - 1 in self._boundaries:
+                return self._boundaries[page - 1]
+        # Unknown start: skip over keys only, never over full documents
+        keys = list(
+            self.collection.find(self.filters, {self.sort_key: 1, "_id": 1})
+            .sort(self._sort())
+            .skip((page - 1) * self.page_size - 1)
+            .limit(1)
+        )
+        if not keys:
+            return None
+        return (keys[0].get(self.sort_key), keys[0]["_id"])
+
+    def _fetch(self, page):
+        boundary = self._boundary_before(page)
+        documents = list(
+            self.collection.find(self._after(boundary), self.projection)
+            .sort(self._sort())
+            .limit(self.page_size)
+        )
+        if documents:
+            last = documents[-1]
+            with self._lock:
+                self._boundaries[page] = (last.get(self.sort_key), last["_id"])
+        frame = pd.DataFrame(documents)
+        if "_id" in frame.columns:
+            frame["_id"] = frame["_id"].astype(str)
+        return frame
+
+
+@lru_cache(maxsize=8)
+def parquet_pager(path, modified_ns, page_size=DEFAULT_PAGE_SIZE):
+    """Shared pager for a local Parquet copy; rewriting the file (new mtime) retires it"""
+    return ParquetPager(path, page_size)
+
+
+@lru_cache(maxsize=32)
+def mongo_pager(dataset_name, version, page_size=DEFAULT_PAGE_SIZE, sort_key="_id"):
+    """Shared pager for a dataset; the catalog version retires pagers of stale data"""
+    return MongoPager(get_database()[dataset_name], page_size, sort_key)
@@ -0,0 +1,244 @@
+"""
+Opt-in profiling for Plot Pyre
+Per-stage timers plus a low-rate stack sampler around one Streamlit rerun or
+API request, written out as folded-stack files for flamegraph tools
+(flamegraph.pl, speedscope, inferno). PLOT_PYRE_PROFILE=1 profiles everything;
+PLOT_PYRE_PROFILE=allow profiles only requests that carry ?profile=1. Stages
+cost one context-variable lookup when no profile is active.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from src.config import get_setting
+
+PROFILE_SETTING = "PLOT_PYRE_PROFILE"
+# PROFILE_SETTING value that lets callers opt in with the query parameter
+PROFILE_ALLOW = "allow"
+PROFILE_QUERY_PARAM = "profile"
+DEFAULT_PROFILE_DIR = "profiles"
+# Seconds between stack samples; ~200 Hz keeps overhead to a few percent
+SAMPLE_INTERVAL = 0.005
+MAX_STACK_DEPTH = 128
+
+_TRUTHY = {"1", "true", "yes", "on"}
+_active = ContextVar("plot_pyre_profile", default=None)
+
+
+def profiling_enabled(query_value=None):
+    """True when the setting enables profiling, or allows it and a ?profile=1
+    style query value asks for it"""
+    setting = str(get_setting(PROFILE_SETTING, "")).lower()
+    if setting == PROFILE_ALLOW:
+        return query_value is not None and str(query_value).lower() in _TRUTHY
+    return setting in _TRUTHY
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+class _Sampler(threading.Thread):
+    """Samples the stacks of the profiled threads into folded-stack counts"""
+
+    def __init__(self, profile, interval):
+        super().__init__(name="plot-pyre-profiler", daemon=True)
+        self.profile = profile
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id in list(self.profile.thread_ids):
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                if stack:
+                    self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class Profile:
+    """Stage timings and stack samples for one rerun or request"""
+
+    def __init__(self, label, sample=True, interval=SAMPLE_INTERVAL):
+        self.label = label
+        self.started_at = time.time()
+        self.duration = 0.0
+        # Inclusive seconds per stage path, e.g. ("mainContent", "Visualization")
+        self.stages = defaultdict(float)
+        self.calls = Counter()
+        self.thread_ids = {threading.get_ident()}
+        self._stacks = defaultdict(list)
+        self._sampler = _Sampler(self, interval) if sample else None
+        self._token = None
+        self._started = None
+
+    def start(self):
+        self._token = _active.set(self)
+        self._started = time.perf_counter()
+        if self._sampler is not None:
+            self._sampler.start()
+        return self
+
+    def stop(self):
+        self.duration = time.perf_counter() - self._started
+        if self._sampler is not None:
+            self._sampler.stop()
+        _active.reset(self._token)
+        return self
+
+    def _path(self, name):
+        stack = self._stacks[threading.get_ident()]
+        return tuple(stack) + (name,)
+
+    def add(self, name, seconds):
+        """Records an already-measured duration under the current stage"""
+        path = self._path(name)
+        self.stages[path] += seconds
+        self.calls[path] += 1
+
+    @contextmanager
+    def stage(self, name):
+        thread_id = threading.get_ident()
+        self.thread_ids.add(thread_id)
+        stack = self._stacks[thread_id]
+        stack.append(name)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            path = tuple(stack)
+            stack.pop()
+            self.stages[path] += time.perf_counter() - started
+            self.calls[path] += 1
+
+    def _self_times(self):
+        # Stage time not accounted for by its child stages
+        children = defaultdict(float)
+        for path, seconds in self.stages.items():
+            if len(path) > 1:
+                children[path[:-1]] += seconds
+        return {
+            path: max(seconds - children[path], 0.0)
+            for path, seconds in self.stages.items()
+        }
+
+    def breakdown(self):
+        """Returns stage rows (path, calls, inclusive and self ms), slowest first"""
+        self_times = self._self_times()
+        rows = [
+            {
+                "stage": " / ".join(path),
+                "calls": self.calls[path],
+                "total_ms": round(seconds * 1000, 2),
+                "self_ms": round(self_times[path] * 1000, 2),
+            }
+            for path, seconds in self.stages.items()
+        ]
+        rows.sort(key=lambda row: row["total_ms"], reverse=True)
+        return rows
+
+    def server_timing(self):
+        """Formats top-level stages as a Server-Timing header value"""
+        entries = [f'total;dur={self.duration * 1000:.1f}']
+        for path, seconds in self.stages.items():
+            if len(path) == 1:
+                token = "".join(c if c.isalnum() or c in "-_" else "_" for c in path[0])
+                entries.append(f'{token};dur={seconds * 1000:.1f};desc="{path[0]}"')
+        return ", ".join(entries)
+
+    def folded_stages(self):
+        """Stage tree in folded format, weighted by self time in microseconds"""
+        tracked = sum(s for path, s in self.stages.items() if len(path) == 1)
+        lines = [f"{self.label};(untracked) {max(int((self.duration - tracked) * 1e6), 0)}"]
+        for path, seconds in self._self_times().items():
+            if int(seconds * 1e6):
+                lines.append(";".join((self.label,) + path) + f" {int(seconds * 1e6)}")
+        return "\n".join(lines) + "\n"
+
+    def folded_samples(self):
+        """Sampled stacks in folded format, weighted by sample count"""
+        if self._sampler is None:
+            return ""
+        return "".join(
+            f"{self.label};{stack} {count}\n"
+            for stack, count in self._sampler.stacks.most_common()
+        )
+
+    @property
+    def sample_count(self):
+        return sum(self._sampler.stacks.values()) if self._sampler else 0
+
+    def dump(self, directory=None):
+        """Writes <label>-<time>.stages.folded and .samples.folded; returns their paths"""
+        directory = Path(directory or get_setting("PROFILE_DIR", DEFAULT_PROFILE_DIR))
+        directory.mkdir(parents=True, exist_ok=True)
+        stem = "".join(c if c.isalnum() or c in "-_" else "_" for c in self.label)
+        timestamp = time.strftime("%Y%m%dT%H%M%S", time.localtime(self.started_at))
+        millis = int(self.started_at * 1000) % 1000
+        stem = f"{stem}-{timestamp}.{millis:03d}-{os.getpid()}"
+        paths = {"stages": directory / f"{stem}.stages.folded"}
+        paths["stages"].write_text(self.folded_stages())
+        if self._sampler is not None:
+            paths["samples"] = directory / f"{stem}.samples.folded"
+            paths["samples"].write_text(self.folded_samples())
+        return paths
+
+
+@contextmanager
+def profile(label, sample=True, dump=True):
+    """Profiles the enclosed block; yields the Profile (files are written on exit)"""
+    current = Profile(label, sample=sample).start()
+    try:
+        yield current
+    finally:
+        current.stop()
+        if dump:
+            try:
+                current.dump()
+            except OSError as e:
+                print(f"Could not write profile for {label}: {e}")
+
+
+def active_profile():
+    return _active.get()
+
+
+def stage(name):
+    """Times the enclosed block as a stage of the active profile, if any"""
+    current = _active.get()
+    if current is None:
+        return _NULL_STAGE
+    return current.stage(name)
+
+
+def record(name, seconds):
+    """Adds a measured duration (e.g. a Mongo command) to the active profile, if any"""
+    current = _active.get()
+    if current is not None:
+        current.add(name, seconds)
+
+
+class _NullStage:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_STAGE = _NullStage()
@@ -0,0 +1,286 @@
+"""
+Token-budgeted prompt building for AI insights
+Summarizes a DataFrame from a cached column profile, ranks columns by relevance
+to the question and fits the summary plus a stratified sample into a budget
+"""
+import re
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from src.metrics import record_cache
+from src.search_utils import tokenize
+from src.text_assembly import CHARS_PER_TOKEN
+
+DEFAULT_TOKEN_BUDGET = 6000
+# Share of the budget reserved for sample rows
+SAMPLE_BUDGET_SHARE = 0.25
+SAMPLE_ROWS = 8
+# Columns shown in the sample table
+SAMPLE_MAX_COLUMNS = 12
+TOP_VALUES = 5
+# Rows used to profile very large frames; statistics are estimates beyond this
+PROFILE_MAX_ROWS = 200000
+PROFILE_CACHE_SIZE = 16
+
+_profile_cache = OrderedDict()
+
+
+def estimate_tokens(text):
+    """Approximates the token count of text without calling a tokenizer"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _format_number(value):
+    return "nan" if pd.isna(value) else f"{value:.4g}"
+
+
+def _profile_column(series):
+    non_null = series.dropna()
+    column = {
+        "dtype": str(series.dtype),
+        "null_ratio": float(1 - len(non_null) / len(series)) if len(series) else 0.0,
+    }
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        quantiles = non_null.quantile([0.25, 0.5, 0.75]) if len(non_null) else None
+        column.update(
+            kind="numeric",
+            mean=non_null.mean(),
+            std=non_null.std(),
+            min=non_null.min() if len(non_null) else np.nan,
+            p25=quantiles.iloc[0] if quantiles is not None else np.nan,
+            median=quantiles.iloc[1] if quantiles is not None else np.nan,
+            p75=quantiles.iloc[2] if quantiles is not None else np.nan,
+            max=non_null.max() if len(non_null) else np.nan,
+        )
+    else:
+        try:
+            counts = non_null.value_counts()
+        except TypeError:
+            counts = non_null.astype(str).value_counts()
+        column.update(
+            kind="categorical",
+            distinct=int(len(counts)),
+            top=[
+                (str(value), float(count / max(len(non_null), 1)))
+                for value, count in counts.head(TOP_VALUES).items()
+            ],
+        )
+    return column
+
+
+def _is_vector_column(series):
+    # Embedding columns hold arrays/lists per cell and carry no insight
+    first = series.first_valid_index()
+    return first is not None and isinstance(
+        series[first], (list, tuple, np.ndarray, bytes)
+    )
+
+
+def profile_dataframe(df, content_key=None):
+    """Returns a per-column statistical profile.
+
+    ``content_key`` identifies the frame's exact contents (an upload's hash, a
+    stored dataset's content hash); profiles are cached only under such a key.
+    """
+    if content_key is not None:
+        record_cache("insights_profile", content_key in _profile_cache)
+        if content_key in _profile_cache:
+            _profile_cache.move_to_end(content_key)
+            return _profile_cache[content_key]
+
+    source = df
+    if len(df) > PROFILE_MAX_ROWS:
+        source = df.sample(n=PROFILE_MAX_ROWS, random_state=42)
+    profile = {
+        "rows": len(df),
+        "sampled_rows": len(source),
+        "columns": {
+            column: _profile_column(source[column])
+            for column in df.columns
+            if not _is_vector_column(source[column])
+        },
+    }
+    if content_key is not None:
+        _profile_cache[content_key] = profile
+        if len(_profile_cache) > PROFILE_CACHE_SIZE:
+            _profile_cache.popitem(last=False)
+    return profile
+
+
+def profile_from_sketch(sketch, sample):
+    """Profile of a whole dataset from its column sketches (no scan of the data).
+
+    ``sample`` is a frame of its rows; it provides dtypes and decides which
+    columns are profiled (vector columns are skipped).
+    """
+    columns = {}
+    for name in sample.columns:
+        column_sketch = sketch.columns.get(str(name))
+        if column_sketch is None or _is_vector_column(sample[name]):
+            continue
+        summary = column_sketch.summary()
+        seen = summary["count"] + summary["nulls"]
+        column = {
+            "dtype": str(sample[name].dtype),
+            "null_ratio": float(summary["nulls"] / seen) if seen else 0.0,
+            "kind": summary["kind"],
+        }
+        if summary["kind"] == "numeric":
+            for label, key in (
+                ("mean", "mean"),
+                ("std", "std"),
+                ("min", "min"),
+                ("p25", "p25"),
+                ("median", "p50"),
+                ("p75", "p75"),
+                ("max", "max"),
+            ):
+                column[label] = summary.get(key, np.nan)
+        else:
+            column.update(
+                distinct=int(summary["distinct"]),
+                top=[
+                    (str(value), float(count / max(summary["count"], 1)))
+                    for value, count in summary.get("top", [])[:TOP_VALUES]
+                ],
+            )
+        columns[name] = column
+    return {"rows": sketch.rows, "sampled_rows": sketch.rows, "columns": columns}
+
+
+def _name_tokens(name):
+    # Splits snake_case, kebab-case and camelCase column names into words
+    spaced = re.sub(r"(?<=[a-z0-9])(?=[A-Z])", " ", str(name))
+    return set(tokenize(spaced.replace("_", " ")))
+
+
+def rank_columns(profile, question=None, specific_columns=None):
+    """Orders columns: requested ones first, then by overlap with the question"""
+    question_tokens = set(tokenize(question)) if question else set()
+    requested = [c for c in (specific_columns or []) if c in profile["columns"]]
+
+    def score(item):
+        name, column = item
+        overlap = len(_name_tokens(name) & question_tokens)
+        # Prefer complete, informative columns when the question gives no signal
+        completeness = 1.0 - column["null_ratio"]
+        informative = float(
+            column["kind"] == "numeric" or column.get("distinct", 0) > 1
+        )
+        return (overlap, informative, completeness)
+
+    others = [item for item in profile["columns"].items() if item[0] not in requested]
+    others.sort(key=score, reverse=True)
+    return requested + [name for name, _ in others]
+
+
+def _describe_column(name, column):
+    nulls = f"{column['null_ratio']:.0%} null"
+    if column["kind"] == "numeric":
+        stats = ", ".join(
+            f"{label} {_format_number(column[label])}"
+            for label in ("mean", "std", "min", "p25", "median", "p75", "max")
+        )
+        return f"- {name} ({column['dtype']}, {nulls}): {stats}"
+    top = ", ".join(f"{value} {share:.0%}" for value, share in column["top"])
+    return f"- {name} ({column['dtype']}, {nulls}, {column['distinct']} distinct): top {top}"
+
+
+def stratified_sample(df, columns, profile, rows=SAMPLE_ROWS, random_state=42):
+    """Picks sample rows covering the strata of the lowest-cardinality categorical column"""
+    if df.empty:
+        return df[columns]
+    pool = df.sample(n=min(len(df), 10000), random_state=random_state)
+    strata = [
+        name
+        for name in columns
+        if profile["columns"][name]["kind"] == "categorical"
+        and 1 < profile["columns"][name]["distinct"] <= rows
+    ]
+    if strata:
+        stratum = min(strata, key=lambda name: profile["columns"][name]["distinct"])
+        sample = pool.groupby(stratum, dropna=False, sort=False).head(1)
+        remainder = pool.drop(sample.index)
+        extra = max(rows - len(sample), 0)
+        sample = pd.concat([sample, remainder.head(extra)])
+    else:
+        sample = pool.head(rows)
+    return sample[columns]
+
+
+def build_insights_prompt(
+    df,
+    specific_columns=None,
+    question=None,
+    token_budget=DEFAULT_TOKEN_BUDGET,
+    sketch=None,
+    content_key=None,
+):
+    """Builds the insights prompt, keeping it within token_budget regardless of width.
+
+    With the column ``sketch`` of the full dataset, df may be a sample of it:
+    statistics come from the sketch and only the sample rows from df.
+    ``content_key`` lets the profile of df be reused (see profile_dataframe).
+    """
+    if sketch is not None:
+        profile = profile_from_sketch(sketch, df)
+    else:
+        profile = profile_dataframe(df, content_key)
+    ordered = rank_columns(profile, question, specific_columns)
+
+    if question:
+        instructions = f"""Based on this data, please answer the following question: {question}
+Provide a detailed analysis with key insights."""
+    else:
+        instructions = """Based on this data, please provide:
+1. A summary of the key patterns and trends
+2. Interesting insights or anomalies
+3. Suggestions for visualizations that would best represent this data
+4. Potential research questions that could be explored
+
+Format your response in markdown with clear sections."""
+
+    header = (
+        f"I have a dataset with {profile['rows']:,} rows and {len(ordered)} columns."
+        + (
+            f" Statistics are estimated from a {profile['sampled_rows']:,}-row sample."
+            if profile["sampled_rows"] < profile["rows"]
+            else ""
+        )
+    )
+    remaining = token_budget - estimate_tokens(header) - estimate_tokens(instructions)
+    sample_budget = int(remaining * SAMPLE_BUDGET_SHARE)
+    column_budget = remaining - sample_budget
+
+    column_lines, included = [], []
+    for name in ordered:
+        line = _describe_column(name, profile["columns"][name])
+        cost = estimate_tokens(line)
+        if cost > column_budget:
+            continue  # A long description; shorter ones further down may still fit
+        column_lines.append(line)
+        included.append(name)
+        column_budget -= cost
+    if len(included) < len(ordered):
+        column_lines.append(
+            f"- ... {len(ordered) - len(included)} columns omitted to fit the budget"
+        )
+
+    sample_text = ""
+    sample_columns = included[:SAMPLE_MAX_COLUMNS]
+    if sample_columns:
+        sample = stratified_sample(df, sample_columns, profile)
+        for rows in range(len(sample), 0, -1):
+            sample_text = sample.head(rows).to_csv(index=False)
+            if estimate_tokens(sample_text) <= sample_budget + column_budget:
+                break
+        else:
+            sample_text = ""
+
+    sections = [header, "Column statistics (most relevant first):", "\n".join(column_lines)]
+    if sample_text:
+        sections += ["Representative sample rows (CSV):", sample_text]
+    sections.append(instructions)
+    return "\n\n".join(sections)
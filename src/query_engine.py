@@ -0,0 +1,240 @@
+"""
+Embedded SQL over stored datasets
+Runs read-only DuckDB queries against the local Parquet copies and against
+Parquet snapshots exported from MongoDB (one per dataset version, streamed out
+chunk by chunk). Each referenced dataset becomes a view over its files, so
+joins, window functions and aggregates run vectorized on the columnar data
+without building pandas frames. Results come back as Arrow record batches.
+"""
+import io
+import json
+import os
+import shutil
+from pathlib import Path
+
+try:
+    import duckdb
+except ImportError:  # Optional: pip install duckdb
+    duckdb = None
+
+from src.atomic_io import TEMP_SUFFIX, file_lock, temp_path
+from src.config import get_setting
+
+SNAPSHOTS_DIR = Path.home() / ".plot_pyre" / "snapshots"
+SNAPSHOT_LOCK_DIR = SNAPSHOTS_DIR / ".locks"
+# Rows per Parquet part of a snapshot and per streamed Arrow batch
+SNAPSHOT_CHUNK_ROWS = 100000
+ARROW_BATCH_ROWS = 65536
+# Rows shown by the Query tab
+PREVIEW_ROWS = 1000
+DEFAULT_MEMORY_LIMIT = "2GB"
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+class QueryError(Exception):
+    """Raised for queries that cannot run (not a SELECT, unknown dataset, SQL errors)"""
+
+
+def query_engine_available():
+    return duckdb is not None
+
+
+def _quote(identifier):
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _literal(text):
+    return "'" + str(text).replace("'", "''") + "'"
+
+
+def referenced_tables(connection, sql):
+    """Table names a single SELECT statement reads (CTE names included)"""
+    statements = duckdb.extract_statements(sql)
+    if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+        raise QueryError("Only a single SELECT statement can be run.")
+    tree = json.loads(
+        connection.execute("SELECT json_serialize_sql(?)", [sql]).fetchone()[0]
+    )
+    if tree.get("error"):
+        raise QueryError(tree.get("error_message", "Could not parse the query."))
+
+    names, stack = set(), [tree]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            if node.get("type") == "BASE_TABLE" and not node.get("schema_name"):
+                names.add(node["table_name"])
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(node)
+    return names
+
+
+def _snapshot_dirs(dataset_name):
+    if not SNAPSHOTS_DIR.exists():
+        return []
+    return [
+        path
+        for path in SNAPSHOTS_DIR.iterdir()
+        if path.is_dir() and path.name.rsplit(".v", 1)[0] == dataset_name
+    ]
+
+
+def snapshot_path(dataset_name):
+    """Parquet parts of the dataset's current MongoDB version, exported on first use.
+
+    Older versions' snapshots are removed. Returns None for unknown datasets.
+    """
+    from src.db_utils import get_dataset_info
+    from src.lazy_dataset import LazyDataset
+
+    info = get_dataset_info(dataset_name)
+    if info is None:
+        return None
+    final = SNAPSHOTS_DIR / f"{dataset_name}.v{info.get('version', 0)}"
+    if final.exists():
+        return final
+
+    SNAPSHOTS_DIR.mkdir(parents=True, exist_ok=True)
+    with file_lock(SNAPSHOT_LOCK_DIR, dataset_name):
+        if final.exists():
+            return final  # Exported by another process meanwhile
+        # Under the lock, any temporary export of this dataset is a dead writer's
+        for stale in SNAPSHOTS_DIR.glob(f".*{TEMP_SUFFIX}"):
+            if stale.name[1:].rsplit(".v", 1)[0] == dataset_name:
+                shutil.rmtree(stale, ignore_errors=True)
+        temp = temp_path(final)
+        temp.mkdir()
+        try:
+            parts = 0
+            for chunk in LazyDataset.from_mongo(
+                dataset_name, chunk_rows=SNAPSHOT_CHUNK_ROWS
+            ).iter_chunks():
+                chunk.to_parquet(temp / f"part-{parts:05d}.parquet", index=False)
+                parts += 1
+            if not parts:
+                raise QueryError(f"Dataset '{dataset_name}' is empty.")
+            os.replace(temp, final)
+        except BaseException:
+            shutil.rmtree(temp, ignore_errors=True)
+            raise
+        for old in _snapshot_dirs(dataset_name):
+            if old != final:
+                shutil.rmtree(old, ignore_errors=True)
+    return final
+
+
+def dataset_files(dataset_name, prefer_local=True):
+    """Parquet glob to read a dataset from, or None if it does not exist.
+
+    The local copy is used while it may stand in for MongoDB (see
+    ``sync.local_copy_path``); otherwise a snapshot of the MongoDB version.
+    """
+    if prefer_local:
+        from src.sync import local_copy_path
+
+        path = local_copy_path(dataset_name)
+        if path is not None:
+            return path
+    path = snapshot_path(dataset_name)
+    return None if path is None else path / "*.parquet"
+
+
+def connect(sql, prefer_local=True):
+    """A DuckDB connection with a view per dataset sql references, locked down so
+    the query can read nothing but those files"""
+    if duckdb is None:
+        raise QueryError("The SQL engine needs DuckDB: pip install duckdb")
+    connection = duckdb.connect(":memory:")
+    try:
+        readable_files, readable_dirs = set(), set()
+        for name in sorted(referenced_tables(connection, sql)):
+            files = dataset_files(name, prefer_local)
+            if files is None:
+                continue  # A CTE, or an unknown table DuckDB will report
+            if Path(files).name == "*.parquet":
+                # A snapshot directory holds this dataset version's parts only
+                readable_dirs.add(str(Path(files).parent) + os.sep)
+            else:
+                # A local copy sits next to other datasets' files: allow just it
+                readable_files.add(str(files))
+            connection.execute(
+                f"CREATE VIEW {_quote(name)} AS SELECT * FROM "
+                f"read_parquet({_literal(files)}, union_by_name = true)"
+            )
+        memory_limit = get_setting("QUERY_MEMORY_LIMIT", DEFAULT_MEMORY_LIMIT)
+        connection.execute(f"SET memory_limit = {_literal(memory_limit)}")
+        # Spills of large joins and sorts land next to the snapshots
+        spill_dir = SNAPSHOTS_DIR / ".spill"
+        spill_dir.mkdir(parents=True, exist_ok=True)
+        connection.execute(f"SET temp_directory = {_literal(spill_dir)}")
+        for setting, paths in (
+            ("allowed_directories", readable_dirs),
+            ("allowed_paths", readable_files),
+        ):
+            connection.execute(
+                f"SET {setting} = ["
+                + ", ".join(_literal(path) for path in sorted(paths))
+                + "]"
+            )
+        connection.execute("SET enable_external_access = false")
+        connection.execute("SET lock_configuration = true")
+    except duckdb.Error as e:
+        connection.close()
+        raise QueryError(str(e)) from e
+    except BaseException:
+        connection.close()
+        raise
+    return connection
+
+
+def execute(sql, prefer_local=True, batch_rows=ARROW_BATCH_ROWS):
+    """Starts the query; returns (connection, pyarrow RecordBatchReader).
+
+    The caller closes the connection once the reader is drained.
+    """
+    connection = connect(sql, prefer_local)
+    try:
+        reader = connection.execute(sql).fetch_record_batch(batch_rows)
+    except duckdb.Error as e:
+        connection.close()
+        raise QueryError(str(e)) from e
+    return connection, reader
+
+
+def run_query(sql, max_rows=PREVIEW_ROWS, prefer_local=True):
+    """Returns (pyarrow Table of up to max_rows rows, truncated flag)"""
+    import pyarrow as pa
+
+    connection, reader = execute(sql, prefer_local)
+    try:
+        batches, rows = [], 0
+        for batch in reader:
+            if rows + batch.num_rows > max_rows:
+                batches.append(batch.slice(0, max_rows - rows))
+                return pa.Table.from_batches(batches, reader.schema), True
+            batches.append(batch)
+            rows += batch.num_rows
+        return pa.Table.from_batches(batches, reader.schema), False
+    except duckdb.Error as e:
+        raise QueryError(str(e)) from e
+    finally:
+        connection.close()
+
+
+def arrow_ipc_stream(connection, reader):
+    """Yields the reader's batches as an Arrow IPC stream, one chunk per batch"""
+    import pyarrow as pa
+
+    sink = io.BytesIO()
+    try:
+        with pa.ipc.new_stream(sink, reader.schema) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+                yield sink.getvalue()
+                sink.seek(0)
+                sink.truncate()
+        # End-of-stream marker (and the schema, for empty results)
+        yield sink.getvalue()
+    finally:
+        connection.close()
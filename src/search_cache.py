@@ -0,0 +1,178 @@
+"""
+Result cache for vector_search
+Repeated searches are answered from memory: results are keyed on the dataset,
+the normalized query text, k, filters and returned fields, expire after a
+TTL and are dropped when the dataset is stored again. Optionally, a new query
+whose embedding is within a cosine threshold of a cached one reuses its results.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from src.config import get_setting
+from src.metrics import record_cache
+
+DEFAULT_TTL_SECONDS = 300
+DEFAULT_MAX_ENTRIES = 1024
+# Cosine similarity at which two queries count as the same search; 0 disables
+DEFAULT_SIMILARITY = 0.0
+QUERY_EMBEDDING_CACHE_SIZE = 4096
+# How long a dataset's catalog version is trusted before it is read again;
+# stores in this process invalidate at once, other processes within this window
+VERSION_CHECK_SECONDS = 5.0
+
+
+def normalize_query(text):
+    """Case- and whitespace-insensitive form of a query"""
+    return " ".join(str(text).lower().split())
+
+
+def _canonical(value):
+    # Filters are dicts; key order must not change the cache key
+    return json.dumps(value, sort_keys=True, default=str) if value else None
+
+
+class SearchResultCache:
+    """Thread-safe LRU of search results with TTL and near-duplicate lookup"""
+
+    def __init__(self, ttl=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES, similarity=DEFAULT_SIMILARITY):
+        self.ttl = float(ttl)
+        self.max_entries = int(max_entries)
+        self.similarity = float(similarity)
+        self._entries = OrderedDict()
+        self._embeddings = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def dataset_version(self, dataset_name, load_version):
+        """Catalog version of a dataset, re-read via load_version at most every few seconds"""
+        now = time.monotonic()
+        with self._lock:
+            known = self._versions.get(dataset_name)
+        if known is not None and now - known[1] < VERSION_CHECK_SECONDS:
+            return known[0]
+        version = load_version(dataset_name)
+        with self._lock:
+            self._versions[dataset_name] = (version, now)
+        return version
+
+    @staticmethod
+    def search_key(dataset_name, **params):
+        """Everything but the query text that determines a search's results"""
+        return (dataset_name,) + tuple(
+            (name, _canonical(value) if isinstance(value, (dict, list)) else value)
+            for name, value in sorted(params.items())
+        )
+
+    def _live(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if now - entry["stored_at"] > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get(self, search_key, query):
+        """Exact hit for (search, normalized query); no embedding or database call"""
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._live((search_key, normalize_query(query)), time.monotonic())
+        record_cache("vector_search", entry is not None)
+        return entry["results"] if entry else None
+
+    def get_similar(self, search_key, query_vector):
+        """Results of a cached query whose embedding is within the cosine threshold"""
+        if self.ttl <= 0 or self.similarity <= 0:
+            return None
+        vector = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if not norm:
+            return None
+        vector = vector / norm
+        now = time.monotonic()
+        best, best_similarity = None, self.similarity
+        with self._lock:
+            for key in list(self._entries):
+                if key[0] != search_key:
+                    continue
+                entry = self._live(key, now)
+                if entry is None or entry["vector"] is None:
+                    continue
+                similarity = float(entry["vector"] @ vector)
+                if similarity >= best_similarity:
+                    best, best_similarity = entry, similarity
+        record_cache("vector_search_similar", best is not None)
+        return best["results"] if best else None
+
+    def put(self, search_key, query, results, query_vector=None):
+        if self.ttl <= 0:
+            return
+        vector = None
+        if query_vector is not None:
+            vector = np.asarray(query_vector, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            vector = vector / norm if norm else None
+        key = (search_key, normalize_query(query))
+        with self._lock:
+            self._entries[key] = {
+                "results": results,
+                "vector": vector,
+                "stored_at": time.monotonic(),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_embedding(self, embedding_key, query):
+        """Cached query embedding; embedding_key identifies the embedding space"""
+        key = (embedding_key, normalize_query(query))
+        with self._lock:
+            vector = self._embeddings.get(key)
+            if vector is not None:
+                self._embeddings.move_to_end(key)
+        record_cache("query_embedding", vector is not None)
+        return vector
+
+    def put_embedding(self, embedding_key, query, vector):
+        with self._lock:
+            self._embeddings[(embedding_key, normalize_query(query))] = vector
+            while len(self._embeddings) > QUERY_EMBEDDING_CACHE_SIZE:
+                self._embeddings.popitem(last=False)
+
+    def invalidate(self, dataset_name=None):
+        """Drops cached results for one dataset (or all of them)"""
+        with self._lock:
+            if dataset_name is None:
+                self._entries.clear()
+                self._embeddings.clear()
+                self._versions.clear()
+                return
+            self._versions.pop(dataset_name, None)
+            for key in [key for key in self._entries if key[0][0] == dataset_name]:
+                del self._entries[key]
+            for key in [key for key in self._embeddings if key[0][0] == dataset_name]:
+                del self._embeddings[key]
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_search_cache():
+    """Process-wide cache configured from SEARCH_CACHE_TTL, _MAX_ENTRIES and _SIMILARITY"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SearchResultCache(
+                    ttl=get_setting("SEARCH_CACHE_TTL", DEFAULT_TTL_SECONDS),
+                    max_entries=get_setting("SEARCH_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES),
+                    similarity=get_setting("SEARCH_CACHE_SIMILARITY", DEFAULT_SIMILARITY),
+                )
+    return _cache
@@ -0,0 +1,151 @@
+"""
+Local search primitives for Plot Pyre
+Keyword (BM25) scoring and exact cosine top-k used when Atlas Vector Search
+cannot serve a query
+"""
+import datetime
+import math
+import re
+from collections import Counter
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+# Operators a search filter may apply to a field; anything else is rejected
+FILTER_OPERATORS = frozenset({"$eq", "$ne", "$in", "$nin", "$gt", "$gte", "$lt", "$lte"})
+_FILTER_SCALARS = (str, int, float, bool, datetime.date, type(None))
+
+# Standard BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text) -> List[str]:
+    """Lowercases and splits text into word tokens"""
+    if not isinstance(text, str):
+        return []
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def validate_filters(filters) -> Optional[dict]:
+    """Checks a client-supplied search filter before it reaches MongoDB.
+
+    Only plain field names mapped to a scalar or to comparison operators
+    (``$eq``, ``$ne``, ``$in``, ``$nin``, ``$gt``, ``$gte``, ``$lt``, ``$lte``)
+    are accepted; anything else raises ValueError.
+    """
+    if filters is None:
+        return None
+    if not isinstance(filters, dict):
+        raise ValueError("filters must be a JSON object of field conditions.")
+    for field, condition in filters.items():
+        if not isinstance(field, str) or not field or field.startswith("$") or "\0" in field:
+            raise ValueError(f"Invalid filter field: {field!r}")
+        if not isinstance(condition, dict):
+            if not isinstance(condition, _FILTER_SCALARS):
+                raise ValueError(f"Filter on {field!r} must be a scalar or an operator object.")
+            continue
+        if not condition:
+            raise ValueError(f"Filter on {field!r} has no operators.")
+        for operator, value in condition.items():
+            if operator not in FILTER_OPERATORS:
+                raise ValueError(f"Unsupported filter operator on {field!r}: {operator!r}")
+            values = value if operator in ("$in", "$nin") else [value]
+            if operator in ("$in", "$nin") and not isinstance(value, list):
+                raise ValueError(f"{operator} on {field!r} needs a list of values.")
+            if not all(isinstance(item, _FILTER_SCALARS) for item in values):
+                raise ValueError(f"{operator} on {field!r} only accepts scalar values.")
+    return filters
+
+
+def keyword_filter(field: str, keyword: str) -> dict:
+    """Builds a MongoDB filter matching documents whose field contains any keyword term"""
+    terms = sorted(set(tokenize(keyword)))
+    if not terms:
+        return {}
+    return {
+        "$or": [
+            {field: {"$regex": re.escape(term), "$options": "i"}} for term in terms
+        ]
+    }
+
+
+def bm25_scores(texts: Sequence[str], query: str) -> np.ndarray:
+    """Scores each text against the query with Okapi BM25 over the given corpus"""
+    query_terms = set(tokenize(query))
+    scores = np.zeros(len(texts), dtype=np.float64)
+    if not query_terms or not len(texts):
+        return scores
+
+    documents = [Counter(tokenize(text)) for text in texts]
+    lengths = np.array([sum(doc.values()) for doc in documents], dtype=np.float64)
+    average_length = lengths.mean() or 1.0
+    norms = BM25_K1 * (1 - BM25_B + BM25_B * lengths / average_length)
+
+    for term in query_terms:
+        frequencies = np.array([doc.get(term, 0) for doc in documents], dtype=np.float64)
+        containing = np.count_nonzero(frequencies)
+        if not containing:
+            continue
+        idf = math.log(1 + (len(texts) - containing + 0.5) / (containing + 0.5))
+        scores += idf * frequencies * (BM25_K1 + 1) / (frequencies + norms)
+    return scores
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Returns the matrix with every row scaled to unit length (zero rows stay zero)"""
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def cosine_top_k(matrix: np.ndarray, query_vector, k: int):
+    """Returns (row indices, cosine similarities) of the k rows closest to the query"""
+    if len(matrix) == 0 or k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    query = normalize_rows(np.asarray(query_vector, dtype=np.float32)[None, :])[0]
+    similarities = normalize_rows(matrix) @ query
+
+    k = min(k, len(similarities))
+    # argpartition is O(n); only the k winners get sorted
+    top = np.argpartition(-similarities, k - 1)[:k]
+    top = top[np.argsort(-similarities[top])]
+    return top, similarities[top]
+
+
+def cosine_top_k_batch(
+    matrix: np.ndarray, query_matrix: np.ndarray, k: int, block_size: int = 256
+):
+    """Batched cosine_top_k: one matrix-matrix product per block of queries.
+
+    Returns (indices, similarities), each shaped (num_queries, k).
+    """
+    num_queries = len(query_matrix)
+    k = min(k, len(matrix))
+    if num_queries == 0 or k <= 0:
+        empty = np.empty((num_queries, 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+
+    rows = normalize_rows(np.asarray(matrix, dtype=np.float32))
+    queries = normalize_rows(np.asarray(query_matrix, dtype=np.float32))
+    indices = np.empty((num_queries, k), dtype=np.int64)
+    similarities = np.empty((num_queries, k), dtype=np.float32)
+
+    # Blocking bounds the (queries x rows) similarity matrix held in memory
+    for start in range(0, num_queries, block_size):
+        block = queries[start : start + block_size] @ rows.T
+        top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(block, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        indices[start : start + len(block)] = np.take_along_axis(top, order, axis=1)
+        similarities[start : start + len(block)] = np.take_along_axis(
+            top_scores, order, axis=1
+        )
+    return indices, similarities
+
+
+def cosine_to_score(similarities: np.ndarray) -> np.ndarray:
+    """Maps cosine similarity to Atlas' vectorSearchScore scale of [0, 1]"""
+    return (1.0 + similarities) / 2.0
@@ -0,0 +1,373 @@
+"""
+Streaming column sketches for Plot Pyre
+One pass over a dataset's chunks builds, per column, mergeable summaries:
+HyperLogLog distinct counts, t-digest quantiles, count-min heavy hitters and
+exact count/null/min/max/mean/std. Sketches are small, stored with the dataset
+and answer summary queries in constant time however large the data is.
+"""
+import numpy as np
+import pandas as pd
+
+# HyperLogLog precision: 2**14 registers, ~0.8% standard error
+HLL_PRECISION = 14
+# t-digest compression; roughly TDIGEST_DELTA / 2 centroids are kept
+TDIGEST_DELTA = 300
+# Count-min sketch shape: error <= e / width of the total count, w.p. 1 - e**-depth
+CMS_DEPTH = 4
+CMS_WIDTH = 2048
+TOP_K = 20
+
+_HASH_BITS = 64 - HLL_PRECISION
+
+
+def hash_values(values):
+    """Stable 64-bit hashes of array values (identical across processes)"""
+    values = np.asarray(values)
+    if values.dtype.kind in "biufcmM":
+        return pd.util.hash_array(values, categorize=False)
+    # Object/strings hash via their text form so appended chunks agree
+    return pd.util.hash_array(values.astype(str).astype(object), categorize=False)
+
+
+class HyperLogLog:
+    """Distinct-count sketch; merging takes the register-wise maximum"""
+
+    def __init__(self, registers=None):
+        self.registers = (
+            np.zeros(2**HLL_PRECISION, dtype=np.uint8)
+            if registers is None
+            else np.asarray(registers, dtype=np.uint8)
+        )
+
+    def update_hashes(self, hashes):
+        if not len(hashes):
+            return
+        index = (hashes >> np.uint64(_HASH_BITS)).astype(np.int64)
+        remainder = hashes & np.uint64((1 << _HASH_BITS) - 1)
+        # Position of the leftmost 1-bit in the remaining bits (exact: < 2**53)
+        bit_length = np.frexp(remainder.astype(np.float64))[1]
+        rank = (_HASH_BITS - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Small-range correction (linear counting)
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+
+class TDigest:
+    """Quantile sketch of (mean, weight) centroids, merged and recompressed per chunk"""
+
+    def __init__(self, means=(), weights=(), minimum=np.inf, maximum=-np.inf):
+        self.means = np.asarray(means, dtype=np.float64)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.minimum = float(minimum)
+        self.maximum = float(maximum)
+
+    def _compress(self, means, weights):
+        order = np.argsort(means, kind="mergesort")
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        midpoints = (np.cumsum(weights) - weights / 2) / total
+        # k1 scale function: centroids stay small near the tails, large in the middle
+        k = TDIGEST_DELTA / (2 * np.pi) * np.arcsin(2 * midpoints - 1)
+        bins = np.floor(k - k[0]).astype(np.int64)
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(bins)) + 1))
+        merged_weights = np.add.reduceat(weights, starts)
+        merged_means = np.add.reduceat(means * weights, starts) / merged_weights
+        return merged_means, merged_weights
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return
+        self.minimum = min(self.minimum, float(values.min()))
+        self.maximum = max(self.maximum, float(values.max()))
+        self.means, self.weights = self._compress(
+            np.concatenate((self.means, values)),
+            np.concatenate((self.weights, np.ones(len(values)))),
+        )
+
+    def merge(self, other):
+        if len(other.means):
+            self.minimum = min(self.minimum, other.minimum)
+            self.maximum = max(self.maximum, other.maximum)
+            self.means, self.weights = self._compress(
+                np.concatenate((self.means, other.means)),
+                np.concatenate((self.weights, other.weights)),
+            )
+        return self
+
+    def quantile(self, q):
+        if not len(self.means):
+            return np.nan
+        total = self.weights.sum()
+        midpoints = np.cumsum(self.weights) - self.weights / 2
+        return float(
+            np.interp(
+                q * total,
+                np.concatenate(([0.0], midpoints, [total])),
+                np.concatenate(([self.minimum], self.means, [self.maximum])),
+            )
+        )
+
+
+class CountMinTopK:
+    """Count-min sketch plus the TOP_K heaviest values seen so far"""
+
+    def __init__(self, table=None, top=None):
+        self.table = (
+            np.zeros((CMS_DEPTH, CMS_WIDTH), dtype=np.int64)
+            if table is None
+            else np.asarray(table, dtype=np.int64).reshape(CMS_DEPTH, CMS_WIDTH)
+        )
+        # value (as text) -> estimated count
+        self.top = dict(top or {})
+
+    @staticmethod
+    def _buckets(hashes):
+        # Kirsch-Mitzenmacher double hashing: row i uses h1 + i * h2
+        low = (hashes & np.uint64(0xFFFFFFFF)).astype(np.int64)
+        high = (hashes >> np.uint64(32)).astype(np.int64)
+        return [(low + row * high) % CMS_WIDTH for row in range(CMS_DEPTH)]
+
+    def estimate(self, values):
+        buckets = self._buckets(hash_values(np.asarray(values, dtype=object)))
+        return np.min(
+            [self.table[row, bucket] for row, bucket in enumerate(buckets)], axis=0
+        )
+
+    def update_counts(self, counts):
+        """Adds a value -> count Series (e.g. one chunk's value_counts)"""
+        if counts.empty:
+            return
+        values = counts.index.astype(str).to_numpy(dtype=object)
+        for row, bucket in enumerate(self._buckets(hash_values(values))):
+            np.add.at(self.table[row], bucket, counts.to_numpy(dtype=np.int64))
+        self._refresh_top(list(values[: TOP_K * 2]))
+
+    def _refresh_top(self, extra_candidates):
+        candidates = list(dict.fromkeys(list(self.top) + extra_candidates))
+        if not candidates:
+            return
+        estimates = self.estimate(candidates)
+        order = np.argsort(-estimates, kind="mergesort")[:TOP_K]
+        self.top = {candidates[i]: int(estimates[i]) for i in order}
+
+    def merge(self, other):
+        self.table += other.table
+        self._refresh_top(list(other.top))
+        return self
+
+
+class ColumnSketch:
+    """All sketches for one column; numeric columns get a t-digest, others top-k"""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.count = 0
+        self.nulls = 0
+        self.total = 0.0
+        self.total_squares = 0.0
+        self.hll = HyperLogLog()
+        self.tdigest = TDigest() if kind == "numeric" else None
+        self.heavy_hitters = CountMinTopK() if kind == "categorical" else None
+
+    @staticmethod
+    def kind_of(series):
+        if pd.api.types.is_bool_dtype(series):
+            return "categorical"
+        if pd.api.types.is_numeric_dtype(series):
+            return "numeric"
+        return "categorical"
+
+    def update(self, series):
+        non_null = series.dropna()
+        self.count += len(non_null)
+        self.nulls += len(series) - len(non_null)
+        if not len(non_null):
+            return
+        if self.kind == "numeric":
+            values = non_null.to_numpy(dtype=np.float64)
+            self.total += float(values.sum())
+            self.total_squares += float(np.square(values).sum())
+            self.tdigest.update(values)
+            self.hll.update_hashes(hash_values(non_null.to_numpy()))
+        else:
+            text = non_null.astype(str)
+            counts = text.value_counts()
+            self.hll.update_hashes(hash_values(counts.index.to_numpy(dtype=object)))
+            self.heavy_hitters.update_counts(counts)
+
+    def as_categorical(self):
+        """This column summarized as text from now on, keeping its counts.
+
+        Numeric moments and quantiles have no text equivalent, and values seen
+        so far cannot be added to the top values after the fact.
+        """
+        if self.kind == "categorical":
+            return self
+        sketch = ColumnSketch("categorical")
+        sketch.count = self.count
+        sketch.nulls = self.nulls
+        sketch.hll = self.hll
+        return sketch
+
+    def merge(self, other):
+        self.count += other.count
+        self.nulls += other.nulls
+        self.total += other.total
+        self.total_squares += other.total_squares
+        self.hll.merge(other.hll)
+        if self.tdigest is not None and other.tdigest is not None:
+            self.tdigest.merge(other.tdigest)
+        if self.heavy_hitters is not None and other.heavy_hitters is not None:
+            self.heavy_hitters.merge(other.heavy_hitters)
+        return self
+
+    def summary(self):
+        row = {
+            "kind": self.kind,
+            "count": self.count,
+            "nulls": self.nulls,
+            "distinct": min(self.hll.estimate(), self.count),
+        }
+        if self.kind == "numeric" and self.count:
+            mean = self.total / self.count
+            variance = max(self.total_squares / self.count - mean * mean, 0.0)
+            row.update(
+                mean=mean,
+                std=float(np.sqrt(variance * self.count / max(self.count - 1, 1))),
+                min=self.tdigest.minimum,
+                p25=self.tdigest.quantile(0.25),
+                p50=self.tdigest.quantile(0.5),
+                p75=self.tdigest.quantile(0.75),
+                max=self.tdigest.maximum,
+            )
+        elif self.heavy_hitters is not None:
+            row["top"] = list(self.heavy_hitters.top.items())
+        return row
+
+    def to_document(self):
+        document = {
+            "kind": self.kind,
+            "count": self.count,
+            "nulls": self.nulls,
+            "total": self.total,
+            "total_squares": self.total_squares,
+            "hll": self.hll.registers.tobytes(),
+        }
+        if self.tdigest is not None:
+            document["tdigest"] = {
+                "means": self.tdigest.means.tolist(),
+                "weights": self.tdigest.weights.tolist(),
+                "min": self.tdigest.minimum,
+                "max": self.tdigest.maximum,
+            }
+        if self.heavy_hitters is not None:
+            document["cms"] = self.heavy_hitters.table.tobytes()
+            # Values are text, which may contain "." or "$"; store as pairs
+            document["top"] = [[value, count] for value, count in self.heavy_hitters.top.items()]
+        return document
+
+    @classmethod
+    def from_document(cls, document):
+        sketch = cls(document["kind"])
+        sketch.count = document["count"]
+        sketch.nulls = document["nulls"]
+        sketch.total = document["total"]
+        sketch.total_squares = document["total_squares"]
+        sketch.hll = HyperLogLog(np.frombuffer(document["hll"], dtype=np.uint8).copy())
+        if "tdigest" in document:
+            digest = document["tdigest"]
+            sketch.tdigest = TDigest(
+                digest["means"], digest["weights"], digest["min"], digest["max"]
+            )
+        if "cms" in document:
+            sketch.heavy_hitters = CountMinTopK(
+                np.frombuffer(document["cms"], dtype=np.int64).copy(),
+                {value: count for value, count in document["top"]},
+            )
+        return sketch
+
+
+class DatasetSketch:
+    """Column sketches for a whole dataset, built chunk by chunk"""
+
+    def __init__(self, columns=None, rows=0):
+        self.columns = dict(columns or {})
+        self.rows = rows
+
+    def update(self, chunk, skip_columns=()):
+        self.rows += len(chunk)
+        for name in chunk.columns:
+            if name in skip_columns:
+                continue
+            column = str(name)
+            series = chunk[name]
+            if column not in self.columns:
+                self.columns[column] = ColumnSketch(ColumnSketch.kind_of(series))
+            sketch = self.columns[column]
+            if sketch.kind == "numeric" and ColumnSketch.kind_of(series) != "numeric":
+                self.columns[column] = sketch = sketch.as_categorical()
+            sketch.update(series)
+        return self
+
+    def merge(self, other):
+        self.rows += other.rows
+        for column, sketch in other.columns.items():
+            mine = self.columns.get(column)
+            if mine is None:
+                self.columns[column] = sketch
+            elif mine.kind != sketch.kind:
+                self.columns[column] = mine.as_categorical().merge(sketch.as_categorical())
+            else:
+                mine.merge(sketch)
+        return self
+
+    def summary(self):
+        """Per-column statistics as a DataFrame (one row per column)"""
+        return pd.DataFrame(
+            [{"column": column, **sketch.summary()} for column, sketch in self.columns.items()]
+        ).set_index("column") if self.columns else pd.DataFrame()
+
+    def top_values(self, column, k=TOP_K):
+        """Heaviest values of a categorical column as (value, estimated count) pairs"""
+        sketch = self.columns.get(str(column))
+        if sketch is None or sketch.heavy_hitters is None:
+            return []
+        return list(sketch.heavy_hitters.top.items())[:k]
+
+    def distinct(self, column):
+        sketch = self.columns.get(str(column))
+        return None if sketch is None else min(sketch.hll.estimate(), sketch.count)
+
+    def to_document(self):
+        # Column names may contain "." or "$"; store as a list of entries
+        return {
+            "rows": self.rows,
+            "columns": [
+                {"name": column, **sketch.to_document()}
+                for column, sketch in self.columns.items()
+            ],
+        }
+
+    @classmethod
+    def from_document(cls, document):
+        return cls(
+            {
+                entry["name"]: ColumnSketch.from_document(entry)
+                for entry in document.get("columns", [])
+            },
+            document.get("rows", 0),
+        )
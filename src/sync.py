@@ -0,0 +1,320 @@
+"""
+Offline-first sync between OfflineStorage and MongoDB
+Reads come from the local Parquet copy while its content hash matches the
+catalog's, and from MongoDB (refreshing the copy) otherwise. Writes land
+locally first and are queued in an outbox that is replayed to MongoDB with
+``store_dataset(mode="sync")``, which transfers only changed row blocks and
+resumes an interrupted replay where it stopped.
+"""
+import json
+import os
+import threading
+import time
+
+from src.atomic_io import atomic_write_text, file_lock
+from src.db_utils import get_dataset, get_dataset_info, store_dataset
+from src.offline_utils import DATASETS_DIR, LOCAL_STORAGE_DIR, OfflineStorage
+
+OUTBOX_DIR = LOCAL_STORAGE_DIR / "outbox"
+# Writes that kept failing for reasons other than connectivity are parked here
+FAILED_DIR = OUTBOX_DIR / "failed"
+# After a connection failure, MongoDB is not tried again for this long
+OFFLINE_RETRY_SECONDS = 30
+SYNC_INTERVAL_SECONDS = 30
+# Failed replays (other than connection failures) before a write is parked;
+# the wait before each retry doubles from SYNC_INTERVAL_SECONDS
+MAX_SYNC_ATTEMPTS = 5
+
+_state = {"offline_until": 0.0, "last_error": None}
+_background_lock = threading.Lock()
+_background = None
+
+
+def _connection_errors():
+    try:
+        from pymongo.errors import ConnectionFailure
+
+        return (ConnectionFailure, OSError)
+    except ImportError:
+        return (OSError,)
+
+
+def is_offline():
+    """True while MongoDB is in its back-off window after a connection failure"""
+    return time.monotonic() < _state["offline_until"]
+
+
+def _mark_offline(error):
+    _state["offline_until"] = time.monotonic() + OFFLINE_RETRY_SECONDS
+    _state["last_error"] = str(error)
+
+
+def _outbox_entries():
+    if not OUTBOX_DIR.exists():
+        return []
+    return sorted(OUTBOX_DIR.glob("*.json"))
+
+
+def _read_entry(path):
+    """Parses an outbox entry; raises ValueError if it is not one"""
+    entry = json.loads(path.read_text())
+    if not isinstance(entry, dict) or not isinstance(entry.get("dataset"), str):
+        raise ValueError("no dataset name")
+    return entry
+
+
+def pending_datasets():
+    """Names of datasets with local writes not yet replayed to MongoDB"""
+    names = []
+    for path in _outbox_entries():
+        try:
+            names.append(_read_entry(path)["dataset"])
+        except (OSError, ValueError):
+            continue
+    return sorted(set(names))
+
+
+def failed_datasets():
+    """{dataset: last error} of writes parked after MAX_SYNC_ATTEMPTS failures"""
+    failed = {}
+    if FAILED_DIR.exists():
+        for path in sorted(FAILED_DIR.glob("*.json")):
+            try:
+                entry = _read_entry(path)
+            except (OSError, ValueError):
+                continue
+            failed[entry["dataset"]] = entry.get("last_error")
+    return failed
+
+
+def _clear_failed(dataset_name):
+    if not FAILED_DIR.exists():
+        return
+    for path in FAILED_DIR.glob("*.json"):
+        try:
+            if _read_entry(path)["dataset"] == dataset_name:
+                path.unlink(missing_ok=True)
+        except (OSError, ValueError):
+            continue
+
+
+def _record_failure(path, entry, error):
+    """Counts a failed replay; returns True if the write was parked in FAILED_DIR"""
+    entry["attempts"] = entry.get("attempts", 0) + 1
+    entry["last_error"] = str(error)
+    if entry["attempts"] >= MAX_SYNC_ATTEMPTS:
+        FAILED_DIR.mkdir(parents=True, exist_ok=True)
+        atomic_write_text(FAILED_DIR / path.name, json.dumps(entry))
+        path.unlink(missing_ok=True)
+        return True
+    entry["retry_at"] = time.time() + SYNC_INTERVAL_SECONDS * 2 ** (entry["attempts"] - 1)
+    atomic_write_text(path, json.dumps(entry))
+    return False
+
+
+def _park_unreadable(path, error):
+    """Moves an outbox entry that cannot be parsed to FAILED_DIR"""
+    print(f"Parking unreadable sync entry '{path.name}': {error}")
+    FAILED_DIR.mkdir(parents=True, exist_ok=True)
+    os.replace(path, FAILED_DIR / path.name)
+
+
+def _local_copy(dataset_name):
+    df = OfflineStorage.load_local_dataset(dataset_name)
+    return df, OfflineStorage.get_dataset_metadata(dataset_name) or {}
+
+
+def local_copy_path(dataset_name):
+    """Path of the dataset's local Parquet copy if it may be read in place of
+    MongoDB (current, unsynced, local-only or MongoDB unreachable), else None"""
+    path = DATASETS_DIR / f"{dataset_name}.parquet"
+    if not path.exists():
+        return None
+    metadata = OfflineStorage.get_dataset_metadata(dataset_name) or {}
+    if metadata.get("pending_sync") or is_offline():
+        return path
+    try:
+        info = get_dataset_info(dataset_name)
+    except _connection_errors() as e:
+        _mark_offline(e)
+        return path
+    if info is None or (
+        info.get("content_hash") and metadata.get("content_hash") == info["content_hash"]
+    ):
+        return path
+    return None
+
+
+def load_dataset(dataset_name):
+    """Returns (DataFrame, source) with source "local", "remote" or "local (offline)".
+
+    Embeddings stay in MongoDB for search and are not part of the result.
+    """
+    metadata = OfflineStorage.get_dataset_metadata(dataset_name) or {}
+    if metadata.get("pending_sync") or is_offline():
+        df, _ = _local_copy(dataset_name)
+        if df is not None:
+            return df, "local" if metadata.get("pending_sync") else "local (offline)"
+    try:
+        info = get_dataset_info(dataset_name) or {}
+        if info.get("content_hash") and metadata.get("content_hash") == info["content_hash"]:
+            df, _ = _local_copy(dataset_name)
+            if df is not None:
+                return df, "local"
+        df = get_dataset(dataset_name).drop(columns=["embedding"], errors="ignore")
+    except _connection_errors() as e:
+        _mark_offline(e)
+        df, _ = _local_copy(dataset_name)
+        if df is None:
+            raise
+        return df, "local (offline)"
+
+    OfflineStorage.save_dataset_locally(
+        dataset_name,
+        df,
+        metadata={
+            "content_hash": info.get("content_hash"),
+            "version": info.get("version"),
+            "pending_sync": False,
+        },
+    )
+    return df, "remote"
+
+
+def save_dataset(dataset_name, df, **store_kwargs):
+    """Saves locally, queues the write for MongoDB and tries to replay it right away.
+
+    ``store_kwargs`` are passed to ``store_dataset`` (text columns, embedding
+    provider, ...) and must be JSON serializable. Returns the ``flush`` result.
+    """
+    local_df = df.drop(columns=["embedding"], errors="ignore")
+    saved = OfflineStorage.save_dataset_locally(
+        dataset_name, local_df, metadata={"content_hash": None, "pending_sync": True}
+    )
+    if saved is None:
+        # No local copy to replay from; write through instead
+        written = store_dataset(dataset_name, df, **store_kwargs)
+        return {
+            "synced": {dataset_name: written},
+            "errors": {},
+            "pending": pending_datasets(),
+            "offline": False,
+        }
+    OUTBOX_DIR.mkdir(parents=True, exist_ok=True)
+    entry = {
+        "dataset": dataset_name,
+        "store_kwargs": store_kwargs,
+        "queued_at": time.time(),
+        "attempts": 0,
+    }
+    # Nanosecond names keep replay in write order
+    path = OUTBOX_DIR / f"{time.time_ns()}.json"
+    atomic_write_text(path, json.dumps(entry))
+    return flush()
+
+
+def flush():
+    """Replays queued writes to MongoDB, oldest first.
+
+    Only the newest write of each dataset is replayed (the local copy already
+    holds it). Stops at the first connection failure and leaves the rest
+    queued. Other failures are retried with exponential back-off and parked
+    after MAX_SYNC_ATTEMPTS (see ``failed_datasets``). Returns ``{"synced":
+    {name: rows_written}, "errors": {name: error}, "pending": [...], "offline": bool}``.
+    """
+    synced, errors = {}, {}
+    # Serializes replays across threads and processes (app, API, background sync)
+    with file_lock(OUTBOX_DIR, "replay"):
+        latest = {}
+        for path in _outbox_entries():
+            try:
+                entry = _read_entry(path)
+            except OSError:
+                continue
+            except ValueError as e:
+                _park_unreadable(path, e)
+                continue
+            superseded = latest.get(entry["dataset"])
+            if superseded is not None:
+                superseded[0].unlink(missing_ok=True)
+            latest[entry["dataset"]] = (path, entry)
+
+        for dataset_name, (path, entry) in sorted(
+            latest.items(), key=lambda item: item[1][0].name
+        ):
+            if is_offline():
+                break
+            if entry.get("retry_at", 0) > time.time():
+                errors[dataset_name] = entry.get("last_error")
+                continue
+            try:
+                # Also runs on the background thread, where Streamlit cannot show errors
+                df = OfflineStorage.read_local_dataset(dataset_name)
+            except Exception as e:
+                print(f"Error reading local copy of '{dataset_name}': {e}")
+                errors[dataset_name] = str(e)
+                _record_failure(path, entry, e)
+                continue
+            if df is None:
+                path.unlink(missing_ok=True)
+                continue
+            try:
+                written = store_dataset(
+                    dataset_name, df, mode="sync", **entry.get("store_kwargs", {})
+                )
+                info = get_dataset_info(dataset_name) or {}
+            except _connection_errors() as e:
+                _mark_offline(e)
+                entry["last_error"] = str(e)
+                atomic_write_text(path, json.dumps(entry))
+                break
+            except Exception as e:
+                print(f"Error syncing dataset '{dataset_name}': {e}")
+                errors[dataset_name] = str(e)
+                if _record_failure(path, entry, e):
+                    OfflineStorage.update_dataset_metadata(
+                        dataset_name, {"sync_error": str(e)}
+                    )
+                continue
+            path.unlink(missing_ok=True)
+            _clear_failed(dataset_name)
+            synced[dataset_name] = written
+            if dataset_name not in pending_datasets():
+                # A save queued meanwhile keeps the local copy marked as unsynced
+                OfflineStorage.update_dataset_metadata(
+                    dataset_name,
+                    {
+                        "content_hash": info.get("content_hash"),
+                        "version": info.get("version"),
+                        "pending_sync": False,
+                        "sync_error": None,
+                    },
+                )
+    return {
+        "synced": synced,
+        "errors": errors,
+        "pending": pending_datasets(),
+        "offline": is_offline(),
+    }
+
+
+def _sync_loop(interval):
+    while True:
+        time.sleep(interval)
+        if _outbox_entries() and not is_offline():
+            try:
+                flush()
+            except Exception as e:
+                print(f"Error in background sync: {e}")
+
+
+def start_background_sync(interval=SYNC_INTERVAL_SECONDS):
+    """Starts (once per process) a daemon thread that replays the outbox when online"""
+    global _background
+    with _background_lock:
+        if _background is None:
+            _background = threading.Thread(
+                target=_sync_loop, args=(interval,), name="plot-pyre-sync", daemon=True
+            )
+            _background.start()
+    return _background
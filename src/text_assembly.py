@@ -0,0 +1,96 @@
+"""
+Vectorized text assembly for embeddings
+Builds the text to embed from one or more columns without per-row Python calls
+"""
+from string import Formatter
+from typing import List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# Input limit of models/text-embedding-004
+EMBEDDING_TOKEN_LIMIT = 2048
+# Conservative chars-per-token ratio for English text; avoids calling a tokenizer per row
+CHARS_PER_TOKEN = 4
+
+
+def parse_template(template: str) -> List[Tuple[str, Optional[str]]]:
+    """Splits a template like "{title}: {body}" into (literal, column) pieces"""
+    pieces = []
+    for literal, field_name, _, _ in Formatter().parse(template):
+        pieces.append((literal, field_name))
+    return pieces
+
+
+def _template_pieces(columns, template, sep):
+    if template:
+        return parse_template(template)
+    pieces = []
+    for i, column in enumerate(columns):
+        pieces.append((sep if i else "", column))
+    return pieces
+
+
+def template_columns(
+    columns: Optional[Sequence[str]] = None, template: Optional[str] = None
+) -> List[str]:
+    """Returns the columns referenced by a column list or template"""
+    if template:
+        return [field for _, field in parse_template(template) if field]
+    return list(columns or [])
+
+
+def _column_as_text(df, column):
+    return df[column].fillna("").astype(str)
+
+
+def build_text_series(
+    df: pd.DataFrame,
+    columns: Optional[Sequence[str]] = None,
+    template: Optional[str] = None,
+    sep: str = " ",
+    max_tokens: Optional[int] = EMBEDDING_TOKEN_LIMIT,
+) -> pd.Series:
+    """Concatenates columns (or fills a template) into one text per row, vectorized"""
+    pieces = _template_pieces(columns, template, sep)
+    missing = [field for _, field in pieces if field and field not in df.columns]
+    if missing:
+        raise KeyError(f"Columns not found for embedding text: {missing}")
+    max_chars = max_tokens * CHARS_PER_TOKEN if max_tokens else None
+
+    if HAS_PYARROW:
+        # Arrow joins whole arrays in one kernel call; literals broadcast as scalars
+        parts = []
+        for literal, field in pieces:
+            if literal:
+                parts.append(literal)
+            if field:
+                parts.append(pa.array(_column_as_text(df, field), type=pa.string()))
+        if not parts:
+            return pd.Series([""] * len(df), index=df.index, dtype=object)
+        joined = pc.binary_join_element_wise(*parts, "")
+        if not isinstance(joined, pa.Array):
+            joined = pa.array([joined.as_py()] * len(df), type=pa.string())
+        if max_chars:
+            joined = pc.utf8_slice_codeunits(joined, 0, max_chars)
+        text = joined.to_pandas()
+        text.index = df.index
+        return text
+
+    text = pd.Series("", index=df.index, dtype=object)
+    for literal, field in pieces:
+        if literal:
+            text = text + literal
+        if field:
+            text = text + _column_as_text(df, field)
+    if max_chars:
+        text = text.str.slice(0, max_chars)
+    return text
+
@@ -0,0 +1,96 @@
+"""
+Compact embedding encoding for MongoDB
+Stores embeddings as BSON binary vectors and decodes them into NumPy matrices
+"""
+from typing import Iterable, Optional
+
+import numpy as np
+from bson.binary import Binary, BinaryVectorDtype
+
+# BSON binary subtype for vectors (understood by Atlas Vector Search)
+VECTOR_SUBTYPE = 9
+
+# "array": legacy list of doubles (~9KB per 768-d vector)
+# "float32": binary float32 vector (~3KB, lossless for model output)
+# "int8": binary int8 vector scaled per row (~0.8KB, keeps direction for cosine search)
+EMBEDDING_FORMATS = ("array", "float32", "int8")
+DEFAULT_EMBEDDING_FORMAT = "float32"
+
+_FLOAT32_HEADER = BinaryVectorDtype.FLOAT32.value + b"\x00"
+_INT8_HEADER = BinaryVectorDtype.INT8.value + b"\x00"
+
+
+def quantize_int8(matrix: np.ndarray) -> np.ndarray:
+    """Scales each row to [-127, 127] and rounds to int8"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    scale = np.abs(matrix).max(axis=1, keepdims=True) / 127.0
+    scale[scale == 0] = 1.0
+    return np.clip(np.rint(matrix / scale), -127, 127).astype(np.int8)
+
+
+def encode_vectors(vectors, embedding_format: str = DEFAULT_EMBEDDING_FORMAT):
+    """Encodes a batch of embeddings (list of lists or 2-D array) for storage"""
+    if embedding_format not in EMBEDDING_FORMATS:
+        raise ValueError(
+            f"Unknown embedding format '{embedding_format}'. Use one of {EMBEDDING_FORMATS}."
+        )
+    if embedding_format == "array":
+        return [list(map(float, vector)) for vector in vectors]
+
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim != 2 or len(matrix) == 0:
+        return []
+    if embedding_format == "int8":
+        header, rows = _INT8_HEADER, quantize_int8(matrix)
+    else:
+        header, rows = _FLOAT32_HEADER, matrix.astype("<f4", copy=False)
+    return [Binary(header + row.tobytes(), VECTOR_SUBTYPE) for row in rows]
+
+
+def _binary_dtype(value):
+    header = bytes(value[:1])
+    if header == BinaryVectorDtype.FLOAT32.value:
+        return np.dtype("<f4")
+    if header == BinaryVectorDtype.INT8.value:
+        return np.dtype(np.int8)
+    raise ValueError("Packed-bit vectors are not supported for embeddings")
+
+
+def decode_vector(value) -> np.ndarray:
+    """Decodes one stored embedding (binary vector or list) into a float32 array"""
+    if isinstance(value, (bytes, bytearray)):
+        dtype = _binary_dtype(value)
+        vector = np.frombuffer(value, dtype=dtype, offset=2).astype(np.float32)
+        return vector / 127.0 if dtype == np.int8 else vector
+    return np.asarray(value, dtype=np.float32)
+
+
+def decode_vectors(values: Iterable, dimension: Optional[int] = None) -> np.ndarray:
+    """Decodes stored embeddings into one contiguous (n, dimension) float32 matrix"""
+    values = list(values)
+    if not values:
+        return np.empty((0, dimension or 0), dtype=np.float32)
+
+    first = values[0]
+    if isinstance(first, (bytes, bytearray)) and all(
+        isinstance(v, (bytes, bytearray)) and v[:1] == first[:1] for v in values
+    ):
+        # Same-typed binary vectors: one join + frombuffer instead of per-row parsing
+        dtype = _binary_dtype(first)
+        raw = b"".join(bytes(v)[2:] for v in values)
+        matrix = np.frombuffer(raw, dtype=dtype).reshape(len(values), -1)
+        matrix = matrix.astype(np.float32)
+        return matrix / 127.0 if dtype == np.int8 else matrix
+
+    if dimension is None:
+        first_valid = next(
+            (v for v in values if isinstance(v, (bytes, bytearray, list, tuple, np.ndarray))),
+            None,
+        )
+        dimension = 0 if first_valid is None else len(decode_vector(first_valid))
+    matrix = np.zeros((len(values), dimension), dtype=np.float32)
+    for i, value in enumerate(values):
+        # Rows without an embedding (None/NaN) stay zero vectors
+        if isinstance(value, (bytes, bytearray, list, tuple, np.ndarray)):
+            matrix[i] = decode_vector(value)
+    return matrix
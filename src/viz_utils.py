@@ -0,0 +1,60 @@
+"""
+Chart data preparation for Plot Pyre
+Streamlit-free helpers behind the Visualization tab
+"""
+import pandas as pd
+
+# Rows kept when sampling large datasets for charts
+VIZ_SAMPLE_SIZE = 10000
+# Most frequent x values offered for selection
+VIZ_MAX_CHOICES = 50
+
+
+def sample_for_viz(df, sample_size=VIZ_SAMPLE_SIZE, random_state=42):
+    """Returns the frame itself, or a reproducible sample of it when it is large"""
+    if len(df) > sample_size:
+        return df.sample(n=sample_size, random_state=random_state)
+    return df
+
+
+def aggregate_for_viz(df, x_column, y_column, selected_values):
+    """Filters to the selected x values and aggregates y per x (mean or count)"""
+    # Filter data based on selected values
+    filtered_df = df[df[x_column].isin(selected_values)]
+
+    # Group by x_column and aggregate y_column
+    if pd.api.types.is_numeric_dtype(filtered_df[y_column]):
+        # For numeric data, calculate mean
+        viz_data = filtered_df.groupby(x_column)[y_column].mean().reset_index()
+    else:
+        # For non-numeric data, count occurrences
+        viz_data = filtered_df.groupby(x_column)[y_column].count().reset_index()
+    return viz_data[x_column].tolist(), viz_data[y_column].tolist()
+
+
+def top_x_values(df, x_column, sketch=None, limit=VIZ_MAX_CHOICES):
+    """Returns the most frequent x values and the column's distinct count.
+
+    Text columns with a dataset sketch are answered from its heavy hitters and
+    HyperLogLog (no scan); anything else takes one value_counts pass over df.
+    """
+    if sketch is not None and pd.api.types.is_string_dtype(df[x_column]):
+        top = sketch.top_values(x_column, limit)
+        if top:
+            return [value for value, _ in top], sketch.distinct(x_column)
+    counts = df[x_column].value_counts()
+    return counts.head(limit).index.tolist(), len(counts)
+
+
+def aggregate_lazy_for_viz(dataset, x_column, y_column, selected_values, numeric):
+    """aggregate_for_viz over a LazyDataset: one streaming pass over the full data.
+
+    ``numeric`` picks mean (True) or count of y, as decided from a sample's dtype.
+    """
+    viz_data = (
+        dataset.isin(x_column, selected_values)
+        .select([x_column, y_column])
+        .groupby_agg(x_column, {y_column: "mean" if numeric else "count"})
+        .sort_values(x_column)
+    )
+    return viz_data[x_column].tolist(), viz_data.iloc[:, -1].tolist()
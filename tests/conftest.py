@@ -0,0 +1,22 @@
+import os
+import tempfile
+
+import pytest
+
+# OfflineStorage picks its directories under ~ at import; keep the suite's apart
+os.environ["HOME"] = tempfile.mkdtemp(prefix="plot-pyre-tests-")
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    """A fresh in-process MongoDB (mongomock) behind src.db_utils"""
+    pytest.importorskip("mongomock")
+    from src import db_utils
+
+    monkeypatch.setenv("MONGODB_URI", "mongomock://localhost")
+    monkeypatch.setenv("EMBEDDING_PROVIDER", "hashing")
+    db_utils.get_mongodb_client.cache_clear()
+    db_utils.get_catalog.cache_clear()
+    yield db_utils.get_database()
+    db_utils.get_mongodb_client.cache_clear()
+    db_utils.get_catalog.cache_clear()
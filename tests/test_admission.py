@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from src.admission import AdmissionRejected, Limiter
+
+
+async def _settle():
+    # A hand-off resolves through shield() and wait_for(): a few loop turns
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_release_hands_slot_to_waiter_in_priority_order():
+    async def scenario():
+        limiter = Limiter("test", concurrency=1, queue_size=4, max_wait=5)
+        await limiter.acquire()
+        order = []
+
+        async def wait(name, priority):
+            await limiter.acquire(priority)
+            order.append(name)
+
+        low = asyncio.create_task(wait("low", 0))
+        high = asyncio.create_task(wait("high", 2))
+        await _settle()
+        assert limiter.queue_depth == 2
+
+        limiter.release(0.0)
+        await _settle()
+        # Handed over, not freed: the slot count never dips
+        assert order == ["high"] and limiter.active == 1
+
+        # A newcomer cannot jump the queue while someone waits
+        newcomer = asyncio.create_task(wait("newcomer", 0))
+        await _settle()
+        limiter.release(0.0)
+        await _settle()
+        assert order == ["high", "low"]
+
+        limiter.release(0.0)
+        await asyncio.gather(low, high, newcomer)
+        limiter.release(0.0)
+        assert order == ["high", "low", "newcomer"]
+        assert limiter.active == 0 and limiter.queue_depth == 0
+
+    asyncio.run(scenario())
+
+
+def test_wait_times_out_and_leaves_no_trace():
+    async def scenario():
+        limiter = Limiter("test", concurrency=1, queue_size=4, max_wait=5)
+        await limiter.acquire()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await limiter.acquire(timeout=0.01)
+        assert rejected.value.reason == "timeout"
+        assert rejected.value.retry_after >= 1
+        assert limiter.queue_depth == 0
+
+        limiter.release(0.0)
+        assert limiter.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_rejects_immediately():
+    async def scenario():
+        limiter = Limiter("test", concurrency=1, queue_size=1, max_wait=5)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await _settle()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await limiter.acquire()
+        assert rejected.value.reason == "queue_full"
+
+        limiter.release(0.0)
+        await waiter
+        limiter.release(0.0)
+        assert limiter.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_slot_releases_on_error():
+    async def scenario():
+        limiter = Limiter("test", concurrency=1, queue_size=1)
+        with pytest.raises(RuntimeError):
+            async with limiter.slot():
+                raise RuntimeError
+        assert limiter.active == 0
+
+    asyncio.run(scenario())
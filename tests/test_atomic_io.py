@@ -0,0 +1,99 @@
+import os
+
+import pytest
+
+from src.atomic_io import TEMP_SUFFIX, WriteAheadManifest, _process_start, atomic_write_text
+
+# A token naming this pid with another start time: a dead writer whose pid was reused
+DEAD_WRITER = f"{os.getpid()}-0"
+
+needs_proc = pytest.mark.skipif(
+    _process_start(os.getpid()) is None, reason="writer liveness needs /proc"
+)
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    return WriteAheadManifest(tmp_path / "manifest.wal", tmp_path / ".locks")
+
+
+def _temps(directory):
+    return sorted(path.name for path in directory.glob(f".*{TEMP_SUFFIX}"))
+
+
+def _crashed_commit(manifest, directory, writer, files):
+    """Leaves a committed-but-unapplied record, as a writer killed mid-commit would"""
+    renames = []
+    for name, text in files.items():
+        temp = directory / f".{name}.{writer}.abcd{TEMP_SUFFIX}"
+        temp.write_text(text)
+        renames.append([str(temp), str(directory / name)])
+    manifest._append({"txn": f"{writer}:0123", "state": "commit", "renames": renames})
+
+
+def test_atomic_write_text_replaces_without_leftovers(tmp_path):
+    target = tmp_path / "meta.json"
+    atomic_write_text(target, "old")
+    atomic_write_text(target, "new")
+    assert target.read_text() == "new"
+    assert _temps(tmp_path) == []
+
+
+def test_commit_replaces_files_together_and_runs_callbacks(manifest, tmp_path):
+    applied = []
+    with manifest.commit() as commit:
+        commit.write_text(tmp_path / "a.txt", "A")
+        commit.write_text(tmp_path / "b.txt", "B")
+        commit.after_apply(lambda: applied.append((tmp_path / "b.txt").read_text()))
+    assert (tmp_path / "a.txt").read_text() == "A" and applied == ["B"]
+    assert manifest._unfinished(manifest._records()) == []
+
+
+def test_failed_commit_discards_its_files(manifest, tmp_path):
+    with pytest.raises(RuntimeError):
+        with manifest.commit() as commit:
+            commit.write_text(tmp_path / "a.txt", "A")
+            raise RuntimeError("boom")
+    assert not (tmp_path / "a.txt").exists() and _temps(tmp_path) == []
+
+
+@needs_proc
+def test_recover_finishes_commits_of_dead_writers(manifest, tmp_path):
+    (tmp_path / "data.parquet").write_text("old data")
+    _crashed_commit(
+        manifest, tmp_path, DEAD_WRITER, {"data.parquet": "new data", "meta.json": "new meta"}
+    )
+    finished = manifest.recover([tmp_path])
+    assert sorted(path.name for path in finished) == ["data.parquet", "meta.json"]
+    assert (tmp_path / "data.parquet").read_text() == "new data"
+    assert (tmp_path / "meta.json").read_text() == "new meta"
+    # The manifest is compacted down to nothing left to redo
+    assert manifest._records() == []
+    assert manifest.recover([tmp_path]) == []
+
+
+@needs_proc
+def test_recover_leaves_live_writers_alone(manifest, tmp_path):
+    from src.atomic_io import _writer_token
+
+    live = _writer_token()
+    _crashed_commit(manifest, tmp_path, live, {"meta.json": "in flight"})
+    assert manifest.recover([tmp_path]) == []
+    assert not (tmp_path / "meta.json").exists()
+    assert _temps(tmp_path) == [f".meta.json.{live}.abcd{TEMP_SUFFIX}"]
+    assert [record["txn"] for record in manifest._records()] == [f"{live}:0123"]
+
+
+@needs_proc
+def test_recover_removes_uncommitted_temporaries_of_dead_writers(manifest, tmp_path):
+    (tmp_path / f".meta.json.{DEAD_WRITER}.abcd{TEMP_SUFFIX}").write_text("partial")
+    (tmp_path / f".notes.txt.unparseable{TEMP_SUFFIX}").write_text("kept")
+    assert manifest.recover([tmp_path]) == []
+    assert _temps(tmp_path) == [f".notes.txt.unparseable{TEMP_SUFFIX}"]
+
+
+def test_torn_last_record_is_ignored(manifest):
+    manifest._append({"txn": "1-2:ab", "state": "commit", "renames": []})
+    with open(manifest.path, "a") as handle:
+        handle.write('{"txn": "1-2:ab", "sta')
+    assert manifest._records() == [{"txn": "1-2:ab", "state": "commit", "renames": []}]
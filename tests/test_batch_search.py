@@ -0,0 +1,45 @@
+import pandas as pd
+import pytest
+
+from src import db_utils
+
+
+@pytest.fixture
+def fruit(mongo, monkeypatch):
+    df = pd.DataFrame({"text": ["red apple", "green pear", "red car"]})
+    db_utils.store_dataset("fruit", df, text_columns=["text"])
+    settings = db_utils._search_settings("fruit")
+    # Pretend the catalog says the Atlas index is ready
+    monkeypatch.setattr(db_utils, "_search_settings", lambda name: (*settings[:2], True))
+    return "fruit"
+
+
+def _atlas(monkeypatch, answer, queryable):
+    def search(collection, vector, *args, **kwargs):
+        if isinstance(answer, Exception):
+            raise answer
+        return list(answer)
+
+    monkeypatch.setattr(db_utils, "_atlas_vector_search", search)
+    monkeypatch.setattr(db_utils, "_atlas_index_queryable", lambda collection: queryable)
+
+
+def test_empty_answer_from_queryable_index_is_final(fruit, monkeypatch):
+    _atlas(monkeypatch, [], queryable=True)
+    results = db_utils.batch_vector_search(fruit, ["red", "pear"], text_field_to_return="text")
+    assert all(df.empty for df in results)
+    assert [df.attrs["search_stats"]["engine"] for df in results] == ["atlas", "atlas"]
+
+
+def test_empty_answer_from_building_index_falls_back(fruit, monkeypatch):
+    _atlas(monkeypatch, [], queryable=False)
+    results = db_utils.batch_vector_search(fruit, ["red"], text_field_to_return="text")
+    assert results[0].attrs["search_stats"]["engine"] == "local"
+    assert len(results[0]) == 3
+
+
+def test_atlas_errors_fall_back(fruit, monkeypatch):
+    _atlas(monkeypatch, RuntimeError("index missing"), queryable=True)
+    results = db_utils.batch_vector_search(fruit, ["red"], text_field_to_return="text")
+    assert results[0].attrs["search_stats"]["engine"] == "local"
+    assert results[0]["text"].iloc[0].startswith("red")
@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+from src import db_utils
+
+
+@pytest.fixture
+def catalog(mongo, monkeypatch):
+    monkeypatch.setattr(db_utils, "_catalog_backfilled", False)
+    for name in ("Beta", "alpha", "alphabet", "gamma"):
+        db_utils.store_dataset(name, pd.DataFrame({"x": [1, 2, 3], "y": ["a", "b", "c"]}))
+    return mongo
+
+
+def test_store_records_metadata_and_bumps_the_version(catalog):
+    info = db_utils.get_dataset_info("alpha")
+    assert info["row_count"] == 3 and info["version"] == 1
+    assert [column["name"] for column in info["schema"]] == ["x", "y"]
+    db_utils.store_dataset("alpha", pd.DataFrame({"x": [1]}))
+    changed = db_utils.get_dataset_info("alpha")
+    assert changed["version"] == 2 and changed["row_count"] == 1
+    assert changed["content_hash"] != info["content_hash"]
+    assert changed["created_at"] == info["created_at"]
+
+
+def test_listing_pages_by_name(catalog):
+    first = db_utils.list_datasets(limit=3)
+    assert [entry["_id"] for entry in first["datasets"]] == ["Beta", "alpha", "alphabet"]
+    assert first["total"] == 4 and first["next"] == "alphabet"
+    rest = db_utils.list_datasets(limit=3, after=first["next"])
+    assert [entry["_id"] for entry in rest["datasets"]] == ["gamma"] and rest["next"] is None
+
+
+def test_search_is_a_case_insensitive_prefix(catalog):
+    found = db_utils.list_datasets(search="ALPHA")
+    assert [entry["_id"] for entry in found["datasets"]] == ["alpha", "alphabet"]
+    assert [entry["_id"] for entry in db_utils.list_datasets(search="b")["datasets"]] == ["Beta"]
+    assert db_utils.list_datasets(search="a.")["total"] == 0
+
+
+def test_collections_stored_before_the_catalog_are_backfilled(catalog):
+    catalog["legacy"].insert_many([{"x": 1}, {"x": 2}])
+    catalog["_internal"].insert_one({"x": 1})
+    names = [entry["_id"] for entry in db_utils.list_datasets()["datasets"]]
+    assert "legacy" in names and "_internal" not in names
+    assert db_utils.get_dataset_info("legacy")["row_count"] == 2
+    assert db_utils.backfill_catalog() == 0
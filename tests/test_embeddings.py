@@ -0,0 +1,107 @@
+import sys
+import types
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import db_utils
+from src.embeddings import (
+    EmbeddingError,
+    GeminiEmbeddingProvider,
+    HashingEmbeddingProvider,
+)
+
+
+def test_hashing_embeddings_are_deterministic_and_normalized():
+    provider = HashingEmbeddingProvider(dimension=64)
+    matrix = provider.embed(["red apple pie", "", None, "red apple pie"])
+    assert matrix.shape == (4, 64) and matrix.dtype == np.float32
+    np.testing.assert_allclose(np.linalg.norm(matrix[0]), 1.0, rtol=1e-6)
+    assert not matrix[1].any() and not matrix[2].any()
+    np.testing.assert_array_equal(matrix[0], matrix[3])
+
+
+class _ApiError(Exception):
+    def __init__(self, code):
+        super().__init__(f"status {code}")
+        self.code = code
+
+
+def _fake_gemini(monkeypatch, outcomes):
+    """Makes embed_content raise/return the given outcomes in order"""
+    calls = []
+
+    def embed_content(model, contents, config):
+        calls.append(contents)
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return types.SimpleNamespace(
+            embeddings=[types.SimpleNamespace(values=[1.0] * 768) for _ in contents]
+        )
+
+    client = types.SimpleNamespace(models=types.SimpleNamespace(embed_content=embed_content))
+    genai = types.ModuleType("google.genai")
+    genai.types = types.SimpleNamespace(EmbedContentConfig=lambda task_type: task_type)
+    google = types.ModuleType("google")
+    google.genai = genai
+    monkeypatch.setitem(sys.modules, "google", google)
+    monkeypatch.setitem(sys.modules, "google.genai", genai)
+    monkeypatch.setattr("src.ai_utils.get_genai_client", lambda: client)
+    monkeypatch.setattr("src.embeddings.time.sleep", lambda seconds: None)
+    return calls
+
+
+def test_gemini_retries_transient_errors(monkeypatch):
+    calls = _fake_gemini(monkeypatch, [_ApiError(503), ConnectionError("reset"), None])
+    matrix = GeminiEmbeddingProvider().embed(["a", "b"])
+    assert len(calls) == 3
+    assert matrix.shape == (2, 768) and matrix.all()
+
+
+def test_gemini_gives_up_after_max_attempts(monkeypatch):
+    provider = GeminiEmbeddingProvider()
+    calls = _fake_gemini(monkeypatch, [_ApiError(429)] * provider.max_attempts)
+    with pytest.raises(EmbeddingError):
+        provider.embed(["a"])
+    assert len(calls) == provider.max_attempts
+
+
+def test_gemini_does_not_retry_client_errors(monkeypatch):
+    calls = _fake_gemini(monkeypatch, [_ApiError(400)])
+    with pytest.raises(EmbeddingError):
+        GeminiEmbeddingProvider().embed(["a"])
+    assert len(calls) == 1
+
+
+def test_failed_block_is_marked_stale_and_resynced(mongo, monkeypatch):
+    monkeypatch.setattr(db_utils, "INSERT_BATCH_SIZE", 2)
+    df = pd.DataFrame({"text": ["red apple", "green pear", "blue sky", "red car", "old tree"]})
+    real_embed = HashingEmbeddingProvider._embed
+    calls = []
+
+    def flaky_embed(self, texts, task_type):
+        calls.append(texts)
+        if len(calls) == 2:
+            raise EmbeddingError("quota exhausted")
+        return real_embed(self, texts, task_type)
+
+    monkeypatch.setattr(HashingEmbeddingProvider, "_embed", flaky_embed)
+    db_utils.store_dataset("fruit", df, text_columns=["text"], mode="sync")
+
+    info = db_utils.get_dataset_info("fruit")
+    assert info["embedding_error"] == "quota exhausted"
+    assert info["stale_blocks"] == [1, 2]
+    assert info["embedding"]["provider"] == "hashing"
+    # The provider is not called again once it has failed
+    assert len(calls) == 2
+    embedded = {d["_block"]: "embedding" in d for d in mongo["fruit"].find()}
+    assert embedded == {0: True, 1: False, 2: False}
+
+    # A later sync embeds only the stale blocks and leaves the rest alone
+    written = db_utils.store_dataset("fruit", df, text_columns=["text"], mode="sync")
+    assert written == 3
+    info = db_utils.get_dataset_info("fruit")
+    assert info["stale_blocks"] == [] and info["embedding_error"] is None
+    assert all("embedding" in d for d in mongo["fruit"].find())
@@ -0,0 +1,47 @@
+from src import http_cache
+from src.http_cache import choose_encoding, is_not_modified
+
+LAST_MODIFIED = "Mon, 05 Oct 2026 10:00:00 GMT"
+
+
+def test_choose_encoding_prefers_available_order(monkeypatch):
+    monkeypatch.setattr(http_cache, "available_encodings", lambda: ["zstd", "br", "gzip"])
+    assert choose_encoding("gzip, br, zstd") == "zstd"
+    assert choose_encoding("gzip, br") == "br"
+    assert choose_encoding("gzip;q=0.5, deflate") == "gzip"
+
+
+def test_choose_encoding_honours_zero_quality_and_wildcard(monkeypatch):
+    monkeypatch.setattr(http_cache, "available_encodings", lambda: ["br", "gzip"])
+    assert choose_encoding("br;q=0, gzip") == "gzip"
+    assert choose_encoding("*") == "br"
+    assert choose_encoding("*, br;q=0") == "gzip"
+    assert choose_encoding("gzip;q=0, *;q=0") is None
+
+
+def test_choose_encoding_identity_cases():
+    assert choose_encoding(None) is None
+    assert choose_encoding("") is None
+    assert choose_encoding("deflate") is None
+    assert choose_encoding("gzip;q=bogus") is None
+
+
+def test_is_not_modified_matches_etags():
+    assert is_not_modified({"if-none-match": '"a", "b"'}, etag='"b"')
+    assert is_not_modified({"if-none-match": 'W/"b"'}, etag='"b"')
+    assert is_not_modified({"if-none-match": "*"}, etag='"b"')
+    assert not is_not_modified({"if-none-match": '"a"'}, etag='"b"')
+    assert not is_not_modified({"if-none-match": '"a"'})
+
+
+def test_is_not_modified_dates():
+    assert is_not_modified({"if-modified-since": LAST_MODIFIED}, last_modified=LAST_MODIFIED)
+    assert not is_not_modified(
+        {"if-modified-since": "Sun, 04 Oct 2026 10:00:00 GMT"}, last_modified=LAST_MODIFIED
+    )
+    assert not is_not_modified({"if-modified-since": "yesterday"}, last_modified=LAST_MODIFIED)
+
+
+def test_if_none_match_takes_precedence():
+    headers = {"if-none-match": '"a"', "if-modified-since": LAST_MODIFIED}
+    assert not is_not_modified(headers, etag='"b"', last_modified=LAST_MODIFIED)
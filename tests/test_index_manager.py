@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import pytest
+
+from src import db_utils, index_manager
+from src.index_manager import (
+    HOT_USAGE_THRESHOLD,
+    MAX_MANAGED_INDEXES,
+    drop_unused_indexes,
+    ensure_index,
+    filter_columns,
+    index_name,
+    record_column_usage,
+)
+
+
+@pytest.fixture
+def sales(mongo):
+    df = pd.DataFrame({"region": ["eu", "us"], "price": [1.0, 2.0], "day": [1, 2]})
+    db_utils.store_dataset("sales", df)
+    # Let the advisor tasks the store scheduled finish first
+    index_manager.schedule(lambda: None).result()
+    return mongo["sales"]
+
+
+def _catalog_indexes():
+    return db_utils.get_dataset_info("sales").get("indexes", {})
+
+
+def test_filter_columns_puts_equality_before_ranges():
+    filters = {"price": {"$lt": 10}, "$and": [{"region": "eu"}, {"day": {"$eq": 3}}], "$or": [{"x": 1}]}
+    assert filter_columns(filters) == ["region", "day", "price"]
+    assert filter_columns({"name": {"$regex": "a"}}) == []
+    assert filter_columns(None) == []
+
+
+def test_index_name_is_a_safe_field_name():
+    assert index_name(["a.b", "c$d"]) == "pp_a_b__c_d"
+
+
+def test_hot_column_sets_get_an_index(sales):
+    for _ in range(HOT_USAGE_THRESHOLD - 1):
+        record_column_usage("sales", ["region", "price"], "filter").result()
+    assert index_name(["region", "price"]) not in sales.index_information()
+
+    record_column_usage("sales", ["region", "price"], "search_prefilter").result()
+    name = index_name(["region", "price"])
+    assert name in sales.index_information()
+    assert _catalog_indexes()[name]["status"] == "ready"
+    with pytest.raises(ValueError):
+        record_column_usage("sales", ["region"], "sort")
+
+
+def test_ensure_index_reuses_prefixes_and_caps_managed_indexes(sales):
+    assert ensure_index("sales", ["region", "price"]) == "pp_region__price"
+    assert ensure_index("sales", ["region"]) is None
+    for i in range(MAX_MANAGED_INDEXES - 1):
+        sales.create_index([(f"extra{i}", 1)], name=f"pp_extra{i}")
+    assert ensure_index("sales", ["day"]) is None
+    assert "pp_day" not in sales.index_information()
+
+
+def test_unused_managed_indexes_are_dropped(sales, monkeypatch):
+    ensure_index("sales", ["region"])
+    ensure_index("sales", ["day"])
+    old = datetime.now(timezone.utc) - timedelta(days=30)
+    monkeypatch.setattr(
+        index_manager,
+        "_index_accesses",
+        lambda collection: {
+            "pp_region": {"ops": 0, "since": old},
+            "pp_day": {"ops": 4, "since": old},
+            "_id_": {"ops": 0, "since": old},
+        },
+    )
+    assert drop_unused_indexes("sales") == ["pp_region"]
+    assert set(sales.index_information()) >= {"_id_", "pp_day"}
+    assert "pp_region" not in _catalog_indexes()
+
+
+def test_nothing_is_dropped_without_access_statistics(sales):
+    ensure_index("sales", ["region"])
+    assert drop_unused_indexes("sales", min_age=timedelta(0)) == []
@@ -0,0 +1,59 @@
+import io
+
+import pandas as pd
+import pytest
+
+from src import ingest
+from src.ingest import read_csv_parallel, read_uploaded_file
+
+pytest.importorskip("pyarrow")
+
+
+def _default_parse(data):
+    return pd.read_csv(io.BytesIO(data))
+
+
+def test_arrow_path_keeps_temporal_columns_as_text():
+    data = (
+        b"id,day,at,stamp,zoned\n"
+        b"1,2024-01-02,12:30:00,2024-01-02 03:04:05,2024-01-02T03:04:05+01:00\n"
+        b"2,2024-02-03,13:00,2024-01-03T03:04:05,2024-01-02T03:04:05+02:00\n"
+    )
+    df = ingest._read_csv_arrow(data)
+    assert df is not None
+    pd.testing.assert_frame_equal(df, _default_parse(data))
+    assert df.loc[1, "zoned"] == "2024-01-02T03:04:05+02:00"
+
+
+def test_arrow_path_matches_missing_values_and_booleans():
+    data = b"a,flag,empty,text\n1,True,,x\n,false,,None\n3,TRUE,,NA\n"
+    df = ingest._read_csv_arrow(data)
+    assert df is not None
+    pd.testing.assert_frame_equal(df, _default_parse(data))
+
+
+def test_type_change_after_first_block_falls_back():
+    rows = [f"{i},{i}" for i in range(300_000)] + ["1,1.5"]
+    data = ("a,b\n" + "\n".join(rows) + "\n").encode()
+    assert ingest._read_csv_arrow(data) is None
+    pd.testing.assert_frame_equal(read_csv_parallel(data), _default_parse(data))
+
+
+def test_dtype_mismatch_falls_back():
+    data = b"a,a\n1,2\n"
+    assert ingest._read_csv_arrow(data) is None
+    pd.testing.assert_frame_equal(read_csv_parallel(data), _default_parse(data))
+
+
+def test_split_keeps_quoted_newlines_together():
+    data = b'a,b\n1,"x\ny"\n2,z\n3,"p\nq"\n'
+    header, bodies = ingest._split_csv_on_lines(data, 3)
+    assert header == b"a,b\n"
+    assert b"".join(bodies) == data[len(header):]
+    for body in bodies:
+        assert body.count(b'"') % 2 == 0
+
+
+def test_unsupported_extension_raises():
+    with pytest.raises(ValueError):
+        read_uploaded_file(b"a\n1\n", "txt")
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.lazy_dataset import LazyDataset
+
+
+def _frame(rows=5000):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {
+            "region": rng.choice(["eu", "us", "apac", None], rows),
+            "channel": rng.choice(["web", "store"], rows),
+            "price": np.where(rng.random(rows) < 0.1, np.nan, rng.random(rows) * 100),
+            "units": rng.integers(0, 10, rows),
+        }
+    )
+
+
+def _sorted(df, by):
+    return df.sort_values(by).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("how", ["count", "size", "sum", "mean", "min", "max"])
+def test_groupby_agg_matches_pandas(how):
+    df = _frame()
+    result = LazyDataset.from_frame(df, chunk_rows=700).groupby_agg(
+        ["region", "channel"], {"price": how}
+    )
+    grouped = df.groupby(["region", "channel"])
+    expected = (grouped.size() if how == "size" else grouped["price"].agg(how)).rename("price")
+    expected = expected.reset_index()
+    pd.testing.assert_frame_equal(
+        _sorted(result, ["region", "channel"]),
+        _sorted(expected, ["region", "channel"]),
+        check_dtype=False,
+    )
+
+
+def test_groupby_agg_several_columns_and_single_key():
+    df = _frame()
+    result = LazyDataset.from_frame(df, chunk_rows=333).groupby_agg(
+        "region", {"price": "mean", "units": "sum"}
+    )
+    expected = df.groupby("region").agg(price=("price", "mean"), units=("units", "sum"))
+    pd.testing.assert_frame_equal(
+        _sorted(result, "region"),
+        _sorted(expected.reset_index(), "region"),
+        check_dtype=False,
+    )
+
+
+def test_groupby_agg_of_grouping_column_is_renamed():
+    df = _frame()
+    result = LazyDataset.from_frame(df).groupby_agg("channel", {"channel": "count"})
+    assert list(result.columns) == ["channel", "channel_count"]
+
+
+def test_groupby_agg_on_empty_scan():
+    df = _frame()
+    empty = LazyDataset.from_frame(df).filter(lambda chunk: chunk["units"] < 0)
+    result = empty.groupby_agg("region", {"price": "sum"})
+    assert result.empty and list(result.columns) == ["region", "price"]
+
+
+def test_groupby_agg_rejects_unknown_aggregation():
+    with pytest.raises(ValueError):
+        LazyDataset.from_frame(_frame()).groupby_agg("region", {"price": "median"})
@@ -0,0 +1,86 @@
+import pandas as pd
+import pytest
+
+from src.local_catalog import LocalCatalog
+from src.offline_utils import DATASETS_DIR, OfflineStorage
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = LocalCatalog(tmp_path / "catalog.sqlite3")
+    for name, size, saved_at in [
+        ("Sales", 300, "2026-01-03"),
+        ("sales", 100, "2026-01-01"),
+        ("salaries", 200, "2026-01-02"),
+        ("orders", 50, "2026-01-04"),
+    ]:
+        catalog.upsert(
+            "dataset", name, f"/data/{name}.parquet", size, 2, 10, saved_at, {"saved": saved_at}
+        )
+    return catalog
+
+
+def test_new_catalog_is_marked_created(tmp_path):
+    path = tmp_path / "catalog.sqlite3"
+    assert LocalCatalog(path).created
+    assert not LocalCatalog(path).created
+
+
+def test_names_differing_in_case_are_separate_entries(catalog):
+    names = [entry["name"] for entry in catalog.list("dataset", sort_by="name", descending=False)]
+    assert names == ["Sales", "orders", "salaries", "sales"]
+
+
+def test_prefix_search_ignores_case(catalog):
+    found = catalog.list("dataset", search="SAL", sort_by="size_bytes")
+    assert [entry["name"] for entry in found] == ["Sales", "salaries", "sales"]
+    assert [entry["name"] for entry in catalog.list("dataset", search="sales")] == [
+        "Sales",
+        "sales",
+    ]
+    assert catalog.list("dataset", search="x") == []
+
+
+def test_listing_sorts_pages_and_decodes_metadata(catalog):
+    page = catalog.list("dataset", limit=2, offset=1)
+    assert [entry["name"] for entry in page] == ["Sales", "salaries"]
+    assert page[0]["metadata"] == {"saved": "2026-01-03"}
+    with pytest.raises(ValueError):
+        catalog.list("dataset", sort_by="path; DROP TABLE entries")
+
+
+def test_update_metadata_keeps_the_rest_of_the_entry(catalog):
+    catalog.update_metadata("dataset", "orders", {"pending_sync": True}, size_bytes=75)
+    (entry,) = catalog.list("dataset", search="orders")
+    assert entry["metadata"] == {"pending_sync": True}
+    assert (entry["size_bytes"], entry["rows"], entry["saved_at"]) == (75, 10, "2026-01-04")
+
+
+def test_stats_delete_and_replace_all(catalog):
+    assert catalog.stats()["dataset"] == {"entries": 4, "files": 8, "size_bytes": 650}
+    assert catalog.stats()["insight"] == {"entries": 0, "files": 0, "size_bytes": 0}
+
+    catalog.delete("dataset", "orders")
+    assert catalog.stats()["dataset"]["entries"] == 3
+
+    catalog.replace_all([{"kind": "insight", "name": "q1", "path": "/cache/q1", "size_bytes": 7}])
+    assert catalog.stats()["dataset"]["entries"] == 0
+    assert catalog.list("insight")[0]["size_bytes"] == 7
+
+
+def test_offline_storage_lists_from_the_catalog():
+    OfflineStorage.save_dataset_locally("Cat_Listing", pd.DataFrame({"a": range(5)}))
+    OfflineStorage.save_dataset_locally("cat_listing2", pd.DataFrame({"a": range(2)}))
+    try:
+        listed = OfflineStorage.list_local_datasets(search="cat_l", sort_by="rows")
+        assert [entry["dataset_name"] for entry in listed] == ["Cat_Listing", "cat_listing2"]
+        assert all(entry["size_bytes"] > 0 for entry in listed)
+
+        # Files changed behind the app's back are picked up by a rebuild
+        (DATASETS_DIR / "cat_listing2_metadata.json").unlink()
+        OfflineStorage.rebuild_catalog()
+        listed = OfflineStorage.list_local_datasets(search="cat_l")
+        assert [entry["dataset_name"] for entry in listed] == ["Cat_Listing"]
+    finally:
+        OfflineStorage.delete_local_dataset("Cat_Listing")
+        OfflineStorage.delete_local_dataset("cat_listing2")
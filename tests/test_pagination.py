@@ -0,0 +1,93 @@
+import pandas as pd
+import pytest
+
+from src import pagination
+from src.pagination import FramePager, MongoPager, Pager, ParquetPager
+
+
+class CountingPager(Pager):
+    def __init__(self, rows, page_size):
+        super().__init__(page_size)
+        self.rows = rows
+        self.fetched = []
+
+    def _count(self):
+        return self.rows
+
+    def _fetch(self, page):
+        self.fetched.append(page)
+        return page
+
+
+def _prefetched(pager, page):
+    with pager._lock:
+        future = pager._pending.get(page)
+    if future is not None:
+        future.result()
+
+
+def test_next_page_is_prefetched_and_reused():
+    pager = CountingPager(rows=25, page_size=10)
+    assert pager.get_page(1) == 1
+    _prefetched(pager, 2)
+    assert pager.fetched == [1, 2]
+    assert pager.get_page(2) == 2
+    _prefetched(pager, 3)
+    assert pager.fetched == [1, 2, 3]
+    # The last page has nothing after it to prefetch
+    assert pager.get_page(3) == 3 and pager.fetched == [1, 2, 3]
+
+
+def test_pages_are_clamped_and_cached_lru():
+    pager = CountingPager(rows=1000, page_size=10)
+    pager.prefetch = False
+    assert pager.get_page(0) == 1 and pager.get_page(500) == 100
+    for page in range(1, pagination.PAGE_CACHE_SIZE + 2):
+        pager.get_page(page)
+    assert 1 not in pager._pages and len(pager._pages) == pagination.PAGE_CACHE_SIZE
+
+
+def _frame(rows=23):
+    return pd.DataFrame({"id": range(rows), "group": [i % 4 for i in range(rows)]})
+
+
+def test_frame_pager_slices_pages():
+    df = _frame()
+    pager = FramePager(df, page_size=10)
+    assert pager.page_count == 3
+    pd.testing.assert_frame_equal(pager.get_page(3), df.iloc[20:])
+
+
+def test_parquet_pager_reads_across_row_groups(tmp_path):
+    df = _frame()
+    path = tmp_path / "data.parquet"
+    df.to_parquet(path, index=False, row_group_size=7)
+    pager = ParquetPager(path, page_size=10)
+    assert pager.total_rows == 23
+    for page in (2, 1, 3):
+        expected = df.iloc[(page - 1) * 10 : page * 10].reset_index(drop=True)
+        pd.testing.assert_frame_equal(pager.get_page(page), expected)
+
+
+def test_mongo_pager_keyset_pages_match_sorted_rows(mongo):
+    df = _frame()
+    records = df.to_dict("records")
+    for record in records:
+        record["embedding"] = [0.0]
+    mongo["rows"].insert_many(records)
+    expected = df.sort_values(["group", "id"]).reset_index(drop=True)
+
+    pager = MongoPager(mongo["rows"], page_size=5, sort_key="group")
+    # Jump straight to page 4, then walk from the start
+    for page in (4, 1, 2, 3, 5):
+        frame = pager.get_page(page)
+        assert "embedding" not in frame.columns
+        start = (page - 1) * 5
+        assert frame["id"].tolist() == expected["id"].iloc[start : start + 5].tolist()
+
+
+def test_mongo_pager_filters_rows(mongo):
+    mongo["rows"].insert_many(_frame().to_dict("records"))
+    pager = MongoPager(mongo["rows"], page_size=4, filters={"group": 1})
+    assert pager.total_rows == 6 and pager.page_count == 2
+    assert pager.get_page(2)["id"].tolist() == [17, 21]
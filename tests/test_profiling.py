@@ -0,0 +1,73 @@
+import time
+
+import pytest
+
+from src import profiling
+from src.profiling import Profile, profile, profiling_enabled, record, stage
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(profiling.time, "perf_counter", clock)
+    return clock
+
+
+@pytest.mark.parametrize(
+    "setting, query, expected",
+    [("", "1", False), ("1", None, True), ("allow", None, False), ("allow", "true", True), ("allow", "0", False)],
+)
+def test_profiling_enabled(monkeypatch, setting, query, expected):
+    monkeypatch.setenv(profiling.PROFILE_SETTING, setting)
+    assert profiling_enabled(query) is expected
+
+
+def test_nested_stages_report_inclusive_and_self_time(clock):
+    with profile("rerun", sample=False, dump=False) as current:
+        with stage("load"):
+            clock.now += 0.010
+            with stage("parse"):
+                clock.now += 0.030
+            record("mongo.find", 0.005)
+        with stage("chart"):
+            clock.now += 0.020
+        clock.now += 0.040
+    rows = {row["stage"]: row for row in current.breakdown()}
+    assert rows["load"]["total_ms"] == 40.0 and rows["load"]["self_ms"] == 5.0
+    assert rows["load / parse"]["self_ms"] == 30.0
+    assert rows["load / mongo.find"]["calls"] == 1
+    assert current.duration == pytest.approx(0.1)
+    assert current.server_timing().startswith("total;dur=100.0, load;dur=40.0")
+    assert "rerun;(untracked) 40000" in current.folded_stages()
+
+
+def test_stages_are_free_without_an_active_profile():
+    assert profiling.active_profile() is None
+    with stage("anything") as value:
+        record("ignored", 1.0)
+    assert value is None
+
+
+def test_dump_writes_folded_files(tmp_path):
+    def busy():
+        deadline = time.perf_counter() + 0.1
+        while time.perf_counter() < deadline:
+            pass
+
+    current = Profile("api /query", interval=0.001).start()
+    with current.stage("work"):
+        busy()
+    current.stop()
+    paths = current.dump(tmp_path)
+    assert paths["stages"].name.startswith("api__query-")
+    assert "api /query;work" in paths["stages"].read_text()
+    assert current.sample_count > 0
+    assert "busy (test_profiling.py" in paths["samples"].read_text()
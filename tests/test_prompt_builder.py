@@ -0,0 +1,44 @@
+import pandas as pd
+
+from src import prompt_builder
+from src.prompt_builder import build_insights_prompt, estimate_tokens, profile_dataframe
+
+
+def _column_lines(prompt):
+    return [line for line in prompt.splitlines() if line.startswith("- ")]
+
+
+def test_prompt_stays_within_budget_for_wide_frames():
+    df = pd.DataFrame({f"column_{i}": range(50) for i in range(300)})
+    prompt = build_insights_prompt(df, token_budget=1500)
+    assert estimate_tokens(prompt) <= 1500
+    assert "columns omitted to fit the budget" in prompt
+
+
+def test_column_that_does_not_fit_is_skipped_not_the_rest():
+    df = pd.DataFrame(
+        {"long_text": ["x" * 400 + str(i) for i in range(10)], "a": range(10), "b": range(10)}
+    )
+    lines = _column_lines(
+        build_insights_prompt(df, specific_columns=["long_text"], token_budget=350)
+    )
+    assert [line.split(" ")[1] for line in lines[:2]] == ["a", "b"]
+    assert "1 columns omitted" in lines[-1]
+
+
+def test_question_ranks_matching_columns_first():
+    df = pd.DataFrame({"zip": range(5), "revenue_total": range(5), "id": range(5)})
+    lines = _column_lines(build_insights_prompt(df, question="What drives revenue?"))
+    assert lines[0].startswith("- revenue_total")
+
+
+def test_profiles_are_cached_only_under_a_content_key(monkeypatch):
+    monkeypatch.setattr(prompt_builder, "_profile_cache", type(prompt_builder._profile_cache)())
+    df = pd.DataFrame({"a": [1, 2, 3]})
+    profile_dataframe(df)
+    assert not prompt_builder._profile_cache
+
+    first = profile_dataframe(df, "upload:abc")
+    # Same key, same contents by contract: the cached profile is returned
+    assert profile_dataframe(pd.DataFrame({"a": [9]}), "upload:abc") is first
+    assert profile_dataframe(df, "upload:def") is not first
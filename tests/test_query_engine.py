@@ -0,0 +1,81 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip("duckdb")
+
+from src import db_utils, query_engine  # noqa: E402
+from src.offline_utils import DATASETS_DIR, OfflineStorage  # noqa: E402
+from src.query_engine import QueryError, run_query  # noqa: E402
+
+
+@pytest.fixture
+def local_datasets(mongo):
+    OfflineStorage.save_dataset_locally(
+        "orders", pd.DataFrame({"id": [1, 2, 3], "customer": [10, 10, 20], "total": [5.0, 7.5, 2.0]})
+    )
+    OfflineStorage.save_dataset_locally(
+        "customers", pd.DataFrame({"customer": [10, 20], "name": ["ada", "bob"]})
+    )
+    OfflineStorage.save_dataset_locally("secrets", pd.DataFrame({"token": ["hunter2"]}))
+    yield
+    for name in ("orders", "customers", "secrets"):
+        OfflineStorage.delete_local_dataset(name)
+
+
+def test_joins_and_aggregates_local_copies(local_datasets):
+    table, truncated = run_query(
+        "SELECT c.name, SUM(o.total) AS spent FROM orders o "
+        "JOIN customers c USING (customer) GROUP BY c.name ORDER BY c.name"
+    )
+    assert not truncated
+    assert table.to_pydict() == {"name": ["ada", "bob"], "spent": [12.5, 2.0]}
+
+
+def test_results_are_truncated_to_max_rows(local_datasets):
+    table, truncated = run_query("SELECT * FROM orders ORDER BY id", max_rows=2)
+    assert truncated and table.column("id").to_pylist() == [1, 2]
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "DELETE FROM orders",
+        "CREATE TABLE copy AS SELECT * FROM orders",
+        "SELECT 1; SELECT 2",
+        "COPY orders TO '/tmp/out.csv'",
+        "ATTACH '/tmp/other.db'",
+    ],
+)
+def test_only_single_selects_run(local_datasets, sql):
+    with pytest.raises(QueryError):
+        run_query(sql)
+
+
+def test_queries_cannot_read_other_files(local_datasets):
+    secrets = DATASETS_DIR / "secrets.parquet"
+    with pytest.raises(QueryError, match="Permission"):
+        run_query(f"SELECT * FROM orders, read_parquet('{secrets}')")
+    with pytest.raises(QueryError, match="Permission"):
+        run_query("SELECT * FROM read_csv('/etc/passwd')")
+    with pytest.raises(QueryError):
+        run_query("SET enable_external_access = true")
+
+
+def test_unknown_tables_are_reported(local_datasets):
+    with pytest.raises(QueryError):
+        run_query("SELECT * FROM nowhere")
+
+
+def test_snapshots_follow_the_mongodb_version(mongo):
+    db_utils.store_dataset("events", pd.DataFrame({"kind": ["a", "b", "a"]}))
+    table, _ = run_query(
+        "SELECT kind, COUNT(*) AS n FROM events GROUP BY kind ORDER BY kind", prefer_local=False
+    )
+    assert table.to_pydict() == {"kind": ["a", "b"], "n": [2, 1]}
+    first = query_engine.snapshot_path("events")
+
+    db_utils.store_dataset("events", pd.DataFrame({"kind": ["c"]}))
+    table, _ = run_query("SELECT kind FROM events", prefer_local=False)
+    assert table.to_pydict() == {"kind": ["c"]}
+    assert query_engine._snapshot_dirs("events") == [query_engine.snapshot_path("events")]
+    assert not first.exists()
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+
+from src import search_cache
+from src.search_cache import SearchResultCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _cache(monkeypatch, **kwargs):
+    clock = Clock()
+    monkeypatch.setattr(search_cache.time, "monotonic", clock)
+    return SearchResultCache(**kwargs), clock
+
+
+def test_key_ignores_filter_order_and_query_spelling(monkeypatch):
+    cache, _ = _cache(monkeypatch)
+    key = cache.search_key("d", filters={"a": 1, "b": {"$lt": 2}}, num_results=5)
+    same = cache.search_key("d", num_results=5, filters={"b": {"$lt": 2}, "a": 1})
+    assert key == same
+    cache.put(key, "Red  Apples", "results")
+    assert cache.get(same, " red apples ") == "results"
+    assert cache.get(cache.search_key("d", filters=None, num_results=5), "red apples") is None
+
+
+def test_entries_expire_and_evict_least_recent(monkeypatch):
+    cache, clock = _cache(monkeypatch, ttl=10, max_entries=2)
+    cache.put("k", "a", 1)
+    cache.put("k", "b", 2)
+    cache.get("k", "a")
+    cache.put("k", "c", 3)
+    assert cache.get("k", "b") is None and cache.get("k", "a") == 1
+    clock.now += 11
+    assert cache.get("k", "a") is None and cache.get("k", "c") is None
+
+
+def test_zero_ttl_disables_caching(monkeypatch):
+    cache, _ = _cache(monkeypatch, ttl=0)
+    cache.put("k", "a", 1)
+    assert cache.get("k", "a") is None
+
+
+def test_similar_queries_share_results_above_threshold(monkeypatch):
+    cache, _ = _cache(monkeypatch, similarity=0.95)
+    cache.put("k", "red apple", "apples", query_vector=[1.0, 0.0])
+    assert cache.get_similar("k", [0.99, 0.05]) == "apples"
+    assert cache.get_similar("k", [0.7, 0.7]) is None
+    assert cache.get_similar("other", [1.0, 0.0]) is None
+    assert SearchResultCache(similarity=0).get_similar("k", [1.0, 0.0]) is None
+
+
+def test_invalidate_drops_one_dataset(monkeypatch):
+    cache, _ = _cache(monkeypatch)
+    cache.put(cache.search_key("a"), "q", 1)
+    cache.put(cache.search_key("b"), "q", 2)
+    cache.put_embedding(("a", 1), "q", [1.0])
+    cache.invalidate("a")
+    assert cache.get(cache.search_key("a"), "q") is None
+    assert cache.get(cache.search_key("b"), "q") == 2
+    assert cache.get_embedding(("a", 1), "q") is None
+
+
+def test_dataset_version_is_reread_after_the_check_interval(monkeypatch):
+    cache, clock = _cache(monkeypatch)
+    versions = iter([1, 2])
+    load = lambda name: next(versions)  # noqa: E731
+    assert cache.dataset_version("d", load) == 1
+    assert cache.dataset_version("d", load) == 1
+    clock.now += search_cache.VERSION_CHECK_SECONDS
+    assert cache.dataset_version("d", load) == 2
+
+
+def test_vector_search_reuses_results_until_the_dataset_changes(mongo):
+    from src import db_utils
+
+    search_cache.get_search_cache().invalidate()
+    db_utils.store_dataset("fruit", pd.DataFrame({"text": ["red apple", "green pear"]}), text_columns=["text"])
+    first = db_utils.vector_search("fruit", "red", text_field_to_return="text")
+    again = db_utils.vector_search("fruit", "RED ", text_field_to_return="text")
+    assert first.attrs["search_stats"]["cache"] == "miss"
+    assert again.attrs["search_stats"]["cache"] == "hit"
+    np.testing.assert_array_equal(first["score"], again["score"])
+
+    db_utils.store_dataset("fruit", pd.DataFrame({"text": ["red car"]}), text_columns=["text"])
+    fresh = db_utils.vector_search("fruit", "red", text_field_to_return="text")
+    assert fresh.attrs["search_stats"]["cache"] == "miss"
+    assert fresh["text"].tolist() == ["red car"]
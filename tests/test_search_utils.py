@@ -0,0 +1,59 @@
+import math
+
+import numpy as np
+import pytest
+
+from src.search_utils import BM25_B, BM25_K1, bm25_scores, tokenize, validate_filters
+
+
+def test_tokenize_lowercases_words():
+    assert tokenize("Red-Apple, red PEAR!") == ["red", "apple", "red", "pear"]
+    assert tokenize(None) == []
+
+
+def test_bm25_matches_formula():
+    texts = ["red apple", "green apple pie", "blue sky"]
+    scores = bm25_scores(texts, "apple")
+    lengths = np.array([2, 3, 2])
+    idf = math.log(1 + (3 - 2 + 0.5) / (2 + 0.5))
+    norms = BM25_K1 * (1 - BM25_B + BM25_B * lengths / lengths.mean())
+    expected = idf * np.array([1, 1, 0]) * (BM25_K1 + 1) / (np.array([1, 1, 0]) + norms)
+    np.testing.assert_allclose(scores, expected)
+
+
+def test_bm25_prefers_rare_terms_and_shorter_documents():
+    texts = ["apple", "apple banana cherry date", "cherry", "banana"]
+    scores = bm25_scores(texts, "apple")
+    assert scores[0] > scores[1] > 0
+    assert scores[2] == scores[3] == 0
+    # "cherry" and "apple" appear in as many documents; "date" in fewer
+    assert bm25_scores(texts, "date")[1] > bm25_scores(texts, "cherry")[1]
+
+
+def test_bm25_empty_query_or_corpus():
+    assert not bm25_scores(["a b"], "").any()
+    assert len(bm25_scores([], "a")) == 0
+
+
+def test_validate_filters_accepts_fields_and_comparisons():
+    filters = {"region": "EU", "price": {"$gte": 10, "$lt": 100}, "tag": {"$in": ["a", "b"]}}
+    assert validate_filters(filters) is filters
+    assert validate_filters(None) is None
+
+
+@pytest.mark.parametrize(
+    "filters",
+    [
+        {"$where": "sleep(1000)"},
+        {"$or": [{"a": 1}, {"b": 2}]},
+        {"name": {"$regex": ".*"}},
+        {"name": {"$in": "abc"}},
+        {"name": {"$eq": {"$ne": 1}}},
+        {"name": {}},
+        {"name": ["a", "b"]},
+        ["region"],
+    ],
+)
+def test_validate_filters_rejects_other_queries(filters):
+    with pytest.raises(ValueError):
+        validate_filters(filters)
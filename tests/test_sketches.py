@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+from src.sketches import DatasetSketch, HyperLogLog, TDigest, hash_values
+
+
+def _hll(values):
+    sketch = HyperLogLog()
+    sketch.update_hashes(hash_values(np.asarray(values)))
+    return sketch
+
+
+def test_hll_small_counts_are_exact():
+    assert _hll(np.arange(100)).estimate() == 100
+
+
+def test_hll_estimate_within_error():
+    estimate = _hll(np.arange(200_000)).estimate()
+    # 0.8% standard error; 3 sigma
+    assert abs(estimate - 200_000) / 200_000 < 0.025
+
+
+def test_hll_merge_matches_single_pass():
+    merged = _hll(np.arange(0, 60_000)).merge(_hll(np.arange(40_000, 100_000)))
+    assert merged.estimate() == _hll(np.arange(100_000)).estimate()
+
+
+def test_hll_ignores_duplicates():
+    assert _hll(np.tile(np.arange(1000), 50)).estimate() == _hll(np.arange(1000)).estimate()
+
+
+def test_tdigest_quantiles_close_to_exact():
+    values = np.random.default_rng(0).normal(size=100_000)
+    digest = TDigest()
+    for chunk in np.array_split(values, 10):
+        digest.update(chunk)
+    for q in (0.01, 0.25, 0.5, 0.75, 0.99):
+        assert abs(digest.quantile(q) - np.quantile(values, q)) < 0.02
+    assert digest.quantile(0.0) == values.min()
+    assert digest.quantile(1.0) == values.max()
+
+
+def test_tdigest_merge_close_to_exact():
+    rng = np.random.default_rng(1)
+    left, right = rng.exponential(size=50_000), rng.exponential(size=50_000) + 1
+    merged = TDigest()
+    merged.update(left)
+    other = TDigest()
+    other.update(right)
+    merged.merge(other)
+    both = np.concatenate([left, right])
+    for q in (0.1, 0.5, 0.9):
+        assert abs(merged.quantile(q) - np.quantile(both, q)) < 0.03
+
+
+def test_tdigest_skips_non_finite_and_empty():
+    digest = TDigest()
+    assert np.isnan(digest.quantile(0.5))
+    digest.update([np.nan, np.inf, 1.0, 3.0])
+    assert digest.minimum == 1.0 and digest.maximum == 3.0
+
+
+def test_dataset_sketch_merge_and_round_trip():
+    df = pd.DataFrame({"n": np.arange(1000, dtype=float), "c": ["a", "b"] * 500})
+    left, right = DatasetSketch(), DatasetSketch()
+    left.update(df.iloc[:400])
+    right.update(df.iloc[400:])
+    left.merge(right)
+    assert left.rows == 1000
+    assert left.distinct("c") == 2
+
+    restored = DatasetSketch.from_document(left.to_document())
+    assert restored.rows == 1000
+    assert restored.distinct("n") == left.distinct("n")
+
+
+def test_column_turning_categorical_keeps_its_counts():
+    sketch = DatasetSketch()
+    sketch.update(pd.DataFrame({"code": [1.0, 2.0, None]}))
+    sketch.update(pd.DataFrame({"code": ["A7", None, "B2", "A7"]}))
+    summary = sketch.summary().loc["code"]
+    assert summary["kind"] == "categorical"
+    assert summary["count"] + summary["nulls"] == sketch.rows == 7
+    assert summary["count"] == 5
+    assert sketch.top_values("code")[0] == ("A7", 2)
+
+
+def test_merging_sketches_of_different_kinds_keeps_counts():
+    numeric = DatasetSketch().update(pd.DataFrame({"code": [1, 2, 3]}))
+    text = DatasetSketch().update(pd.DataFrame({"code": ["x", None]}))
+    summary = numeric.merge(text).summary().loc["code"]
+    assert summary["kind"] == "categorical"
+    assert (summary["count"], summary["nulls"]) == (4, 1)
+
+
+def test_stored_sketch_replaces_the_previous_generation(mongo):
+    from src import db_utils
+
+    assert db_utils.get_dataset_sketch("missing") is None
+    db_utils._save_dataset_sketch("d", DatasetSketch().update(pd.DataFrame({"a": [1, 2]})))
+    db_utils._save_dataset_sketch("d", DatasetSketch().update(pd.DataFrame({"b": ["x"]})))
+    stored = db_utils.get_dataset_sketch("d")
+    assert list(stored.columns) == ["b"] and stored.rows == 1
+    assert mongo[db_utils.SKETCH_COLLECTION].count_documents({"dataset": "d"}) == 2
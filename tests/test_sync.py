@@ -0,0 +1,97 @@
+import json
+import shutil
+
+import pandas as pd
+import pytest
+
+from src import sync
+from src.offline_utils import DATASETS_DIR, OfflineStorage
+
+
+@pytest.fixture
+def outbox(mongo, monkeypatch):
+    shutil.rmtree(sync.OUTBOX_DIR, ignore_errors=True)
+    monkeypatch.setitem(sync._state, "offline_until", 0.0)
+    yield sync.OUTBOX_DIR
+    shutil.rmtree(sync.OUTBOX_DIR, ignore_errors=True)
+
+
+def _frame(rows=3):
+    return pd.DataFrame({"id": range(rows), "text": [f"row {i}" for i in range(rows)]})
+
+
+def _go_offline(monkeypatch):
+    def unreachable(*args, **kwargs):
+        raise ConnectionError("no route to host")
+
+    monkeypatch.setattr(sync, "store_dataset", unreachable)
+
+
+def test_offline_save_is_replayed_when_back_online(outbox, monkeypatch):
+    real_store = sync.store_dataset
+    _go_offline(monkeypatch)
+    result = sync.save_dataset("orders", _frame())
+    assert result["offline"] and result["pending"] == ["orders"]
+    assert OfflineStorage.get_dataset_metadata("orders")["pending_sync"]
+
+    monkeypatch.setattr(sync, "store_dataset", real_store)
+    monkeypatch.setitem(sync._state, "offline_until", 0.0)
+    result = sync.flush()
+    assert result["synced"] == {"orders": 3} and result["pending"] == []
+    assert not list(outbox.glob("*.json"))
+    metadata = OfflineStorage.get_dataset_metadata("orders")
+    assert not metadata["pending_sync"] and metadata["content_hash"]
+    assert sync.load_dataset("orders")[1] == "local"
+
+
+def test_only_the_newest_queued_write_is_replayed(outbox, monkeypatch):
+    _go_offline(monkeypatch)
+    sync.save_dataset("orders", _frame(2))
+    sync.save_dataset("orders", _frame(5))
+    # The second save's replay attempt already dropped the superseded entry
+    assert len(list(outbox.glob("*.json"))) == 1
+
+    replayed = []
+    monkeypatch.setattr(
+        sync, "store_dataset", lambda name, df, **kwargs: replayed.append(len(df)) or len(df)
+    )
+    monkeypatch.setitem(sync._state, "offline_until", 0.0)
+    assert sync.flush()["synced"] == {"orders": 5}
+    assert replayed == [5]
+
+
+def test_unparseable_entries_are_parked(outbox):
+    outbox.mkdir(parents=True, exist_ok=True)
+    (outbox / "1.json").write_text("{not json")
+    (outbox / "2.json").write_text(json.dumps(["no", "dataset"]))
+    sync.flush()
+    assert not list(outbox.glob("*.json"))
+    assert sorted(path.name for path in sync.FAILED_DIR.glob("*.json")) == ["1.json", "2.json"]
+    assert sync.failed_datasets() == {}
+
+
+def test_failing_write_is_parked_after_max_attempts(outbox, monkeypatch):
+    monkeypatch.setattr(sync, "MAX_SYNC_ATTEMPTS", 1)
+
+    def reject(*args, **kwargs):
+        raise ValueError("document too large")
+
+    monkeypatch.setattr(sync, "store_dataset", reject)
+    result = sync.save_dataset("orders", _frame())
+    assert result["errors"] == {"orders": "document too large"}
+    assert sync.failed_datasets() == {"orders": "document too large"}
+    assert OfflineStorage.get_dataset_metadata("orders")["sync_error"] == "document too large"
+
+
+def test_replay_reports_unreadable_copies_without_streamlit(outbox, monkeypatch):
+    _go_offline(monkeypatch)
+    sync.save_dataset("orders", _frame())
+    (DATASETS_DIR / "orders.parquet").write_bytes(b"not parquet")
+
+    def no_streamlit(*args, **kwargs):
+        raise AssertionError("Streamlit called from the sync path")
+
+    monkeypatch.setattr("src.offline_utils.st.error", no_streamlit)
+    monkeypatch.setitem(sync._state, "offline_until", 0.0)
+    result = sync.flush()
+    assert "orders" in result["errors"] and result["pending"] == ["orders"]
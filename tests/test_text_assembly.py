@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+from src import text_assembly
+from src.text_assembly import CHARS_PER_TOKEN, build_text_series, template_columns
+
+
+@pytest.fixture(params=[True, False], ids=["arrow", "pandas"])
+def engine(request, monkeypatch):
+    if request.param and not text_assembly.HAS_PYARROW:
+        pytest.skip("pyarrow is not installed")
+    monkeypatch.setattr(text_assembly, "HAS_PYARROW", request.param)
+
+
+def _frame():
+    return pd.DataFrame(
+        {"title": ["Pie", None, "Car"], "body": ["sweet", "green", None], "n": [1, 2, 3]},
+        index=[10, 11, 12],
+    )
+
+
+def test_columns_are_joined_with_separator(engine):
+    text = build_text_series(_frame(), columns=["title", "body", "n"])
+    assert text.tolist() == ["Pie sweet 1", " green 2", "Car  3"]
+    assert text.index.tolist() == [10, 11, 12]
+
+
+def test_template_fills_columns_per_row(engine):
+    text = build_text_series(_frame(), template="{title}: {body} (#{n})")
+    assert text.tolist() == ["Pie: sweet (#1)", ": green (#2)", "Car:  (#3)"]
+
+
+def test_text_is_capped_at_the_token_limit(engine):
+    df = pd.DataFrame({"body": ["word " * 100]})
+    text = build_text_series(df, columns=["body"], max_tokens=5)
+    assert text.iloc[0] == ("word " * 100)[: 5 * CHARS_PER_TOKEN]
+
+
+def test_literal_only_template_repeats_per_row(engine):
+    assert build_text_series(_frame(), template="same").tolist() == ["same"] * 3
+
+
+def test_missing_columns_raise(engine):
+    with pytest.raises(KeyError):
+        build_text_series(_frame(), template="{title} {missing}")
+
+
+def test_template_columns():
+    assert template_columns(template="{a}: {b} {a}") == ["a", "b", "a"]
+    assert template_columns(columns=("x", "y")) == ["x", "y"]
+    assert template_columns() == []
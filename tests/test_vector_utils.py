@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from src.vector_utils import decode_vector, decode_vectors, encode_vectors
+
+
+def _matrix():
+    return np.random.default_rng(0).normal(size=(5, 16)).astype(np.float32)
+
+
+def test_float32_round_trip_is_lossless():
+    matrix = _matrix()
+    np.testing.assert_array_equal(decode_vectors(encode_vectors(matrix, "float32")), matrix)
+
+
+def test_array_round_trip():
+    matrix = _matrix()
+    encoded = encode_vectors(matrix, "array")
+    assert isinstance(encoded[0], list)
+    np.testing.assert_allclose(decode_vectors(encoded), matrix)
+
+
+def test_int8_round_trip_keeps_direction():
+    matrix = _matrix()
+    decoded = decode_vectors(encode_vectors(matrix, "int8"))
+    cosine = np.sum(decoded * matrix, axis=1) / (
+        np.linalg.norm(decoded, axis=1) * np.linalg.norm(matrix, axis=1)
+    )
+    assert np.all(cosine > 0.999)
+
+
+def test_single_vector_decodes_like_batch():
+    matrix = _matrix()
+    encoded = encode_vectors(matrix, "float32")
+    np.testing.assert_array_equal(decode_vector(encoded[2]), matrix[2])
+
+
+def test_mixed_and_missing_values():
+    matrix = _matrix()
+    values = [encode_vectors(matrix[:1], "float32")[0], matrix[1].tolist(), None]
+    decoded = decode_vectors(values)
+    np.testing.assert_allclose(decoded[:2], matrix[:2])
+    assert not decoded[2].any()
+
+
+def test_empty_inputs():
+    assert encode_vectors([], "float32") == []
+    assert decode_vectors([], dimension=8).shape == (0, 8)
+
+
+def test_unknown_format_rejected():
+    with pytest.raises(ValueError):
+        encode_vectors(_matrix(), "float16")